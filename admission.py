@@ -0,0 +1,145 @@
+import asyncio
+import re
+from enum import Enum
+from typing import Dict, List, Optional, Pattern, Tuple
+from fastapi.responses import JSONResponse
+from config import settings
+
+
+class RouteClass(str, Enum):
+    AUTH_CPU = "auth_cpu"
+    SMS = "sms"
+    DB_READ = "db_read"
+    DB_WRITE = "db_write"
+    ADMIN_ANALYTICS = "admin_analytics"
+
+
+# Checked in order; the first (method, path pattern) match wins. API routes that
+# match nothing fall back to DB_READ for GET/HEAD and DB_WRITE otherwise.
+ROUTE_RULES: List[Tuple[Optional[str], Pattern, RouteClass]] = [
+    ("POST", re.compile(r"^/api/user/login$"), RouteClass.AUTH_CPU),
+    ("POST", re.compile(r"^/api/user/register/complete$"), RouteClass.AUTH_CPU),
+    ("POST", re.compile(r"^/api/admin/login$"), RouteClass.AUTH_CPU),
+    ("POST", re.compile(r"^/api/admin/register$"), RouteClass.AUTH_CPU),
+    ("POST", re.compile(r"^/api/user/register/send-otp$"), RouteClass.SMS),
+    (None, re.compile(r"^/api/admin/analytics"), RouteClass.ADMIN_ANALYTICS),
+    (None, re.compile(r"^/api/admin/technician-performance$"), RouteClass.ADMIN_ANALYTICS),
+]
+
+
+def classify_route(method: str, path: str) -> Optional[RouteClass]:
+    """Route class for a request, or None for paths outside admission control"""
+    if not path.startswith("/api/") or path.startswith("/api/admin/system"):
+        return None
+    for rule_method, pattern, route_class in ROUTE_RULES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            return route_class
+    if method in ("GET", "HEAD"):
+        return RouteClass.DB_READ
+    return RouteClass.DB_WRITE
+
+
+class AdmissionGate:
+    """
+    Concurrency limit with a short, bounded queue for one route class.
+    
+    Requests beyond `limit` wait for a slot; once `queue_size` requests are
+    already waiting, or a slot does not free up within `queue_timeout`, the
+    request is refused so it can be shed with a fast 503.
+    """
+    
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+    
+    async def acquire(self) -> bool:
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.queue_size:
+                self.rejected_queue_full += 1
+                return False
+            
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                return False
+            finally:
+                self.waiting -= 1
+        
+        self.active += 1
+        self.admitted += 1
+        return True
+    
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+    
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+gates: Dict[RouteClass, AdmissionGate] = {
+    route_class: AdmissionGate(
+        route_class.value,
+        limit=settings.ADMISSION_LIMITS.get(route_class.value, 16),
+        queue_size=settings.ADMISSION_QUEUE_SIZES.get(route_class.value, 16),
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+    )
+    for route_class in RouteClass
+}
+
+
+def admission_stats() -> dict:
+    return {route_class.value: gate.stats() for route_class, gate in gates.items()}
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that admits each API request through its route class gate"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_CONTROL_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        
+        route_class = classify_route(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+        
+        gate = gates[route_class]
+        if not await gate.acquire():
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy. Please retry shortly."},
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+            )
+            await response(scope, receive, send)
+            return
+        
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
@@ -0,0 +1,327 @@
+"""
+Daily analytics rollups.
+
+One `analytics_daily` document per UTC day holds, for every service type:
+requests created (in total and per hour), completed and cancelled, a histogram
+of completion times and a histogram of ratings. The API keeps today's buckets
+current with small $inc upserts as requests and feedback are written, and the
+rebuild job below recomputes any date range from the source collections with
+$dateTrunc aggregations over both the hot and the archive collection:
+
+    python analytics_rollup.py --days 365
+    python analytics_rollup.py --start 2025-01-01 --end 2025-12-31
+
+A 12-month chart then reads 365 small documents instead of rescanning
+`service_requests` and `feedback`.
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+from archiver import ARCHIVE_COLLECTION, HOT_COLLECTION
+from database import get_collection
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "analytics_daily"
+
+# Upper bounds (hours) of the completion-time histogram buckets; slower
+# completions land in the "inf" bucket. Buckets are keyed by their bound in
+# minutes, since dotted keys such as "0.5" would be read as nested fields.
+COMPLETION_BUCKETS_HOURS = [0.5, 1, 2, 3, 4, 6, 8, 12, 18, 24, 36, 48, 72, 96, 120, 168, 240, 336, 504, 720]
+
+
+def bucket_key(bound_hours: float) -> str:
+    return str(int(bound_hours * 60))
+
+
+def day_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+def day_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def completion_bucket(hours: float) -> str:
+    for bound in COMPLETION_BUCKETS_HOURS:
+        if hours <= bound:
+            return bucket_key(bound)
+    return "inf"
+
+
+async def _increment(db, moment: datetime, increments: Dict[str, float]) -> None:
+    """Add to the rollup bucket for the day of `moment`; never fails the caller"""
+    try:
+        await get_collection(db, ROLLUP_COLLECTION).update_one(
+            {"_id": day_key(moment)},
+            {"$inc": increments, "$setOnInsert": {"day": day_start(moment)}},
+            upsert=True
+        )
+    except PyMongoError as e:
+        logger.warning("Analytics rollup update failed: %s", str(e)[:150])
+
+
+async def record_request_created(db, request: dict) -> None:
+    created_at = request["created_at"]
+    prefix = f"by_type.{request['service_type']}"
+    await _increment(db, created_at, {
+        f"{prefix}.created": 1,
+        f"{prefix}.hours.{created_at.hour}": 1,
+    })
+
+
+async def record_request_completed(db, request: dict, completed_at: datetime) -> None:
+    hours = (completed_at - request["created_at"]).total_seconds() / 3600
+    prefix = f"by_type.{request['service_type']}"
+    await _increment(db, completed_at, {
+        f"{prefix}.completed": 1,
+        f"{prefix}.completion_hours_sum": hours,
+        f"{prefix}.completion.{completion_bucket(hours)}": 1,
+    })
+
+
+async def record_request_cancelled(db, request: dict, cancelled_at: datetime) -> None:
+    await _increment(db, cancelled_at, {f"by_type.{request['service_type']}.cancelled": 1})
+
+
+async def record_feedback(db, feedback: dict) -> None:
+    prefix = f"by_type.{feedback['service_type']}"
+    await _increment(db, feedback["created_at"], {
+        f"{prefix}.ratings.{feedback['rating']}": 1,
+        f"{prefix}.rating_sum": feedback["rating"],
+    })
+
+
+def histogram_percentile(histogram: Dict[str, int], q: float) -> Optional[float]:
+    """Approximate percentile (q in 0-100) of completion hours, interpolated within buckets"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = q / 100 * total
+    seen = 0
+    lower = 0.0
+    for bound in COMPLETION_BUCKETS_HOURS:
+        count = histogram.get(bucket_key(bound), 0)
+        if count and seen + count >= target:
+            return round(lower + (bound - lower) * (target - seen) / count, 2)
+        seen += count
+        lower = bound
+    return float(COMPLETION_BUCKETS_HOURS[-1])
+
+
+async def _aggregate(collection, pipeline: List[dict]) -> List[dict]:
+    return await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+
+def _truncated_day(field: str) -> dict:
+    return {"$dateTrunc": {"date": f"${field}", "unit": "day"}}
+
+
+async def _aggregate_requests(db, match: dict, stages: List[dict]) -> List[dict]:
+    """Aggregate over hot and archived requests alike, so history survives archiving"""
+    return await _aggregate(db[HOT_COLLECTION], [
+        {"$match": match},
+        {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [{"$match": match}]}},
+        *stages,
+    ])
+
+
+async def rebuild_daily_rollups(db, start: date, end: date) -> int:
+    """Recompute the rollup documents for [start, end] (inclusive) from the source data"""
+    range_start = datetime(start.year, start.month, start.day)
+    range_end = datetime(end.year, end.month, end.day) + timedelta(days=1)
+    days: Dict[datetime, dict] = defaultdict(lambda: {"by_type": defaultdict(lambda: defaultdict(int))})
+    
+    created = await _aggregate_requests(db, {"created_at": {"$gte": range_start, "$lt": range_end}}, [
+        {"$group": {
+            "_id": {"day": _truncated_day("created_at"), "type": "$service_type", "hour": {"$hour": "$created_at"}},
+            "count": {"$sum": 1},
+        }},
+    ])
+    for row in created:
+        by_type = days[row["_id"]["day"]]["by_type"][row["_id"]["type"]]
+        by_type["created"] += row["count"]
+        by_type.setdefault("hours", {})[str(row["_id"]["hour"])] = row["count"]
+    
+    bucket_switch = {"$switch": {
+        "branches": [
+            {"case": {"$lte": ["$hours", bound]}, "then": bucket_key(bound)}
+            for bound in COMPLETION_BUCKETS_HOURS
+        ],
+        "default": "inf",
+    }}
+    completed_match = {"status": "completed", "completed_at": {"$gte": range_start, "$lt": range_end}}
+    completed = await _aggregate_requests(db, completed_match, [
+        {"$set": {"hours": {"$divide": [{"$subtract": ["$completed_at", "$created_at"]}, 3600000]}}},
+        {"$group": {
+            "_id": {"day": _truncated_day("completed_at"), "type": "$service_type", "bucket": bucket_switch},
+            "count": {"$sum": 1},
+            "hours": {"$sum": "$hours"},
+        }},
+    ])
+    for row in completed:
+        by_type = days[row["_id"]["day"]]["by_type"][row["_id"]["type"]]
+        by_type["completed"] += row["count"]
+        by_type["completion_hours_sum"] += row["hours"]
+        by_type.setdefault("completion", {})[row["_id"]["bucket"]] = row["count"]
+    
+    # Requests have no cancelled_at; updated_at is when they were cancelled
+    cancelled_match = {"status": "cancelled", "updated_at": {"$gte": range_start, "$lt": range_end}}
+    cancelled = await _aggregate_requests(db, cancelled_match, [
+        {"$group": {"_id": {"day": _truncated_day("updated_at"), "type": "$service_type"}, "count": {"$sum": 1}}},
+    ])
+    for row in cancelled:
+        days[row["_id"]["day"]]["by_type"][row["_id"]["type"]]["cancelled"] += row["count"]
+    
+    ratings = await _aggregate(db["feedback"], [
+        {"$match": {"created_at": {"$gte": range_start, "$lt": range_end}}},
+        {"$group": {
+            "_id": {"day": _truncated_day("created_at"), "type": "$service_type", "rating": "$rating"},
+            "count": {"$sum": 1},
+        }},
+    ])
+    for row in ratings:
+        by_type = days[row["_id"]["day"]]["by_type"][row["_id"]["type"]]
+        by_type.setdefault("ratings", {})[str(row["_id"]["rating"])] = row["count"]
+        by_type["rating_sum"] += row["_id"]["rating"] * row["count"]
+    
+    rollups = db[ROLLUP_COLLECTION]
+    operations = [
+        ReplaceOne(
+            {"_id": day_key(day)},
+            {"day": day, "by_type": {service_type: dict(values) for service_type, values in rollup["by_type"].items()}},
+            upsert=True
+        )
+        for day, rollup in days.items()
+    ]
+    if operations:
+        await rollups.bulk_write(operations, ordered=False)
+    # Days in the range with no activity left must not keep stale counts
+    await rollups.delete_many({
+        "day": {"$gte": range_start, "$lt": range_end},
+        "_id": {"$nin": [day_key(day) for day in days]}
+    })
+    return len(operations)
+
+
+async def load_rollups(db, start: date, end: date, service_types: Optional[Iterable[str]] = None) -> List[dict]:
+    """Rollup documents for [start, end] (inclusive), oldest first"""
+    projection = {"day": 1}
+    for service_type in service_types or []:
+        projection[f"by_type.{service_type}"] = 1
+    if len(projection) == 1:
+        projection = None
+    
+    return await db[ROLLUP_COLLECTION].find(
+        {"day": {"$gte": datetime(start.year, start.month, start.day), "$lte": datetime(end.year, end.month, end.day)}},
+        projection
+    ).sort("day", 1).to_list(length=None)
+
+
+def period_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "week":
+        return day_start(moment) - timedelta(days=moment.weekday())
+    if granularity == "month":
+        return datetime(moment.year, moment.month, 1)
+    return day_start(moment)
+
+
+def summarize_rollups(rollups: List[dict], service_types: List[str], granularity: str) -> dict:
+    """
+    Fold daily rollup documents into a time series plus completion-time and
+    rating distributions. Hourly series only carry request counts, since
+    completions and cancellations are bucketed per day.
+    """
+    points: Dict[datetime, dict] = {}
+    completion_histogram: Dict[str, int] = defaultdict(int)
+    completion_count = 0
+    completion_hours_sum = 0.0
+    rating_histogram: Dict[str, int] = defaultdict(int)
+    rating_sum = 0
+    
+    def point(start: datetime) -> dict:
+        if start not in points:
+            points[start] = {
+                "period_start": start,
+                "total_requests": 0,
+                "requests_by_service_type": defaultdict(int),
+                "completed_requests": None if granularity == "hour" else 0,
+                "cancelled_requests": None if granularity == "hour" else 0,
+            }
+        return points[start]
+    
+    for rollup in rollups:
+        for service_type in service_types:
+            values = rollup.get("by_type", {}).get(service_type)
+            if not values:
+                continue
+            
+            if granularity == "hour":
+                for hour, count in values.get("hours", {}).items():
+                    hourly = point(rollup["day"] + timedelta(hours=int(hour)))
+                    hourly["total_requests"] += count
+                    hourly["requests_by_service_type"][service_type] += count
+            else:
+                current = point(period_start(rollup["day"], granularity))
+                current["total_requests"] += values.get("created", 0)
+                current["requests_by_service_type"][service_type] += values.get("created", 0)
+                current["completed_requests"] += values.get("completed", 0)
+                current["cancelled_requests"] += values.get("cancelled", 0)
+            
+            completion_count += values.get("completed", 0)
+            completion_hours_sum += values.get("completion_hours_sum", 0)
+            for bucket, count in values.get("completion", {}).items():
+                completion_histogram[bucket] += count
+            for rating, count in values.get("ratings", {}).items():
+                rating_histogram[rating] += count
+            rating_sum += values.get("rating_sum", 0)
+    
+    total_ratings = sum(rating_histogram.values())
+    return {
+        "series": [points[start] for start in sorted(points)],
+        "completion_time": {
+            "count": completion_count,
+            "mean_hours": round(completion_hours_sum / completion_count, 2) if completion_count else None,
+            "p50_hours": histogram_percentile(completion_histogram, 50),
+            "p90_hours": histogram_percentile(completion_histogram, 90),
+            "p99_hours": histogram_percentile(completion_histogram, 99),
+        },
+        "rating_histogram": {str(rating): rating_histogram.get(str(rating), 0) for rating in range(1, 6)},
+        "average_rating": round(rating_sum / total_ratings, 2) if total_ratings else None,
+    }
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from config import settings
+    
+    parser = argparse.ArgumentParser(description="Rebuild daily analytics rollups")
+    parser.add_argument("--days", type=int, default=30, help="Rebuild the last N days (default 30)")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+    
+    end = args.end or datetime.utcnow().date()
+    start = args.start or end - timedelta(days=args.days - 1)
+    
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=5000)
+    db = client[settings.DATABASE_NAME]
+    print(f"🔄 Rebuilding analytics rollups from {start} to {end}...")
+    # Rebuild a month at a time to keep each aggregation small
+    chunk_start = start
+    total = 0
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=30))
+        total += await rebuild_daily_rollups(db, chunk_start, chunk_end)
+        chunk_start = chunk_end + timedelta(days=1)
+    print(f"✅ Rebuilt {total} daily rollup documents")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
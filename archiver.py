@@ -0,0 +1,164 @@
+"""
+Hot/archive tiering for service requests.
+
+Requests that were completed or cancelled more than ARCHIVE_AFTER_DAYS ago are
+moved from `service_requests` into `service_requests_archive`, so the hot
+collection, its indexes and the working set only hold live and recent jobs:
+
+    python archiver.py
+    python archiver.py --days 365 --batch-size 200 --pause 1
+
+Requests are moved in `_id` order, in small batches with a pause between
+them, and the last archived `_id` is checkpointed in `archive_checkpoints`,
+so an interrupted run resumes where it stopped. Each batch is copied before
+it is deleted, and only documents that are still finished are deleted, so a
+request reopened mid-run stays in the hot collection.
+
+Reads fall back to the archive through `find_service_request`,
+`find_service_requests_by_id` and `find_service_requests`.
+"""
+import argparse
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from pymongo import ReplaceOne
+from config import settings
+
+HOT_COLLECTION = "service_requests"
+ARCHIVE_COLLECTION = "service_requests_archive"
+CHECKPOINT_COLLECTION = "archive_checkpoints"
+
+
+def archivable_query(cutoff: datetime) -> dict:
+    """Requests that finished before `cutoff` (cancellations have no timestamp of their own)"""
+    return {"$or": [
+        {"status": "completed", "completed_at": {"$lt": cutoff}},
+        {"status": "cancelled", "updated_at": {"$lt": cutoff}},
+    ]}
+
+
+async def find_service_request(db, query: dict) -> Optional[dict]:
+    """Look a request up in the hot collection, then in the archive"""
+    request = await db[HOT_COLLECTION].find_one(query)
+    if request is None:
+        request = await db[ARCHIVE_COLLECTION].find_one(query)
+    return request
+
+
+async def find_service_requests_by_id(db, ids: Iterable) -> Dict:
+    """Requests by `_id` with one `$in` query per tier, keyed by id; unknown ids are left out"""
+    ids = list(ids)
+    found = {}
+    if not ids:
+        return found
+    for request in await db[HOT_COLLECTION].find({"_id": {"$in": ids}}).to_list(length=len(ids)):
+        found[request["_id"]] = request
+    
+    missing = [object_id for object_id in ids if object_id not in found]
+    if missing:
+        for request in await db[ARCHIVE_COLLECTION].find({"_id": {"$in": missing}}).to_list(length=len(missing)):
+            found[request["_id"]] = request
+    return found
+
+
+async def find_service_requests(
+    db,
+    query: dict,
+    skip: int = 0,
+    limit: int = 100,
+    include_archived: bool = False
+) -> List[dict]:
+    """Newest-first page of requests, optionally merged with archived history"""
+    cursor = db[HOT_COLLECTION].find(query).sort("created_at", -1)
+    if not include_archived:
+        return await cursor.skip(skip).limit(limit).to_list(length=limit)
+    
+    # Each collection is already sorted, so the first skip + limit of each cover the page
+    hot, archived = await asyncio.gather(
+        cursor.limit(skip + limit).to_list(length=skip + limit),
+        db[ARCHIVE_COLLECTION].find(query).sort("created_at", -1).limit(skip + limit).to_list(length=skip + limit)
+    )
+    merged = heapq.merge(hot, archived, key=lambda request: request["created_at"], reverse=True)
+    return list(merged)[skip:skip + limit]
+
+
+async def archive_batch(db, cutoff: datetime, after_id=None, batch_size: int = 500) -> tuple:
+    """Move one batch; returns (documents moved, last _id examined or None when done)"""
+    query = archivable_query(cutoff)
+    if after_id is not None:
+        query = {"$and": [query, {"_id": {"$gt": after_id}}]}
+    
+    batch = await db[HOT_COLLECTION].find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+    if not batch:
+        return 0, None
+    
+    now = datetime.utcnow()
+    await db[ARCHIVE_COLLECTION].bulk_write(
+        [ReplaceOne({"_id": request["_id"]}, {**request, "archived_at": now}, upsert=True) for request in batch],
+        ordered=False
+    )
+    
+    ids = [request["_id"] for request in batch]
+    result = await db[HOT_COLLECTION].delete_many({"$and": [archivable_query(cutoff), {"_id": {"$in": ids}}]})
+    
+    if result.deleted_count < len(ids):
+        # Reopened or re-dated between copy and delete: the hot copy stays authoritative
+        kept = await db[HOT_COLLECTION].distinct("_id", {"_id": {"$in": ids}})
+        await db[ARCHIVE_COLLECTION].delete_many({"_id": {"$in": kept}})
+    
+    return result.deleted_count, ids[-1]
+
+
+async def run_archiver(db, days: int, batch_size: int, pause: float, restart: bool = False) -> int:
+    """Archive everything finished more than `days` ago, resuming from the last checkpoint"""
+    checkpoints = db[CHECKPOINT_COLLECTION]
+    checkpoint = None if restart else await checkpoints.find_one({"_id": HOT_COLLECTION})
+    
+    if checkpoint:
+        cutoff, after_id, moved = checkpoint["cutoff"], checkpoint["last_id"], checkpoint["moved"]
+        print(f"↩️  Resuming after {after_id} (cutoff {cutoff:%Y-%m-%d}, {moved} already moved)")
+    else:
+        cutoff, after_id, moved = datetime.utcnow() - timedelta(days=days), None, 0
+    
+    while True:
+        count, last_id = await archive_batch(db, cutoff, after_id, batch_size)
+        if last_id is None:
+            break
+        moved += count
+        after_id = last_id
+        await checkpoints.replace_one(
+            {"_id": HOT_COLLECTION},
+            {"cutoff": cutoff, "last_id": after_id, "moved": moved, "updated_at": datetime.utcnow()},
+            upsert=True
+        )
+        print(f"   moved {moved} so far (last _id {after_id})")
+        # Leave room for the application's own traffic
+        await asyncio.sleep(pause)
+    
+    await checkpoints.delete_one({"_id": HOT_COLLECTION})
+    return moved
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    
+    parser = argparse.ArgumentParser(description="Move finished service requests to the archive collection")
+    parser.add_argument("--days", type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                        help="Archive requests finished more than N days ago")
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=settings.ARCHIVE_BATCH_PAUSE_SECONDS,
+                        help="Seconds to wait between batches")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+    args = parser.parse_args()
+    
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=5000)
+    db = client[settings.DATABASE_NAME]
+    print(f"🔄 Archiving service requests finished more than {args.days} days ago...")
+    moved = await run_archiver(db, args.days, args.batch_size, args.pause, args.restart)
+    print(f"✅ Archived {moved} service requests")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,21 +4,53 @@ import jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from config import settings
+from database import get_database
 from models import TokenData, UserRole
+from principals import principal_cache
+from server_timing import span
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min and max rounds to BCRYPT_ROUNDS makes needs_update() flag any
+# hash created with a different cost, so it is re-hashed on the next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 security = HTTPBearer()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("bcrypt"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    with span("bcrypt"):
+        return pwd_context.hash(password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a hash was created with a different scheme or cost"""
+    return pwd_context.needs_update(hashed_password)
+
+
+async def upgrade_password_hash(collection, document_id, old_hash: str, password: str) -> None:
+    """
+    Re-hash a password with the configured cost (run as a background task after
+    a successful login). The update only applies if the stored hash is still the
+    one that was verified, so a concurrent password change is never overwritten.
+    """
+    new_hash = await run_in_threadpool(get_password_hash, password)
+    await collection.update_one(
+        {"_id": document_id, "hashed_password": old_hash},
+        {"$set": {"hashed_password": new_hash}}
+    )
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -52,7 +84,8 @@ def decode_access_token(token: str) -> TokenData:
         )
     
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        with span("auth"):
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user_id: str = payload.get("sub")
         role: str = payload.get("role")
         if user_id is None:
@@ -63,10 +96,27 @@ def decode_access_token(token: str) -> TokenData:
         raise credentials_exception
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
-    """Get current authenticated user from token"""
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db=Depends(get_database)
+) -> TokenData:
+    """Get current authenticated user from token, rejecting deactivated or deleted accounts"""
     token = credentials.credentials
-    return decode_access_token(token)
+    token_data = decode_access_token(token)
+    
+    account_status = await principal_cache.status(db, token_data.role, token_data.user_id)
+    if account_status == "missing":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Account no longer exists",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if account_status == "inactive":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is deactivated"
+        )
+    return token_data
 
 
 async def get_current_admin(current_user: TokenData = Depends(get_current_user)) -> TokenData:
@@ -0,0 +1,92 @@
+"""
+Benchmark MongoDB write throughput and latency per write-concern tier.
+
+Runs the same number of small inserts with a fixed number of concurrent
+writers for every tier, once with one insert_one per document and once
+through the group-commit buffer, and reports throughput and p50/p95/p99
+latency. Point it at a local replica set, since w: majority only costs
+anything when there are secondaries to wait for:
+
+    docker run -d --name mongo-rs -p 27017:27017 mongo:7 --replSet rs0
+    docker exec mongo-rs mongosh --eval "rs.initiate()"
+    python bench_mongo.py --uri "mongodb://localhost:27017/?replicaSet=rs0"
+
+Writes go to a scratch collection in the --database database, which is
+dropped afterwards.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import List
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from database import database, get_collection, WRITE_CONCERN_TIERS
+from group_commit import GroupCommitBuffer
+from metrics import summarize_latencies
+
+BENCH_COLLECTION = "bench_writes"
+
+
+def make_document(writer: int, sequence: int) -> dict:
+    return {"writer": writer, "sequence": sequence, "action": "bench", "created_at": datetime.utcnow()}
+
+
+async def run_writers(write, writes: int, concurrency: int) -> tuple:
+    """Run `writes` calls of `write(document)` across `concurrency` writers"""
+    latencies: List[float] = []
+    per_writer = writes // concurrency
+    
+    async def writer(number: int):
+        for sequence in range(per_writer):
+            started = time.perf_counter()
+            await write(make_document(number, sequence))
+            latencies.append((time.perf_counter() - started) * 1000)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, summarize_latencies(latencies)
+
+
+async def bench(args) -> None:
+    client = AsyncIOMotorClient(args.uri, serverSelectionTimeoutMS=5000)
+    database.client = client
+    settings.DATABASE_NAME = args.database
+    db = client[args.database]
+    
+    hello = await client.admin.command("hello")
+    print(f"🖥️  {args.uri} - replica set: {hello.get('setName', 'none')}, "
+          f"{len(hello.get('hosts', [])) or 1} member(s)")
+    print(f"   {args.writes} inserts, {args.concurrency} concurrent writers\n")
+    print(f"{'tier':<10} {'mode':<13} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    
+    for tier in args.tiers:
+        collection = get_collection(db, BENCH_COLLECTION, tier)
+        await collection.drop()
+        
+        ops, summary = await run_writers(collection.insert_one, args.writes, args.concurrency)
+        print(f"{tier:<10} {'insert_one':<13} {ops:>9.0f} {summary['p50']:>8.2f} {summary['p95']:>8.2f} {summary['p99']:>8.2f}")
+        
+        buffer = GroupCommitBuffer(BENCH_COLLECTION, tier=tier, max_delay_ms=args.delay_ms)
+        ops, summary = await run_writers(buffer.insert, args.writes, args.concurrency)
+        await buffer.flush()
+        print(f"{'':<10} {'group commit':<13} {ops:>9.0f} {summary['p50']:>8.2f} {summary['p95']:>8.2f} {summary['p99']:>8.2f}"
+              f"   (avg batch {buffer.stats()['average_batch_size']})")
+    
+    await db[BENCH_COLLECTION].drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark write-concern tiers and group commit")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/?replicaSet=rs0")
+    parser.add_argument("--database", default="service_request_bench")
+    parser.add_argument("--writes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--delay-ms", type=float, default=settings.GROUP_COMMIT_MAX_DELAY_MS,
+                        help="Group-commit flush delay")
+    parser.add_argument("--tiers", nargs="+", default=list(WRITE_CONCERN_TIERS), choices=list(WRITE_CONCERN_TIERS))
+    args = parser.parse_args()
+    
+    asyncio.run(bench(args))
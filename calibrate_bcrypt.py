@@ -0,0 +1,74 @@
+"""
+Pick a bcrypt work factor for the current host.
+
+Measures how long one password verification takes at each cost and chooses the
+highest cost whose median verification time stays within the target, so login
+throughput can be planned precisely:
+
+    python calibrate_bcrypt.py --target-ms 250
+    python calibrate_bcrypt.py --target-ms 250 --write-env
+
+Existing users keep working: hashes with a different cost are upgraded in the
+background the next time they log in.
+"""
+import argparse
+import os
+import statistics
+import time
+from passlib.hash import bcrypt
+from config import settings
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 16
+
+
+def measure_verify_ms(rounds: int, samples: int) -> float:
+    """Median time in milliseconds to verify a password hashed with `rounds`"""
+    hashed = bcrypt.using(rounds=rounds).hash("calibration-password")
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.verify("calibration-password", hashed)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms: float, samples: int) -> int:
+    chosen = MIN_ROUNDS
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        elapsed = measure_verify_ms(rounds, samples)
+        within = elapsed <= target_ms
+        print(f"  rounds={rounds:<2}  verify={elapsed:8.1f} ms  {'✅' if within else '❌'}")
+        if not within:
+            break
+        chosen = rounds
+    return chosen
+
+
+def write_env(rounds: int, path: str = ".env") -> None:
+    """Set BCRYPT_ROUNDS in the .env file, replacing an existing value"""
+    lines = []
+    if os.path.exists(path):
+        with open(path) as env_file:
+            lines = [line for line in env_file.read().splitlines() if not line.startswith("BCRYPT_ROUNDS=")]
+    lines.append(f"BCRYPT_ROUNDS={rounds}")
+    with open(path, "w") as env_file:
+        env_file.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the bcrypt work factor for this host")
+    parser.add_argument("--target-ms", type=float, default=settings.BCRYPT_TARGET_MS,
+                        help="Maximum time for one password verification (default: BCRYPT_TARGET_MS)")
+    parser.add_argument("--samples", type=int, default=3, help="Verifications timed per cost")
+    parser.add_argument("--write-env", action="store_true", help="Store the result in .env")
+    args = parser.parse_args()
+    
+    print(f"🔄 Calibrating bcrypt for a {args.target_ms:.0f} ms verification target...")
+    rounds = calibrate(args.target_ms, args.samples)
+    print(f"\n🎯 BCRYPT_ROUNDS={rounds}")
+    print(f"   ≈ {1000 / measure_verify_ms(rounds, args.samples):.1f} logins/second per CPU core")
+    
+    if args.write_env:
+        write_env(rounds)
+        print("✅ Saved to .env")
@@ -0,0 +1,75 @@
+"""
+Check which replica set member serves each endpoint's reads.
+
+Issues one query per endpoint in READ_ROUTING (plus a primary-routed
+endpoint for comparison) with the same read preference the API uses, and
+reports the member that answered it. Run against a three-node replica set:
+
+    python check_read_routing.py --uri "mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0"
+
+Endpoints routed to "secondary" should be served by a secondary while one
+is available within READ_MAX_STALENESS_SECONDS; everything else by the primary.
+"""
+import argparse
+import asyncio
+from typing import Dict, List
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from config import settings
+from database import read_preference_for
+
+PRIMARY_ROUTE = "get_user_service_requests"
+
+
+class ServedByListener(monitoring.CommandListener):
+    """Remembers the server address that answered each command"""
+    
+    def __init__(self):
+        self.served_by: Dict[int, str] = {}
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        host, port = event.connection_id
+        self.served_by[event.request_id] = f"{host}:{port}"
+    
+    def failed(self, event):
+        pass
+
+
+async def check(args) -> bool:
+    listener = ServedByListener()
+    client = AsyncIOMotorClient(args.uri, serverSelectionTimeoutMS=5000, event_listeners=[listener])
+    hello = await client.admin.command("hello")
+    primary = hello.get("primary")
+    secondaries: List[str] = [host for host in hello.get("hosts", []) if host != primary]
+    print(f"🖥️  Replica set {hello.get('setName', 'none')}: primary {primary}, secondaries {', '.join(secondaries) or 'none'}\n")
+    
+    ok = True
+    for route in [*settings.READ_ROUTING, PRIMARY_ROUTE]:
+        read_preference = read_preference_for(route)
+        db = client.get_database(args.database, read_preference=read_preference)
+        listener.served_by.clear()
+        await db["service_requests"].find_one({})
+        served_by = next(iter(listener.served_by.values()), "unknown")
+        
+        expected_secondary = settings.READ_ROUTING.get(route) == "secondary" and bool(secondaries)
+        on_secondary = served_by in secondaries
+        matches = on_secondary == expected_secondary
+        ok = ok and matches
+        print(f"  {'✅' if matches else '❌'} {route:<28} {read_preference.name:<20} served by {served_by}"
+              f" ({'secondary' if on_secondary else 'primary'})")
+    
+    client.close()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify read-preference routing against a replica set")
+    parser.add_argument("--uri", default="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0")
+    parser.add_argument("--database", default=settings.DATABASE_NAME)
+    args = parser.parse_args()
+    
+    if not asyncio.run(check(args)):
+        raise SystemExit(1)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class Settings(BaseSettings):
@@ -7,10 +7,32 @@ class Settings(BaseSettings):
     MONGODB_URL: str = "mongodb://localhost:27017"
     DATABASE_NAME: str = "service_request_app"
     
+    # MongoDB connection pool
+    MONGO_MAX_POOL_SIZE: int = 10
+    MONGO_MIN_POOL_SIZE: int = 1
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 2000  # Fail a checkout instead of queueing forever
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 15000
+    MONGO_CONNECT_TIMEOUT_MS: int = 15000
+    MONGO_SOCKET_TIMEOUT_MS: int = 15000
+    MONGO_OPERATION_TIMEOUT_MS: Optional[int] = None  # Client-side timeoutMS for every operation
+    
+    # Readiness probe
+    READY_PING_CACHE_SECONDS: float = 2.0
+    READY_PING_TIMEOUT_SECONDS: float = 1.0
+    READY_MAX_POOL_WAITERS: int = 10
+    
     # JWT
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080  # 7 days
+    # How long a worker trusts its cached is_active for the account behind a
+    # token; deactivations in another worker take effect within this time
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    
+    # Password hashing (run `python calibrate_bcrypt.py` to pick BCRYPT_ROUNDS for this host)
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_TARGET_MS: int = 250
     
     # Zong SMS API
     ZONG_API_URL: str
@@ -18,6 +40,51 @@ class Settings(BaseSettings):
     ZONG_PASSWORD: str
     ZONG_MASK: str
     
+    # SMS delivery: providers tried in order, skipping ones whose circuit
+    # breaker is open ("zong", "twilio", "console" prints to the log)
+    SMS_PROVIDERS: List[str] = ["zong"]
+    TWILIO_ACCOUNT_SID: Optional[str] = None
+    TWILIO_AUTH_TOKEN: Optional[str] = None
+    TWILIO_FROM_NUMBER: Optional[str] = None
+    TWILIO_API_URL: Optional[str] = None  # Defaults to the Messages endpoint for the account
+    SMS_TIMEOUT_SECONDS: float = 5
+    SMS_BREAKER_FAILURE_THRESHOLD: int = 3
+    SMS_BREAKER_RESET_SECONDS: float = 30
+    
+    # Customer notifications: updates to one request within the window are
+    # merged into a single SMS; these statuses are sent immediately
+    NOTIFICATION_COALESCE_SECONDS: float = 20
+    NOTIFICATION_URGENT_STATUSES: List[str] = ["in_progress", "completed", "cancelled"]
+    
+    # Logging: level, "json" or "text", and the fraction of records kept
+    # for high-frequency events (warnings and errors are always kept)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_SAMPLE_RATES: Dict[str, float] = {
+        "sms.sent": 0.1,
+    }
+    
+    # Server-Timing response header for every request (admins can also ask
+    # per request with "X-Server-Timing: 1"); requests slower than
+    # SERVER_TIMING_SLOW_REQUEST_MS are logged with their spans (0 disables)
+    SERVER_TIMING_ENABLED: bool = False
+    SERVER_TIMING_SLOW_REQUEST_MS: float = 1000
+    
+    # Event-loop lag monitor: sampling interval, and the stall length at
+    # which the loop thread's stack is captured
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_MS: float = 100
+    LOOP_LAG_THRESHOLD_MS: float = 100
+    
+    # Traffic capture for replay_traffic.py: sanitized traces of a sample of
+    # requests, as rotating JSONL files
+    TRAFFIC_CAPTURE_ENABLED: bool = False
+    TRAFFIC_CAPTURE_PATH: str = "traffic/traces.jsonl"
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = 1.0
+    TRAFFIC_CAPTURE_MAX_BYTES: int = 50 * 1024 * 1024
+    TRAFFIC_CAPTURE_BACKUPS: int = 5
+    TRAFFIC_CAPTURE_EXCLUDE_PATHS: List[str] = ["/health", "/ready", "/docs", "/openapi.json"]
+    
     # Admin
     ADMIN_DEFAULT_EMAIL: str = "admin@serviceapp.com"
     ADMIN_DEFAULT_PASSWORD: str = "admin123"
@@ -25,6 +92,120 @@ class Settings(BaseSettings):
     # OTP
     OTP_EXPIRY_MINUTES: int = 5
     
+    # Rate limiting (token buckets: CAPACITY burst, refilled at PER_MINUTE tokens/minute)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per worker) or "mongo" (shared)
+    RATE_LIMIT_TRUST_FORWARDED: bool = True  # Behind Render/Railway proxies
+    # Proxies in front of the app that append to X-Forwarded-For; the client is
+    # the entry this many places from the right (earlier ones are client-supplied)
+    RATE_LIMIT_TRUSTED_PROXY_HOPS: int = 1
+    IP_RATE_LIMIT_CAPACITY: int = 30
+    IP_RATE_LIMIT_PER_MINUTE: float = 30
+    OTP_RATE_LIMIT_CAPACITY: int = 3
+    OTP_RATE_LIMIT_PER_MINUTE: float = 1
+    LOGIN_RATE_LIMIT_CAPACITY: int = 5
+    LOGIN_RATE_LIMIT_PER_MINUTE: float = 5
+    
+    # Service request search: "mongo" ($text index), "inverted" (in-process index)
+    # or "auto" (use the text index, fall back to the in-process index without one)
+    SEARCH_BACKEND: str = "auto"
+    SEARCH_INDEX_REFRESH_SECONDS: float = 30
+    
+    # Technician scheduling
+    DEFAULT_BOOKING_HOURS: int = 2  # Booking length for requests without hours_required
+    CALENDAR_REFRESH_SECONDS: float = 30
+    # Assignments hold a per-technician lock while they check and book; a lock
+    # left by a crashed worker is taken over after BOOKING_LOCK_SECONDS
+    BOOKING_LOCK_SECONDS: float = 10
+    BOOKING_LOCK_WAIT_SECONDS: float = 2
+    
+    # User home screen
+    HOME_RECENT_REQUESTS: int = 10
+    HOME_AWAITING_FEEDBACK_LIMIT: int = 20
+    
+    # Hot/archive tiering: requests finished more than ARCHIVE_AFTER_DAYS ago
+    # are moved to service_requests_archive by archiver.py
+    ARCHIVE_AFTER_DAYS: int = 180
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_BATCH_PAUSE_SECONDS: float = 0.5
+    
+    # Data migrations (migrate.py): batch size and throttles so backfills can
+    # run alongside live traffic (0 disables a throttle)
+    MIGRATION_BATCH_SIZE: int = 500
+    MIGRATION_MAX_DOCS_PER_SECOND: float = 1000
+    MIGRATION_MAX_REPLICATION_LAG_SECONDS: float = 10
+    
+    # Response cache for service request detail reads ("memory" or "none");
+    # per worker, so keep the TTL short when running several workers
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_TTL_SECONDS: float = 15
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Idempotency-Key support: how long responses are kept for replay, and how
+    # long an unfinished call holds its key before a retry may take it over
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+    IDEMPOTENCY_LOCK_SECONDS: int = 60
+    
+    # Write-concern tier per collection ("critical", "standard" or "telemetry");
+    # collections not listed use "critical" (w: majority). "telemetry" is w: 0,
+    # so writes to those collections can be lost without any error
+    COLLECTION_WRITE_TIERS: Dict[str, str] = {
+        "rate_limits": "standard",
+        "analytics_daily": "standard",
+        "audit_events": "telemetry",
+    }
+    
+    # Read routing per endpoint: "secondary" sends its reads to secondaries
+    # (secondaryPreferred, falling back to the primary), anything else or an
+    # unlisted endpoint reads from the primary. Staleness must be at least 90.
+    READ_ROUTING: Dict[str, str] = {
+        "get_analytics": "secondary",
+        "get_analytics_series": "secondary",
+        "get_technician_performance": "secondary",
+        "get_all_feedback": "secondary",
+    }
+    READ_MAX_STALENESS_SECONDS: int = 90
+    
+    # Group commit: concurrent inserts into these collections are batched into
+    # one insert_many, flushed when full or after the delay
+    GROUP_COMMIT_MAX_BATCH: int = 100
+    GROUP_COMMIT_MAX_DELAY_MS: float = 5
+    
+    # Batch API
+    BATCH_MAX_OPERATIONS: int = 50
+    
+    # Admission control: concurrent requests and queued requests per route class
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_LIMITS: Dict[str, int] = {
+        "auth_cpu": 4,
+        "sms": 8,
+        "db_read": 32,
+        "db_write": 16,
+        "admin_analytics": 2,
+    }
+    ADMISSION_QUEUE_SIZES: Dict[str, int] = {
+        "auth_cpu": 8,
+        "sms": 16,
+        "db_read": 64,
+        "db_write": 32,
+        "admin_analytics": 4,
+    }
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+    
+    # Request deadlines per route class (0 for none), covering queueing,
+    # MongoDB (as maxTimeMS) and SMS calls; clients can ask for less with
+    # X-Request-Timeout-Ms, down to REQUEST_DEADLINE_MIN_MS
+    REQUEST_DEADLINES_MS: Dict[str, float] = {
+        "auth_cpu": 5000,
+        "sms": 12000,
+        "db_read": 5000,
+        "db_write": 8000,
+        "admin_analytics": 20000,
+    }
+    REQUEST_DEADLINE_DEFAULT_MS: float = 10000
+    REQUEST_DEADLINE_MIN_MS: float = 100
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
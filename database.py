@@ -1,19 +1,54 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern
+from pymongo.read_preferences import Primary, SecondaryPreferred
 from config import settings
-from typing import Optional
+from typing import Dict, Optional
 from fastapi import HTTPException, status
+from pool_monitor import pool_monitor
+from server_timing import mongo_timing_listener
+import asyncio
+import logging
 import ssl
 import certifi
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 # Set SSL environment variables for better compatibility
 os.environ['PYTHONHTTPSVERIFY'] = '0'
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
+    last_ping_at: float = 0.0
+    last_ping_ok: bool = False
     
     
 database = Database()
+_ping_lock = asyncio.Lock()
+
+# Named write-concern tiers. "critical" is the client default (customer data,
+# idempotency keys); cheaper tiers are opted into per collection through
+# COLLECTION_WRITE_TIERS, or per call with get_collection(db, name, tier).
+# "telemetry" is fire-and-forget: the driver sends the write and returns without
+# any acknowledgement, so a rejected document or a primary going down loses it
+# silently. Only for data we can afford to drop, such as the audit trail.
+WRITE_CONCERN_TIERS: Dict[str, WriteConcern] = {
+    "critical": WriteConcern(w="majority"),  # survives a primary failover
+    "standard": WriteConcern(w=1),           # acknowledged by the primary
+    "telemetry": WriteConcern(w=0),          # unacknowledged; errors are never reported
+}
+
+
+def write_concern_for(name: str, tier: Optional[str] = None) -> WriteConcern:
+    """Write concern for a collection: the explicit tier, else its configured tier"""
+    tier = tier or settings.COLLECTION_WRITE_TIERS.get(name, "critical")
+    return WRITE_CONCERN_TIERS[tier]
+
+
+def get_collection(db, name: str, tier: Optional[str] = None):
+    """A collection handle that writes with its tier's write concern"""
+    return db.get_collection(name, write_concern=write_concern_for(name, tier))
 
 
 async def get_database():
@@ -26,23 +61,50 @@ async def get_database():
     return database.client[settings.DATABASE_NAME]
 
 
+def read_preference_for(route: str):
+    """Read preference for an endpoint: secondaryPreferred if READ_ROUTING sends it to secondaries"""
+    if settings.READ_ROUTING.get(route, "primary") == "secondary":
+        return SecondaryPreferred(max_staleness=settings.READ_MAX_STALENESS_SECONDS)
+    return Primary()
+
+
+def routed_database(route: str):
+    """
+    Build a dependency that returns the database with the read preference
+    configured for `route`. Reporting reads can then be served by secondaries
+    while everything else, including reads that must see the caller's own
+    writes, stays on the primary.
+    """
+    async def dependency():
+        await get_database()
+        return database.client.get_database(settings.DATABASE_NAME, read_preference=read_preference_for(route))
+    
+    return dependency
+
+
 async def connect_to_mongo():
     """Connect to MongoDB with SSL handling for Python 3.11+"""
     
     # MongoDB connection options
     connection_options = {
-        "serverSelectionTimeoutMS": 15000,
-        "connectTimeoutMS": 15000,
-        "socketTimeoutMS": 15000,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS,
         "retryWrites": True,
         "w": "majority",
-        "maxPoolSize": 10,
-        "minPoolSize": 1,
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "event_listeners": [pool_monitor, mongo_timing_listener],
     }
+    if settings.MONGO_OPERATION_TIMEOUT_MS:
+        connection_options["timeoutMS"] = settings.MONGO_OPERATION_TIMEOUT_MS
+    pool_monitor.max_pool_size = settings.MONGO_MAX_POOL_SIZE
     
     try:
         # Method 1: Try with tlsAllowInvalidCertificates only
-        print("🔄 Connecting to MongoDB (method 1: tlsAllowInvalidCertificates)...")
+        logger.info("Connecting to MongoDB", extra={"method": "tlsAllowInvalidCertificates"})
         database.client = AsyncIOMotorClient(
             settings.MONGODB_URL,
             tls=True,
@@ -51,48 +113,76 @@ async def connect_to_mongo():
         )
         # Test the connection
         await database.client.admin.command('ping')
-        print("✅ Connected to MongoDB successfully!")
+        logger.info("Connected to MongoDB", extra={"method": "tlsAllowInvalidCertificates"})
         return
     except Exception as e:
-        print(f"⚠️  Method 1 failed: {str(e)[:150]}")
+        logger.warning("MongoDB connection failed: %s", str(e)[:150], extra={"method": "tlsAllowInvalidCertificates"})
         database.client = None
     
     try:
         # Method 2: Try with certifi CA file
-        print("🔄 Connecting to MongoDB (method 2: certifi CA file)...")
+        logger.info("Connecting to MongoDB", extra={"method": "certifi"})
         database.client = AsyncIOMotorClient(
             settings.MONGODB_URL,
             tlsCAFile=certifi.where(),
             **connection_options
         )
         await database.client.admin.command('ping')
-        print("✅ Connected to MongoDB with certifi!")
+        logger.info("Connected to MongoDB", extra={"method": "certifi"})
         return
     except Exception as e:
-        print(f"⚠️  Method 2 failed: {str(e)[:150]}")
+        logger.warning("MongoDB connection failed: %s", str(e)[:150], extra={"method": "certifi"})
         database.client = None
     
     try:
         # Method 3: Try with no TLS options (let pymongo handle it)
-        print("🔄 Connecting to MongoDB (method 3: default SSL)...")
+        logger.info("Connecting to MongoDB", extra={"method": "default"})
         database.client = AsyncIOMotorClient(
             settings.MONGODB_URL,
             **connection_options
         )
         await database.client.admin.command('ping')
-        print("✅ Connected to MongoDB with default SSL!")
+        logger.info("Connected to MongoDB", extra={"method": "default"})
         return
     except Exception as e:
-        print(f"⚠️  Method 3 failed: {str(e)[:150]}")
+        logger.warning("MongoDB connection failed: %s", str(e)[:150], extra={"method": "default"})
         database.client = None
     
-    print("❌ All MongoDB connection attempts failed")
-    print("⚠️  Application will return 503 errors for database operations")
-    print("💡 Check: 1) MongoDB Atlas IP whitelist, 2) Connection string, 3) Network access")
+    logger.error(
+        "All MongoDB connection attempts failed; database operations will return 503. "
+        "Check: 1) MongoDB Atlas IP whitelist, 2) Connection string, 3) Network access"
+    )
 
 
 async def close_mongo_connection():
     """Close MongoDB connection"""
     if database.client:
         database.client.close()
-        print("Closed MongoDB connection")
+        logger.info("Closed MongoDB connection")
+
+
+async def ping_database() -> bool:
+    """
+    Ping MongoDB, caching the result for READY_PING_CACHE_SECONDS so that
+    frequent readiness probes do not add load to the cluster.
+    """
+    if database.client is None:
+        return False
+    
+    if time.monotonic() - database.last_ping_at < settings.READY_PING_CACHE_SECONDS:
+        return database.last_ping_ok
+    
+    async with _ping_lock:
+        # Another probe may have refreshed the result while we waited
+        if time.monotonic() - database.last_ping_at < settings.READY_PING_CACHE_SECONDS:
+            return database.last_ping_ok
+        try:
+            await asyncio.wait_for(
+                database.client.admin.command('ping'),
+                timeout=settings.READY_PING_TIMEOUT_SECONDS
+            )
+            database.last_ping_ok = True
+        except Exception:
+            database.last_ping_ok = False
+        database.last_ping_at = time.monotonic()
+        return database.last_ping_ok
@@ -0,0 +1,185 @@
+"""
+End-to-end request deadlines.
+
+Every API request gets a time budget when it arrives: REQUEST_DEADLINES_MS
+for its route class (the admission control classes), shortened by an
+`X-Request-Timeout-Ms` header if the client will give up sooner. The
+deadline is kept in a context variable and enforced three ways:
+
+- MongoDB: the request runs inside `pymongo.timeout()`, so every operation
+  is sent with maxTimeMS set to the time left (less the round trip) and
+  fails fast once none is left, instead of holding a pool connection.
+- SMS: provider HTTP calls wait at most the time left (`clamp()`).
+- Everything else: the request is cancelled when the deadline passes.
+
+Handlers that make several writes run them through `run_to_completion()`:
+it refuses to start once the deadline has passed, and after that the
+writes are no longer cancelled. This means a booking can't be left without
+its assignment, and a rollup update can't be skipped.
+
+A request that runs out of time is answered with 504. Once the response has
+been sent, background tasks are no longer cancelled; work that outlives the
+request (group commit flushes, notifications) runs in its own context and
+has no deadline. Work shared between requests (single-flight calls) runs in
+its own context under its own deadline for the route class (`bounded()`).
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+import pymongo
+from fastapi.responses import JSONResponse
+from pymongo.errors import PyMongoError
+from admission import classify_route
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_HEADER = b"x-request-timeout-ms"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+_cancel_timer: ContextVar[Optional[asyncio.Timeout]] = ContextVar("request_cancel_timer", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before the work could be done"""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request; None outside a request with a deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def clamp(timeout: float) -> float:
+    """`timeout` shortened to the time left, raising DeadlineExceeded when none is"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(timeout, left)
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def is_deadline_error(error: BaseException) -> bool:
+    """Whether an exception means the request ran out of time"""
+    if isinstance(error, (DeadlineExceeded, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, PyMongoError) and error.timeout
+
+
+def detached(fn):
+    """Wrap a coroutine function (a background task) to run without the request's deadline"""
+    @functools.wraps(fn)
+    async def run(*args, **kwargs):
+        return await asyncio.create_task(fn(*args, **kwargs), context=contextvars.Context())
+    return run
+
+
+async def bounded(fn: Callable[[], Awaitable[Any]], budget: Optional[float]) -> Any:
+    """Await fn() under a deadline of its own (`budget` seconds), as if it were a request"""
+    if not budget:
+        return await fn()
+    token = _deadline.set(time.monotonic() + budget)
+    try:
+        with pymongo.timeout(budget):
+            async with asyncio.timeout(budget):
+                return await fn()
+    finally:
+        _deadline.reset(token)
+
+
+async def run_to_completion(fn: Callable[[], Awaitable[Any]], budget: Optional[float]) -> Any:
+    """
+    Run fn() (the writes of a handler) to the end, even if the request's
+    deadline passes meanwhile. Raises DeadlineExceeded without starting when
+    no time is left. Once started, the request is no longer cancelled, and the
+    work runs in its own context under `budget` seconds.
+    """
+    if expired():
+        raise DeadlineExceeded("Request deadline exceeded")
+    timer = _cancel_timer.get()
+    if timer is not None:
+        timer.reschedule(None)
+    task = asyncio.get_running_loop().create_task(bounded(fn, budget), context=contextvars.Context())
+    return await asyncio.shield(task)
+
+
+def class_budget(route_class: str) -> Optional[float]:
+    """Seconds allowed for requests of a route class, or None when it has no deadline"""
+    budget_ms = settings.REQUEST_DEADLINES_MS.get(route_class, settings.REQUEST_DEADLINE_DEFAULT_MS)
+    return budget_ms / 1000 if budget_ms else None
+
+
+def request_budget(scope) -> Optional[float]:
+    """Seconds allowed for a request, or None for paths without a deadline"""
+    route_class = classify_route(scope["method"], scope["path"])
+    if route_class is None:
+        return None
+    budget_ms = settings.REQUEST_DEADLINES_MS.get(route_class.value, settings.REQUEST_DEADLINE_DEFAULT_MS)
+    
+    # Clients may ask for less time than the route allows, never more
+    requested = dict(scope.get("headers") or []).get(REQUEST_HEADER)
+    if requested:
+        try:
+            budget_ms = min(budget_ms, max(float(requested), settings.REQUEST_DEADLINE_MIN_MS))
+        except ValueError:
+            pass
+    return budget_ms / 1000 if budget_ms else None
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that runs each API request under its deadline"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        budget = request_budget(scope) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        
+        response_started = False
+        timeout = asyncio.timeout(budget)
+        
+        async def send_and_disarm(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Background tasks run after the body; let them finish
+                timeout.reschedule(None)
+            await send(message)
+        
+        token = _deadline.set(time.monotonic() + budget)
+        timer_token = _cancel_timer.set(timeout)
+        try:
+            with pymongo.timeout(budget):
+                async with timeout:
+                    await self.app(scope, receive, send_and_disarm)
+        except Exception as e:
+            if response_started or not is_deadline_error(e):
+                raise
+            logger.warning(
+                "Request %s %s exceeded its %.0f ms deadline", scope["method"], scope["path"], budget * 1000,
+                extra={"event": "request.deadline_exceeded"}
+            )
+            response = JSONResponse(
+                status_code=504,
+                content={"detail": "Request deadline exceeded"}
+            )
+            await response(scope, receive, send)
+        finally:
+            _cancel_timer.reset(timer_token)
+            _deadline.reset(token)
@@ -0,0 +1,84 @@
+"""
+Local stand-in for the Zong and Twilio SMS gateways.
+
+Answers the way the real gateways do (Zong: "0|success|..." text, Twilio: a
+201 with a JSON message), with optional injected latency and failures, so the
+SMS providers, their timeouts, circuit breakers and failover can be exercised
+without sending real messages:
+
+    python fake_sms_gateway.py --port 8025 --latency-ms 200 --error-rate 0.3
+
+then point the API at it, e.g.
+
+    SMS_PROVIDERS='["zong", "twilio"]'
+    ZONG_API_URL=http://localhost:8025/zong
+    TWILIO_ACCOUNT_SID=AC_test TWILIO_AUTH_TOKEN=test TWILIO_FROM_NUMBER=+15005550006
+    TWILIO_API_URL=http://localhost:8025/twilio
+
+Failures alternate between 5xx responses and gateway-level rejections;
+`--hang-rate` requests never answer, to exercise timeouts. Paths containing
+"/down" always fail, for a provider that is hard down.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def make_handler(args):
+    class FakeGatewayHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+            time.sleep(args.latency_ms / 1000)
+            
+            if random.random() < args.hang_rate:
+                time.sleep(args.hang_seconds)
+            failing = "/down" in self.path or random.random() < args.error_rate
+            twilio = "twilio" in self.path
+            
+            if failing and random.random() < 0.5:
+                self._reply(503, "text/plain", "Service Unavailable")
+            elif twilio:
+                if failing:
+                    self._reply(400, "application/json", json.dumps({"code": 21610, "message": "Message rejected"}))
+                else:
+                    self._reply(201, "application/json", json.dumps({"sid": f"SM{random.getrandbits(64):016x}", "to": form.get("To"), "status": "queued"}))
+            else:
+                if failing:
+                    self._reply(200, "text/plain", "1|failure|Gateway rejected the message")
+                else:
+                    self._reply(200, "text/plain", f"0|success|{random.getrandbits(32)}")
+            
+            recipient = form.get("Destination") or form.get("To")
+            print(f"{'❌' if failing else '✅'} {self.path} -> {recipient}: {form.get('Message') or form.get('Body')}")
+        
+        def _reply(self, status_code, content_type, body):
+            self.send_response(status_code)
+            self.send_header("Content-Type", content_type)
+            self.end_headers()
+            self.wfile.write(body.encode())
+        
+        def log_message(self, format, *log_args):
+            pass
+    
+    return FakeGatewayHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Zong/Twilio SMS gateway with injected latency and errors")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests that fail (0-1)")
+    parser.add_argument("--hang-rate", type=float, default=0, help="Fraction of requests that stall for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=60)
+    args = parser.parse_args()
+    
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args))
+    print(f"📡 Fake SMS gateway on http://127.0.0.1:{args.port} (/zong, /twilio, /down/...)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import logging
+from typing import Dict, List, Optional, Tuple
+from pymongo.errors import BulkWriteError, PyMongoError
+from config import settings
+from database import database, get_collection
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitBuffer:
+    """
+    Batches concurrent inserts into one collection.
+    
+    Documents added within GROUP_COMMIT_MAX_DELAY_MS of the first pending one
+    are written with a single unordered insert_many, or as soon as
+    GROUP_COMMIT_MAX_BATCH are waiting, so a burst of small writes costs one
+    round trip (and one replication wait) instead of one per document.
+    
+    `insert()` waits until its document is written and raises if that failed;
+    `add()` does not wait, and failures are only logged. On an unacknowledged
+    (w: 0) tier a batch counts as written once it is sent, so neither sees
+    server-side failures.
+    """
+    
+    def __init__(
+        self,
+        collection_name: str,
+        tier: Optional[str] = None,
+        max_batch: Optional[int] = None,
+        max_delay_ms: Optional[float] = None
+    ):
+        self.collection_name = collection_name
+        self.tier = tier
+        self.max_batch = max_batch or settings.GROUP_COMMIT_MAX_BATCH
+        self.max_delay = (max_delay_ms if max_delay_ms is not None else settings.GROUP_COMMIT_MAX_DELAY_MS) / 1000
+        self._pending: List[Tuple[dict, Optional[asyncio.Future]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+        self.batches = 0
+        self.documents = 0
+        self.failed = 0
+    
+    async def insert(self, document: dict) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(document, future)
+        await future
+    
+    def add(self, document: dict) -> None:
+        self._enqueue(document, None)
+    
+    def _enqueue(self, document: dict, future: Optional[asyncio.Future]) -> None:
+        self._pending.append((document, future))
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._start_flush)
+    
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        # A batch serves many requests: don't inherit the deadline of the one that filled it
+        task = asyncio.create_task(self._write(batch), context=contextvars.Context())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+    
+    async def _write(self, batch: List[Tuple[dict, Optional[asyncio.Future]]]) -> None:
+        failed: Dict[int, BaseException] = {}
+        try:
+            if database.client is None:
+                raise PyMongoError("Database connection not available")
+            collection = get_collection(database.client[settings.DATABASE_NAME], self.collection_name, self.tier)
+            await collection.insert_many([document for document, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # Unordered: only the documents listed in writeErrors were rejected
+            for error in e.details.get("writeErrors", []):
+                failed[error["index"]] = PyMongoError(error.get("errmsg", "write error"))
+        except BaseException as e:
+            # Anything else (cancelled at shutdown, a document BSON can't encode)
+            # fails the whole batch; waiters must never be left hanging
+            failed = {index: e for index in range(len(batch))}
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self._settle(batch, failed)
+    
+    def _settle(self, batch: List[Tuple[dict, Optional[asyncio.Future]]], failed: Dict[int, BaseException]) -> None:
+        self.batches += 1
+        self.documents += len(batch)
+        self.failed += len(failed)
+        if failed:
+            logger.warning(
+                "Group commit to %s: %d of %d inserts failed", self.collection_name, len(failed), len(batch)
+            )
+        
+        for index, (_, future) in enumerate(batch):
+            if future is None or future.done():
+                continue
+            if isinstance(failed.get(index), asyncio.CancelledError):
+                future.cancel()
+            elif index in failed:
+                future.set_exception(failed[index])
+            else:
+                future.set_result(None)
+    
+    async def flush(self) -> None:
+        """Write everything pending now and wait for in-flight batches"""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+    
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "documents": self.documents,
+            "failed": self.failed,
+            "average_batch_size": round(self.documents / self.batches, 2) if self.batches else None,
+        }
+
+
+audit_events = GroupCommitBuffer("audit_events")
+
+buffers: Dict[str, GroupCommitBuffer] = {
+    audit_events.collection_name: audit_events,
+}
+
+
+async def flush_all() -> None:
+    """Flush every buffer (on shutdown, before the client is closed)"""
+    await asyncio.gather(*(buffer.flush() for buffer in buffers.values()))
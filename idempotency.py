@@ -0,0 +1,149 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+from auth import get_current_user
+from config import settings
+from database import get_database
+from models import TokenData
+
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+class IdempotentRequest:
+    """
+    Handle for one call to an idempotent endpoint.
+    
+    `replay` is the stored response when the key was already used for a
+    completed call; the endpoint returns it as-is. Otherwise the endpoint runs
+    normally and passes its result to `complete()` before returning.
+    """
+    
+    def __init__(self, collection=None, record_id: Optional[str] = None):
+        self.collection = collection
+        self.record_id = record_id
+        self.replay: Optional[JSONResponse] = None
+        self.completed = False
+    
+    async def complete(self, response, status_code: int = status.HTTP_200_OK):
+        """Store the response for replays and hand it back to the endpoint"""
+        if self.record_id is not None:
+            await self.collection.update_one(
+                {"_id": self.record_id},
+                {"$set": {
+                    "state": "completed",
+                    "status_code": status_code,
+                    "response": jsonable_encoder(response),
+                    "expires_at": datetime.utcnow() + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+                }}
+            )
+        self.completed = True
+        return response
+    
+    async def release(self) -> None:
+        """Forget a key whose call failed, so the client can retry it"""
+        if self.record_id is not None and not self.completed:
+            await self.collection.delete_one({"_id": self.record_id, "state": "in_progress"})
+
+
+# Used when an endpoint is called without an Idempotency-Key (or directly from code)
+NOT_IDEMPOTENT = IdempotentRequest()
+
+
+def _fingerprint(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _replay(record: dict) -> JSONResponse:
+    return JSONResponse(
+        status_code=record["status_code"],
+        content=record["response"],
+        headers={REPLAY_HEADER: "true"}
+    )
+
+
+def idempotent(scope: str):
+    """
+    Build a FastAPI dependency that honours the Idempotency-Key header.
+    
+    The first call with a key claims it in the `idempotency_keys` collection
+    (unique _id per user, scope and key) and runs the endpoint; its response is
+    stored until the TTL index removes it. Retries with the same key and body
+    get the stored response without repeating writes or SMS side effects, a
+    retry that arrives while the first call is still running gets 409, and a
+    key reused with a different body gets 422.
+    """
+    async def dependency(
+        request: Request,
+        current_user: TokenData = Depends(get_current_user),
+        db=Depends(get_database)
+    ):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            yield NOT_IDEMPOTENT
+            return
+        
+        if len(key) > 255:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{IDEMPOTENCY_HEADER} must be at most 255 characters"
+            )
+        
+        collection = db[IDEMPOTENCY_COLLECTION]
+        record_id = f"{scope}:{current_user.user_id}:{key}"
+        fingerprint = _fingerprint(request, await request.body())
+        now = datetime.utcnow()
+        claim = {
+            "_id": record_id,
+            "fingerprint": fingerprint,
+            "state": "in_progress",
+            "created_at": now,
+            # A call that never finishes (crashed worker) frees the key after this
+            "expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        }
+        
+        try:
+            await collection.insert_one(claim)
+        except DuplicateKeyError:
+            existing = await collection.find_one({"_id": record_id})
+            if existing and existing["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"{IDEMPOTENCY_HEADER} was already used with a different request"
+                )
+            
+            if existing and existing["state"] == "completed":
+                handle = IdempotentRequest()
+                handle.replay = _replay(existing)
+                yield handle
+                return
+            
+            # Take over a claim left behind by a call that never finished
+            taken = None
+            if existing and existing["expires_at"] < now:
+                taken = await collection.replace_one(
+                    {"_id": record_id, "state": "in_progress", "expires_at": existing["expires_at"]},
+                    claim
+                )
+            if taken is None or taken.modified_count == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still being processed",
+                    headers={"Retry-After": "1"}
+                )
+        
+        handle = IdempotentRequest(collection, record_id)
+        try:
+            yield handle
+        finally:
+            await handle.release()
+    
+    return dependency
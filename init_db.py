@@ -1,8 +1,35 @@
+"""
+Create collections, indexes and the default admin:
+
+    python init_db.py
+
+With --seed, also load reproducible synthetic data at production scale
+(users, technicians, service requests across every type and status, and
+feedback), for benchmarks and query-plan checks against realistic volumes:
+
+    python init_db.py --seed --requests 1000000
+    python init_db.py --seed --requests 200000 --users 50000 --days 730 --random-seed 7
+
+The same --random-seed and scale always produce the same documents (ids
+included). Documents are generated in batches and written with unordered
+insert_many calls, --concurrency batches at a time. Seeded users and
+technicians use phone numbers starting with 039 and 038, and all seeded
+users share the password given by --password.
+"""
+import argparse
 import asyncio
+import random
+import struct
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Iterator, List
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
 from auth import get_password_hash
 from config import settings
+from database import get_collection
+from models import RequestStatus, ServiceType
 
 async def init_database():
     print("🔄 Connecting to MongoDB Atlas...")
@@ -51,22 +78,68 @@ async def init_database():
         # Service requests collection
         service_requests_collection = db["service_requests"]
         await service_requests_collection.create_index("user_id")
+        await service_requests_collection.create_index([("user_id", 1), ("created_at", -1)])
+        await service_requests_collection.create_index([("user_id", 1), ("status", 1), ("completed_at", -1)])
         await service_requests_collection.create_index("status")
         await service_requests_collection.create_index("created_at")
+        await service_requests_collection.create_index("updated_at")
+        await service_requests_collection.create_index(
+            [("name", "text"), ("address", "text"), ("issue_description", "text")],
+            weights={"name": 10, "address": 5, "issue_description": 1},
+            name="service_request_text"
+        )
         print("✅ Service requests collection created")
         
+        # Archive of long-finished service requests (filled by archiver.py)
+        archive_collection = db["service_requests_archive"]
+        await archive_collection.create_index([("user_id", 1), ("created_at", -1)])
+        await archive_collection.create_index([("status", 1), ("created_at", -1)])
+        await archive_collection.create_index("created_at")
+        print("✅ Service requests archive collection created")
+        
         # Feedback collection
         feedback_collection = db["feedback"]
         await feedback_collection.create_index("service_request_id", unique=True)
         await feedback_collection.create_index("user_id")
         print("✅ Feedback collection created")
         
+        # Technicians and their bookings (interval queries per technician)
+        technicians_collection = db["technicians"]
+        await technicians_collection.create_index("phone_number", unique=True)
+        await technicians_collection.create_index("skills")
+        bookings_collection = db["technician_bookings"]
+        await bookings_collection.create_index([("technician_id", 1), ("start", 1), ("end", 1)])
+        await bookings_collection.create_index("service_request_id", unique=True)
+        await bookings_collection.create_index("end")
+        await db["technician_booking_locks"].create_index("expires_at", expireAfterSeconds=0)
+        print("✅ Technicians collection created")
+        
+        # Daily analytics rollups (one document per UTC day)
+        analytics_daily_collection = db["analytics_daily"]
+        await analytics_daily_collection.create_index("day")
+        print("✅ Analytics rollups collection created")
+        
         # OTPs collection (for phone verification)
         otp_collection = db["otps"]
         await otp_collection.create_index("phone_number")
         await otp_collection.create_index("created_at", expireAfterSeconds=300)  # Auto-delete after 5 minutes
         print("✅ OTP collection created")
         
+        # Rate limit buckets (shared mode); expire once a bucket would be full again
+        rate_limits_collection = db["rate_limits"]
+        await rate_limits_collection.create_index("expires_at", expireAfterSeconds=0)
+        print("✅ Rate limits collection created")
+        
+        # Idempotency keys (unique _id per user, endpoint and key); stored responses expire
+        idempotency_collection = db["idempotency_keys"]
+        await idempotency_collection.create_index("expires_at", expireAfterSeconds=0)
+        print("✅ Idempotency keys collection created")
+        
+        # Audit events (written in batches by the group-commit buffer)
+        audit_events_collection = db["audit_events"]
+        await audit_events_collection.create_index([("service_request_id", 1), ("created_at", -1)])
+        print("✅ Audit events collection created")
+        
         print("\n🎉 Database initialization complete!")
         print(f"📊 Database: {settings.DATABASE_NAME}")
         print(f"🌍 Region: Mumbai, India (ap-south-1)")
@@ -83,5 +156,337 @@ async def init_database():
         print("3. Verify Network Access allows your IP (0.0.0.0/0)")
         print("4. Check if cluster is fully deployed (wait 3-5 minutes)")
 
+
+FIRST_NAMES = [
+    "Ahmed", "Ali", "Usman", "Bilal", "Hamza", "Hassan", "Zain", "Omar", "Fahad", "Imran",
+    "Ayesha", "Fatima", "Sana", "Hira", "Maryam", "Zainab", "Amna", "Sara", "Nida", "Iqra",
+]
+LAST_NAMES = [
+    "Khan", "Ahmed", "Malik", "Butt", "Chaudhry", "Qureshi", "Sheikh", "Raza", "Siddiqui", "Iqbal",
+    "Hussain", "Mirza", "Javed", "Akhtar", "Aslam",
+]
+AREAS = [
+    "DHA Phase 5, Lahore", "Gulberg III, Lahore", "Johar Town, Lahore", "Model Town, Lahore",
+    "F-7/2, Islamabad", "G-11/3, Islamabad", "Bahria Town, Rawalpindi", "Satellite Town, Rawalpindi",
+    "Clifton Block 5, Karachi", "Gulshan-e-Iqbal, Karachi", "North Nazimabad, Karachi", "Hayatabad, Peshawar",
+]
+ISSUES = {
+    ServiceType.PLUMBER: [
+        "Kitchen sink is leaking under the cabinet",
+        "Bathroom geyser not heating water",
+        "Water tank overflowing, float valve broken",
+        "Blocked drain in the main bathroom",
+        "Low water pressure on the upper floor",
+    ],
+    ServiceType.ELECTRICIAN: [
+        "Main breaker trips when the AC is switched on",
+        "Ceiling fan making noise and running slow",
+        "No power in two rooms after load shedding",
+        "Need UPS wiring for the lounge and bedrooms",
+        "Switchboard sparking in the kitchen",
+    ],
+    ServiceType.DRIVER: [
+        "Need a driver for airport pick-up and drop",
+        "Driver required for a day of errands in the city",
+        "Need a driver for an intercity trip",
+        "School pick-up and drop for the week",
+    ],
+    ServiceType.HELPER: [
+        "Help shifting furniture to the new house",
+        "Cleaning help needed before a family event",
+        "Need help loading and unloading a truck",
+        "General household help for a few hours",
+    ],
+}
+ADMIN_RESPONSES = [
+    "Technician assigned, will call before arriving.",
+    "We have scheduled your visit.",
+    "Parts required, technician will bring them.",
+    "Thank you for your patience, work is in progress.",
+]
+FEEDBACK_COMMENTS = [
+    "Very professional and on time.", "Good work, fixed the issue quickly.", "Fair price and polite behaviour.",
+    "Took longer than expected.", "Had to call twice before they arrived.", None, None,
+]
+
+SEED_KINDS = {"users": 1, "technicians": 2, "service_requests": 3, "feedback": 4}
+
+
+def seeded_id(kind: str, index: int, moment: datetime, random_seed: int) -> ObjectId:
+    """Deterministic ObjectId: the document's timestamp, then kind, seed and index"""
+    return ObjectId(struct.pack(
+        ">IB3sI",
+        int(moment.timestamp()),
+        SEED_KINDS[kind],
+        (random_seed & 0xFFFFFF).to_bytes(3, "big"),
+        index & 0xFFFFFFFF
+    ))
+
+
+def batch_rng(random_seed: int, kind: str, batch: int) -> random.Random:
+    """Independent generator per batch, so batches can be produced in any order"""
+    return random.Random(f"{random_seed}:{kind}:{batch}")
+
+
+def signup_window(args, now: datetime) -> tuple:
+    """Users sign up over the seeded history plus a month before it"""
+    span = timedelta(days=args.days + 30)
+    return now - span, span
+
+
+def generate_users(args, now: datetime, password_hash: str) -> Iterator[List[dict]]:
+    origin, span = signup_window(args, now)
+    for batch, first in enumerate(range(0, args.users, args.batch_size)):
+        rng = batch_rng(args.random_seed, "users", batch)
+        documents = []
+        for index in range(first, min(first + args.batch_size, args.users)):
+            # Sign-up time grows with the index, so a request can pick any user below a cut-off
+            created_at = origin + span * ((index + rng.random()) / args.users)
+            documents.append({
+                "_id": seeded_id("users", index, created_at, args.random_seed),
+                "phone_number": f"039{index:08d}",
+                "phone_normalized": f"+9239{index:08d}",
+                "hashed_password": password_hash,
+                "is_active": rng.random() > 0.01,
+                "is_verified": True,
+                "created_at": created_at,
+            })
+        yield documents
+
+
+def generate_technicians(args, now: datetime) -> List[dict]:
+    rng = batch_rng(args.random_seed, "technicians", 0)
+    service_types = list(ServiceType)
+    technicians = []
+    for index in range(args.technicians):
+        created_at = now - timedelta(days=args.days + 30)
+        primary = service_types[index % len(service_types)]
+        skills = {primary, *rng.sample(service_types, rng.choice([0, 0, 1]))}
+        technicians.append({
+            "_id": seeded_id("technicians", index, created_at, args.random_seed),
+            "name": f"{rng.choice(FIRST_NAMES[:10])} {rng.choice(LAST_NAMES)}",
+            "phone_number": f"038{index:08d}",
+            "skills": sorted(skill.value for skill in skills),
+            "is_active": rng.random() > 0.05,
+            "created_at": created_at,
+        })
+    return technicians
+
+
+def request_status(rng: random.Random, age: timedelta) -> RequestStatus:
+    """Recent requests are mostly open; older ones mostly finished"""
+    if age < timedelta(days=1):
+        weights = [45, 25, 20, 7, 3]
+    elif age < timedelta(days=7):
+        weights = [8, 10, 12, 60, 10]
+    else:
+        weights = [1, 1, 1, 85, 12]
+    return rng.choices(
+        [RequestStatus.PENDING, RequestStatus.ASSIGNED, RequestStatus.IN_PROGRESS, RequestStatus.COMPLETED, RequestStatus.CANCELLED],
+        weights=weights
+    )[0]
+
+
+def generate_requests(args, now: datetime, user_ids: List[str], technicians_by_skill: dict) -> Iterator[tuple]:
+    """Batches of (service requests, feedback)"""
+    service_types = list(ServiceType)
+    origin, span = signup_window(args, now)
+    for batch, first in enumerate(range(0, args.requests, args.batch_size)):
+        rng = batch_rng(args.random_seed, "service_requests", batch)
+        requests, feedback = [], []
+        for index in range(first, min(first + args.batch_size, args.requests)):
+            # Busier on recent days: the square pulls ages towards zero
+            age = timedelta(seconds=(rng.random() ** 2) * args.days * 86400)
+            created_at = now - age
+            request_id = seeded_id("service_requests", index, created_at, args.random_seed)
+            service_type = rng.choices(service_types, weights=[40, 35, 15, 10])[0]
+            status = request_status(rng, age)
+            # Only users who had signed up by then
+            signed_up = max(1, int(len(user_ids) * ((created_at - origin) / span)))
+            user_index = rng.randrange(signed_up)
+            user_id = user_ids[user_index]
+            preferred_time = created_at + timedelta(hours=rng.choice([2, 4, 6, 24, 48]))
+            hours_required = rng.randint(1, 8) if service_type == ServiceType.HELPER else None
+            
+            request = {
+                "_id": request_id,
+                "user_id": user_id,
+                "user_phone": f"039{user_index:08d}",
+                "service_type": service_type.value,
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "address": f"House {rng.randint(1, 999)}, Street {rng.randint(1, 60)}, {rng.choice(AREAS)}",
+                "contact_number": f"03{rng.randint(0, 999999999):09d}",
+                "preferred_time": preferred_time.replace(minute=0, second=0, microsecond=0),
+                "issue_description": rng.choice(ISSUES[service_type]),
+                "hours_required": hours_required,
+                "hourly_rate": 600.0 if hours_required else None,
+                "total_cost": hours_required * 600.0 if hours_required else None,
+                "status": status.value,
+                "admin_response": None,
+                "technician_name": None,
+                "technician_phone": None,
+                "estimated_arrival_time": None,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "completed_at": None,
+            }
+            
+            technicians = technicians_by_skill.get(service_type.value)
+            if status != RequestStatus.PENDING and status != RequestStatus.CANCELLED and technicians:
+                technician = rng.choice(technicians)
+                request.update({
+                    "technician_id": str(technician["_id"]),
+                    "technician_name": technician["name"],
+                    "technician_phone": technician["phone_number"],
+                    "admin_response": rng.choice(ADMIN_RESPONSES),
+                    "updated_at": created_at + timedelta(minutes=rng.randint(5, 240)),
+                })
+            if status == RequestStatus.COMPLETED:
+                # Mostly same day, with a long tail of multi-day jobs
+                completed_at = min(now, created_at + timedelta(hours=min(rng.lognormvariate(1.3, 0.9), 720)))
+                request["completed_at"] = completed_at
+                request["updated_at"] = completed_at
+                if rng.random() < args.feedback_ratio:
+                    feedback.append({
+                        "_id": seeded_id("feedback", index, completed_at, args.random_seed),
+                        "service_request_id": str(request_id),
+                        "user_id": user_id,
+                        "technician_name": request["technician_name"] or "Unknown",
+                        "technician_id": request.get("technician_id"),
+                        "service_type": service_type.value,
+                        "rating": rng.choices([1, 2, 3, 4, 5], weights=[3, 4, 10, 33, 50])[0],
+                        "comment": rng.choice(FEEDBACK_COMMENTS),
+                        "created_at": completed_at + timedelta(hours=rng.uniform(0.1, 48)),
+                    })
+            elif status == RequestStatus.CANCELLED:
+                request["updated_at"] = created_at + timedelta(hours=rng.uniform(0.1, 24))
+            
+            requests.append(request)
+        yield requests, feedback
+
+
+class BulkLoader:
+    """Keeps up to `concurrency` unordered insert_many calls in flight"""
+    
+    def __init__(self, db, concurrency: int):
+        self.db = db
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self.inserted = {}
+        self.skipped = {}
+    
+    async def insert(self, collection_name: str, documents: List[dict]) -> None:
+        if not documents:
+            return
+        await self._slots.acquire()
+        task = asyncio.create_task(self._write(collection_name, documents))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _write(self, collection_name: str, documents: List[dict]) -> None:
+        try:
+            # Seed data is disposable: skip the replication wait. Still acknowledged,
+            # since duplicates are counted and the rollups read it straight back
+            collection = get_collection(self.db, collection_name, "standard")
+            await collection.insert_many(documents, ordered=False, bypass_document_validation=True)
+            inserted = len(documents)
+        except BulkWriteError as e:
+            # Ids are deterministic, so re-running a seed only adds what is missing
+            duplicates = [error for error in e.details.get("writeErrors", []) if error.get("code") == 11000]
+            if len(duplicates) != len(e.details.get("writeErrors", [])):
+                raise
+            inserted = e.details.get("nInserted", 0)
+            self.skipped[collection_name] = self.skipped.get(collection_name, 0) + len(duplicates)
+        finally:
+            self._slots.release()
+        self.inserted[collection_name] = self.inserted.get(collection_name, 0) + inserted
+    
+    async def wait(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+
+async def seed_database(args) -> None:
+    from analytics_rollup import rebuild_daily_rollups
+    
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=5000, maxPoolSize=max(10, args.concurrency * 2))
+    db = client[settings.DATABASE_NAME]
+    # Fixed reference time, so a given seed always yields the same documents
+    now = datetime.combine(args.as_of, datetime.min.time())
+    loader = BulkLoader(db, args.concurrency)
+    started = time.perf_counter()
+    
+    print(f"🌱 Seeding {args.users} users, {args.technicians} technicians and {args.requests} service requests "
+          f"over {args.days} days (seed {args.random_seed})...")
+    
+    password_hash = get_password_hash(args.password)
+    user_ids = []
+    for documents in generate_users(args, now, password_hash):
+        user_ids.extend(str(document["_id"]) for document in documents)
+        await loader.insert("users", documents)
+    
+    technicians = generate_technicians(args, now)
+    await loader.insert("technicians", technicians)
+    technicians_by_skill = {}
+    for technician in technicians:
+        if technician["is_active"]:
+            for skill in technician["skills"]:
+                technicians_by_skill.setdefault(skill, []).append(technician)
+    
+    for batch, (requests, feedback) in enumerate(generate_requests(args, now, user_ids, technicians_by_skill)):
+        await loader.insert("service_requests", requests)
+        await loader.insert("feedback", feedback)
+        if batch % 20 == 19:
+            done = min((batch + 1) * args.batch_size, args.requests)
+            print(f"   {done} service requests generated ({done / (time.perf_counter() - started):.0f}/s)")
+    
+    await loader.wait()
+    elapsed = time.perf_counter() - started
+    for collection_name, count in loader.inserted.items():
+        skipped = loader.skipped.get(collection_name)
+        print(f"✅ {collection_name}: {count} documents" + (f" ({skipped} already present)" if skipped else ""))
+    print(f"⏱️  Loaded in {elapsed:.1f}s ({sum(loader.inserted.values()) / elapsed:.0f} documents/s)")
+    
+    if not args.skip_rollups:
+        print("🔄 Rebuilding analytics rollups for the seeded range...")
+        end = now.date()
+        chunk_start = end - timedelta(days=args.days)
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + timedelta(days=30))
+            await rebuild_daily_rollups(db, chunk_start, chunk_end)
+            chunk_start = chunk_end + timedelta(days=1)
+        print("✅ Analytics rollups rebuilt")
+    
+    client.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Initialize the database, optionally with synthetic data")
+    parser.add_argument("--seed", action="store_true", help="Also load synthetic data after initializing")
+    parser.add_argument("--requests", type=int, default=100000, help="Service requests to generate")
+    parser.add_argument("--users", type=int, help="Users to generate (default: requests / 5)")
+    parser.add_argument("--technicians", type=int, help="Technicians to generate (default: requests / 2000, at least 20)")
+    parser.add_argument("--feedback-ratio", type=float, default=0.6, help="Share of completed requests with feedback")
+    parser.add_argument("--days", type=int, default=365, help="Spread requests over the last N days")
+    parser.add_argument("--as-of", type=lambda value: datetime.fromisoformat(value).date(),
+                        default=datetime.utcnow().date(), help="Date the generated history ends (YYYY-MM-DD)")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Documents per insert_many")
+    parser.add_argument("--concurrency", type=int, default=8, help="insert_many calls in flight")
+    parser.add_argument("--password", default="password123", help="Password of every seeded user")
+    parser.add_argument("--skip-rollups", action="store_true", help="Do not rebuild analytics rollups afterwards")
+    args = parser.parse_args()
+    args.users = args.users or max(1, args.requests // 5)
+    args.technicians = args.technicians or max(20, args.requests // 2000)
+    return args
+
+
+async def main():
+    args = parse_args()
+    await init_database()
+    if args.seed:
+        await seed_database(args)
+
+
 if __name__ == "__main__":
-    asyncio.run(init_database())
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
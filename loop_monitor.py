@@ -0,0 +1,119 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A task on the loop wakes every LOOP_MONITOR_INTERVAL_MS and records how late
+it woke up: that lag is time the loop spent on something else without
+yielding. A watchdog thread checks the task's heartbeat; when the loop has
+not come back for LOOP_LAG_THRESHOLD_MS it captures the loop thread's stack,
+so the blocking call (a sync bcrypt, HTTP request or file write inside an
+async handler) is reported with the line that made it.
+
+Lag percentiles and the most frequent blocking call sites are served at
+GET /api/admin/system/event-loop.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+from config import settings
+from metrics import summarize_latencies
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _is_app_frame(frame: traceback.FrameSummary) -> bool:
+    filename = os.path.abspath(frame.filename)
+    return filename.startswith(APP_ROOT) and "site-packages" not in filename and filename != __file__
+
+
+class LoopMonitor:
+    def __init__(self, interval_ms: Optional[float] = None, threshold_ms: Optional[float] = None, samples: int = 6000):
+        self.interval = (interval_ms or settings.LOOP_MONITOR_INTERVAL_MS) / 1000
+        self.threshold = (threshold_ms or settings.LOOP_LAG_THRESHOLD_MS) / 1000
+        self._lags = deque(maxlen=samples)
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._lock = threading.Lock()
+        self.stalls = 0
+        self.call_sites: Dict[str, dict] = {}
+    
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+    
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+    
+    async def _sample(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self._lags.append(max(0.0, now - expected) * 1000)
+    
+    def _watch(self) -> None:
+        captured_for = None
+        while not self._stopping.wait(self.interval / 2):
+            heartbeat = self._heartbeat
+            late = time.monotonic() - heartbeat - self.interval
+            if late < self.threshold or captured_for == heartbeat:
+                continue
+            # One capture per stall: the loop has not ticked since `heartbeat`
+            captured_for = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._record_stall(traceback.extract_stack(frame), late * 1000)
+    
+    def _record_stall(self, stack: List[traceback.FrameSummary], lag_ms: float) -> None:
+        app_frames = [frame for frame in stack if _is_app_frame(frame)]
+        site = (app_frames or stack)[-1]
+        key = f"{os.path.relpath(site.filename, APP_ROOT)}:{site.lineno} in {site.name}"
+        with self._lock:
+            self.stalls += 1
+            entry = self.call_sites.setdefault(key, {"site": key, "line": site.line, "stalls": 0, "max_lag_ms": 0.0})
+            entry["stalls"] += 1
+            entry["max_lag_ms"] = round(max(entry["max_lag_ms"], lag_ms), 1)
+        logger.warning(
+            "Event loop blocked for at least %.0f ms at %s", lag_ms, key,
+            extra={"stack": "".join(traceback.format_list(stack[-8:]))}
+        )
+    
+    def stats(self, top: int = 10) -> dict:
+        with self._lock:
+            sites = sorted(self.call_sites.values(), key=lambda entry: (entry["stalls"], entry["max_lag_ms"]), reverse=True)
+            stalls = self.stalls
+        return {
+            "running": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": summarize_latencies(self._lags),
+            "stalls": stalls,
+            "top_blocking_sites": sites[:top],
+        }
+
+
+loop_monitor = LoopMonitor()
@@ -1,17 +1,40 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-from database import connect_to_mongo, close_mongo_connection
-from routers import user, admin
+from config import settings
+from admission import AdmissionControlMiddleware
+from deadlines import DeadlineMiddleware
+from database import connect_to_mongo, close_mongo_connection, ping_database
+from group_commit import flush_all
+from logging_config import setup_logging, shutdown_logging
+from loop_monitor import loop_monitor
+from notifier import notifier
+from pool_monitor import pool_monitor
+from server_timing import ServerTimingMiddleware
+from traffic_capture import TrafficCaptureMiddleware, trace_writer
+from routers import user, admin, system, technician, batch
+
+# Queue-based, redacted logging for the application modules
+setup_logging()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if settings.TRAFFIC_CAPTURE_ENABLED:
+        trace_writer.start()
     yield
     # Shutdown
+    await loop_monitor.stop()
+    await notifier.flush()
+    await flush_all()
     await close_mongo_connection()
+    trace_writer.stop()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -21,6 +44,22 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Admission control - shed excess load per route class with a fast 503.
+# Added before CORS so that shed responses still carry CORS headers.
+app.add_middleware(AdmissionControlMiddleware)
+
+# Per-request deadline (maxTimeMS, SMS timeouts, cancellation, 504); outside
+# admission control so time spent queued counts against it
+app.add_middleware(DeadlineMiddleware)
+
+# Per-request timing spans (Server-Timing header, slow-request log); outside
+# admission control so queueing time is part of the total
+app.add_middleware(ServerTimingMiddleware)
+
+# Sanitized request traces for replay_traffic.py (opt-in)
+if settings.TRAFFIC_CAPTURE_ENABLED:
+    app.add_middleware(TrafficCaptureMiddleware)
+
 # CORS middleware - Allow frontend access
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +79,9 @@ app.add_middleware(
 # Include routers
 app.include_router(user.router)
 app.include_router(admin.router)
+app.include_router(system.router)
+app.include_router(technician.router)
+app.include_router(batch.router)
 
 
 @app.get("/")
@@ -60,6 +102,26 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: fails when MongoDB is unreachable or the pool is saturated"""
+    pool = pool_monitor.stats()
+    
+    if not await ping_database():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "reason": "database_unreachable", "pool": pool}
+        )
+    
+    if pool_monitor.is_saturated(settings.READY_MAX_POOL_WAITERS):
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "reason": "pool_saturated", "pool": pool}
+        )
+    
+    return {"status": "ready", "pool": pool}
+
+
 if __name__ == "__main__":
     import uvicorn
     import os
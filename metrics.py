@@ -0,0 +1,21 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0-100) of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_latencies(samples: Iterable[float]) -> Dict[str, Optional[float]]:
+    """Summarize latency samples (milliseconds) into count, p50, p95, p99 and max"""
+    values = sorted(samples)
+    summary = {"count": len(values)}
+    for q in (50, 95, 99):
+        value = percentile(values, q)
+        summary[f"p{q}"] = round(value, 3) if value is not None else None
+    summary["max"] = round(values[-1], 3) if values else None
+    return summary
@@ -0,0 +1,222 @@
+"""
+Versioned, resumable data migrations (schema backfills).
+
+    python migrate.py                 # apply every pending migration, in version order
+    python migrate.py --list          # show each migration's state and progress
+    python migrate.py --only 3 --rate 500 --max-lag 5
+
+Migrations are defined in migrations.py. Each run is recorded in the
+`migrations` collection under its version; a document migration walks its
+collection in `_id` order, in batches, and saves the last `_id` after every
+batch, so a run stopped with Ctrl+C (or a crash) resumes from that batch.
+
+Writes are throttled so a backfill can run while the API serves traffic:
+--rate caps documents per second, and --max-lag pauses while any secondary
+is more than that many seconds behind the primary. Every update is guarded
+by the condition that selected the document, so documents changed by the
+API in the meantime are left alone, and re-running a batch is harmless.
+"""
+import argparse
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from config import settings
+
+MIGRATIONS_COLLECTION = "migrations"
+
+
+class Migration(ABC):
+    """
+    One versioned change. `run_batch(db, after)` processes the next batch
+    after the checkpoint `after` (None at the start) and returns
+    (documents processed, documents modified, new checkpoint), with a None
+    checkpoint once there is nothing left.
+    """
+    
+    version: int
+    name: str
+    description: str = ""
+    
+    @abstractmethod
+    async def run_batch(self, db, after: Any, batch_size: int) -> Tuple[int, int, Any]:
+        ...
+
+
+class DocumentMigration(Migration):
+    """
+    Updates the documents of one collection that match `query`, in `_id`
+    order. `updates()` turns a batch into UpdateOne operations; their filters
+    should repeat the condition that made the document eligible.
+    """
+    
+    collection: str
+    query: dict = {}
+    projection: Optional[dict] = None
+    
+    @abstractmethod
+    async def updates(self, db, documents: List[dict]) -> List[UpdateOne]:
+        ...
+    
+    async def run_batch(self, db, after, batch_size):
+        query = self.query if after is None else {"$and": [self.query, {"_id": {"$gt": after}}]}
+        documents = await db[self.collection].find(query, self.projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not documents:
+            return 0, 0, None
+        
+        modified = 0
+        operations = await self.updates(db, documents)
+        if operations:
+            result = await db[self.collection].bulk_write(operations, ordered=False)
+            modified = result.modified_count
+        return len(documents), modified, documents[-1]["_id"]
+
+
+async def replication_lag(db) -> Optional[float]:
+    """Seconds the furthest secondary is behind the primary; None outside a replica set"""
+    try:
+        status = await db.client.admin.command("replSetGetStatus")
+    except OperationFailure:
+        return None
+    members = status.get("members", [])
+    primary = next((member for member in members if member.get("stateStr") == "PRIMARY"), None)
+    secondaries = [member for member in members if member.get("stateStr") == "SECONDARY"]
+    if primary is None or not secondaries:
+        return None
+    return max((primary["optimeDate"] - member["optimeDate"]).total_seconds() for member in secondaries)
+
+
+class Throttle:
+    """Holds a batch loop to `rate` documents per second and below `max_lag` seconds of replication lag"""
+    
+    def __init__(self, rate: Optional[float], max_lag: Optional[float], lag_check_seconds: float = 5):
+        self.rate = rate
+        self.max_lag = max_lag
+        self.lag_check_seconds = lag_check_seconds
+        self._started = time.monotonic()
+        self._documents = 0
+        self._lag_checked_at = 0.0
+    
+    async def wait(self, db, documents: int) -> None:
+        self._documents += documents
+        if self.rate:
+            ahead = self._documents / self.rate - (time.monotonic() - self._started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+        
+        if self.max_lag and time.monotonic() - self._lag_checked_at >= self.lag_check_seconds:
+            while True:
+                lag = await replication_lag(db)
+                self._lag_checked_at = time.monotonic()
+                if lag is None or lag <= self.max_lag:
+                    break
+                print(f"   ⏸️  Secondaries are {lag:.1f}s behind (limit {self.max_lag}s), waiting...")
+                await asyncio.sleep(self.lag_check_seconds)
+
+
+async def run_migration(db, migration: Migration, batch_size: int, throttle: Throttle) -> dict:
+    """Apply one migration from its last checkpoint; returns its final record"""
+    records = db[MIGRATIONS_COLLECTION]
+    record = await records.find_one({"_id": migration.version})
+    if record and record["status"] == "completed":
+        return record
+    
+    now = datetime.utcnow()
+    if record is None:
+        record = {
+            "_id": migration.version,
+            "name": migration.name,
+            "status": "running",
+            "checkpoint": None,
+            "processed": 0,
+            "modified": 0,
+            "started_at": now,
+            "updated_at": now,
+        }
+        await records.insert_one(record)
+        print(f"▶️  {migration.version:03d} {migration.name}")
+    else:
+        print(f"↩️  {migration.version:03d} {migration.name}: resuming after {record['checkpoint']} "
+              f"({record['processed']} already processed)")
+    
+    checkpoint = record["checkpoint"]
+    while True:
+        processed, modified, next_checkpoint = await migration.run_batch(db, checkpoint, batch_size)
+        if next_checkpoint is None:
+            break
+        checkpoint = next_checkpoint
+        record["processed"] += processed
+        record["modified"] += modified
+        await records.update_one(
+            {"_id": migration.version},
+            {"$set": {
+                "checkpoint": checkpoint,
+                "processed": record["processed"],
+                "modified": record["modified"],
+                "updated_at": datetime.utcnow(),
+            }}
+        )
+        print(f"   {record['processed']} processed, {record['modified']} modified (checkpoint {checkpoint})")
+        await throttle.wait(db, processed)
+    
+    record["status"] = "completed"
+    record["completed_at"] = datetime.utcnow()
+    await records.update_one(
+        {"_id": migration.version},
+        {"$set": {"status": "completed", "completed_at": record["completed_at"], "updated_at": record["completed_at"]}}
+    )
+    print(f"✅ {migration.version:03d} {migration.name}: {record['processed']} processed, {record['modified']} modified")
+    return record
+
+
+async def list_migrations(db, migrations: List[Migration]) -> None:
+    records = {record["_id"]: record async for record in db[MIGRATIONS_COLLECTION].find()}
+    for migration in migrations:
+        record = records.get(migration.version)
+        state = record["status"] if record else "pending"
+        progress = f" ({record['processed']} processed, {record['modified']} modified)" if record else ""
+        print(f"{migration.version:03d} {migration.name:<40} {state}{progress}")
+        if migration.description:
+            print(f"    {migration.description}")
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from migrations import MIGRATIONS
+    
+    parser = argparse.ArgumentParser(description="Apply versioned data migrations")
+    parser.add_argument("--list", action="store_true", help="Show migration status and exit")
+    parser.add_argument("--only", type=int, help="Apply only this migration version")
+    parser.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE)
+    parser.add_argument("--rate", type=float, default=settings.MIGRATION_MAX_DOCS_PER_SECOND,
+                        help="Maximum documents per second (0 for no limit)")
+    parser.add_argument("--max-lag", type=float, default=settings.MIGRATION_MAX_REPLICATION_LAG_SECONDS,
+                        help="Pause while secondaries are more than N seconds behind (0 to ignore)")
+    args = parser.parse_args()
+    
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=5000)
+    db = client[settings.DATABASE_NAME]
+    migrations = sorted(MIGRATIONS, key=lambda migration: migration.version)
+    
+    if args.list:
+        await list_migrations(db, migrations)
+    else:
+        if args.only is not None:
+            migrations = [migration for migration in migrations if migration.version == args.only]
+            if not migrations:
+                raise SystemExit(f"No migration with version {args.only}")
+        throttle = Throttle(args.rate or None, args.max_lag or None)
+        for migration in migrations:
+            await run_migration(db, migration, args.batch_size, throttle)
+    
+    client.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopped; run again to resume from the last checkpoint")
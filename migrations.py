@@ -0,0 +1,175 @@
+"""
+Data migrations applied by migrate.py, in version order.
+
+Add new migrations at the end with the next version number; never renumber
+or edit one that may already have run somewhere. The API writes these
+fields itself for new documents, so each migration only backfills older ones.
+"""
+from datetime import datetime, timedelta
+from typing import List
+from bson import ObjectId
+from pymongo import UpdateOne
+from analytics_rollup import ROLLUP_COLLECTION, day_key, rebuild_daily_rollups
+from archiver import ARCHIVE_COLLECTION, HOT_COLLECTION
+from migrate import DocumentMigration, Migration
+from sms_providers import international_number
+
+
+def object_ids(values) -> List[ObjectId]:
+    return [ObjectId(value) for value in set(values) if value and ObjectId.is_valid(value)]
+
+
+class NormalizeUserPhones(DocumentMigration):
+    version = 1
+    name = "users.phone_normalized"
+    description = "International (+92...) form of each user's phone number, for SMS and lookups"
+    collection = "users"
+    query = {"phone_normalized": {"$exists": False}}
+    projection = {"phone_number": 1}
+    
+    async def updates(self, db, documents):
+        return [
+            UpdateOne(
+                {"_id": user["_id"], "phone_number": user["phone_number"], "phone_normalized": {"$exists": False}},
+                {"$set": {"phone_normalized": international_number(user["phone_number"])}}
+            )
+            for user in documents
+        ]
+
+
+class ServiceRequestTechnicianIds(DocumentMigration):
+    """Requests assigned before registered technicians only carry a name and phone number"""
+    
+    description = "Link requests assigned by name/phone to the registered technician with that phone number"
+    query = {"technician_phone": {"$nin": [None, ""]}, "technician_id": {"$exists": False}}
+    projection = {"technician_phone": 1}
+    
+    def __init__(self, version: int, collection: str):
+        self.version = version
+        self.collection = collection
+        self.name = f"{collection}.technician_id"
+    
+    async def updates(self, db, documents):
+        phones = list({request["technician_phone"] for request in documents})
+        technicians = await db["technicians"].find({"phone_number": {"$in": phones}}, {"phone_number": 1}).to_list(length=None)
+        technician_ids = {technician["phone_number"]: str(technician["_id"]) for technician in technicians}
+        return [
+            UpdateOne(
+                {"_id": request["_id"], "technician_phone": request["technician_phone"], "technician_id": {"$exists": False}},
+                {"$set": {"technician_id": technician_ids[request["technician_phone"]]}}
+            )
+            for request in documents
+            if request["technician_phone"] in technician_ids
+        ]
+
+
+class ServiceRequestUserPhones(DocumentMigration):
+    """The owner's phone number on each request, so notifications skip the users lookup"""
+    
+    description = "Denormalize the owner's phone number onto each service request (user_phone)"
+    query = {"user_phone": {"$exists": False}}
+    projection = {"user_id": 1}
+    
+    def __init__(self, version: int, collection: str):
+        self.version = version
+        self.collection = collection
+        self.name = f"{collection}.user_phone"
+    
+    async def updates(self, db, documents):
+        ids = object_ids(request["user_id"] for request in documents)
+        users = await db["users"].find({"_id": {"$in": ids}}, {"phone_number": 1}).to_list(length=None)
+        phones = {str(user["_id"]): user["phone_number"] for user in users}
+        return [
+            UpdateOne(
+                {"_id": request["_id"], "user_phone": {"$exists": False}},
+                {"$set": {"user_phone": phones[request["user_id"]]}}
+            )
+            for request in documents
+            if request["user_id"] in phones
+        ]
+
+
+class FeedbackTechnicianIds(DocumentMigration):
+    version = 6
+    name = "feedback.technician_id"
+    description = "Copy the technician id from the rated service request onto its feedback"
+    collection = "feedback"
+    query = {"technician_id": {"$exists": False}}
+    projection = {"service_request_id": 1}
+    
+    async def updates(self, db, documents):
+        ids = object_ids(feedback["service_request_id"] for feedback in documents)
+        technician_ids = {}
+        for collection in (HOT_COLLECTION, ARCHIVE_COLLECTION):
+            requests = await db[collection].find(
+                {"_id": {"$in": ids}, "technician_id": {"$nin": [None, ""]}}, {"technician_id": 1}
+            ).to_list(length=None)
+            technician_ids.update({str(request["_id"]): request["technician_id"] for request in requests})
+        return [
+            UpdateOne(
+                {"_id": feedback["_id"], "technician_id": {"$exists": False}},
+                {"$set": {"technician_id": technician_ids[feedback["service_request_id"]]}}
+            )
+            for feedback in documents
+            if feedback["service_request_id"] in technician_ids
+        ]
+
+
+class SeedAnalyticsRollups(Migration):
+    """
+    Builds the daily rollups for days that have none, a month per batch,
+    from the oldest service request (hot or archived) up to yesterday. The
+    rebuild counts archived requests too, and the days before rollups were
+    kept are mostly archived by now. Days that already have a rollup are
+    kept as maintained live. Today is left to the live increments.
+    """
+    
+    version = 7
+    name = "analytics_daily.seed"
+    description = "Build daily analytics rollups for days before rollups were maintained"
+    
+    async def run_batch(self, db, after, batch_size):
+        yesterday = datetime.utcnow().date() - timedelta(days=1)
+        if after is None:
+            oldest = []
+            for collection in (HOT_COLLECTION, ARCHIVE_COLLECTION):
+                request = await db[collection].find_one({}, {"created_at": 1}, sort=[("created_at", 1)])
+                if request is not None:
+                    oldest.append(request["created_at"])
+            if not oldest:
+                return 0, 0, None
+            start = min(oldest).date()
+        else:
+            start = after.date() + timedelta(days=1)
+        if start > yesterday:
+            return 0, 0, None
+        
+        end = min(yesterday, start + timedelta(days=30))
+        existing = set(await db[ROLLUP_COLLECTION].distinct("_id", {
+            "day": {"$gte": datetime(start.year, start.month, start.day), "$lte": datetime(end.year, end.month, end.day)}
+        }))
+        
+        # Rebuild each run of consecutive days without a rollup
+        written = 0
+        run_start = None
+        day = start
+        while day <= end + timedelta(days=1):
+            missing = day <= end and day_key(day) not in existing
+            if missing and run_start is None:
+                run_start = day
+            elif not missing and run_start is not None:
+                written += await rebuild_daily_rollups(db, run_start, day - timedelta(days=1))
+                run_start = None
+            day += timedelta(days=1)
+        return (end - start).days + 1, written, datetime(end.year, end.month, end.day)
+
+
+MIGRATIONS: List[Migration] = [
+    NormalizeUserPhones(),
+    ServiceRequestTechnicianIds(2, HOT_COLLECTION),
+    ServiceRequestTechnicianIds(3, ARCHIVE_COLLECTION),
+    ServiceRequestUserPhones(4, HOT_COLLECTION),
+    ServiceRequestUserPhones(5, ARCHIVE_COLLECTION),
+    FeedbackTechnicianIds(),
+    SeedAnalyticsRollups(),
+]
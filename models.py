@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -89,6 +89,7 @@ class ServiceRequestCreate(BaseModel):
 class ServiceRequestUpdate(BaseModel):
     status: Optional[RequestStatus] = None
     admin_response: Optional[str] = None
+    technician_id: Optional[str] = Field(None, description="Assign a registered technician; the booking is checked against their calendar")
     technician_name: Optional[str] = None
     technician_phone: Optional[str] = None
     estimated_arrival_time: Optional[Union[str, datetime]] = None
@@ -110,6 +111,7 @@ class ServiceRequestInDB(BaseModel):
     admin_response: Optional[str] = None
     technician_name: Optional[str] = None
     technician_phone: Optional[str] = None
+    technician_id: Optional[str] = None
     estimated_arrival_time: Optional[Union[str, datetime]] = None
     created_at: datetime
     updated_at: datetime
@@ -135,10 +137,100 @@ class ServiceRequestResponse(BaseModel):
     admin_response: Optional[str] = None
     technician_name: Optional[str] = None
     technician_phone: Optional[str] = None
+    technician_id: Optional[str] = None
     estimated_arrival_time: Optional[Union[str, datetime]] = None
     created_at: datetime
     updated_at: datetime
     completed_at: Optional[datetime] = None
+    
+    @classmethod
+    def from_document(cls, request: dict, **extra):
+        """Build a response from a service_requests document"""
+        return cls(
+            id=str(request["_id"]),
+            user_id=request["user_id"],
+            service_type=request["service_type"],
+            name=request["name"],
+            address=request["address"],
+            contact_number=request["contact_number"],
+            preferred_time=request["preferred_time"],
+            issue_description=request["issue_description"],
+            hours_required=request.get("hours_required"),
+            hourly_rate=request.get("hourly_rate"),
+            total_cost=request.get("total_cost"),
+            status=request["status"],
+            admin_response=request.get("admin_response"),
+            technician_name=request.get("technician_name"),
+            technician_phone=request.get("technician_phone"),
+            technician_id=request.get("technician_id"),
+            estimated_arrival_time=request.get("estimated_arrival_time"),
+            created_at=request["created_at"],
+            updated_at=request["updated_at"],
+            completed_at=request.get("completed_at"),
+            **extra
+        )
+
+
+class ServiceRequestSummary(BaseModel):
+    id: str
+    service_type: ServiceType
+    status: RequestStatus
+    preferred_time: datetime
+    technician_name: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    completed_at: Optional[datetime] = None
+
+
+class UserHomeResponse(BaseModel):
+    active_request: Optional[ServiceRequestResponse] = None
+    recent_requests: List[ServiceRequestSummary] = []
+    awaiting_feedback: List[ServiceRequestSummary] = []
+    status_counts: Dict[str, int] = {}
+
+
+class ServiceRequestSearchResult(ServiceRequestResponse):
+    score: float
+
+
+class ServiceRequestSearchResponse(BaseModel):
+    query: str
+    total: int
+    skip: int
+    limit: int
+    backend: str
+    results: List[ServiceRequestSearchResult] = []
+
+
+# Technician Models
+class TechnicianCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    phone_number: str = Field(..., min_length=10, max_length=15)
+    skills: List[ServiceType] = Field(..., min_length=1)
+
+
+class TechnicianResponse(BaseModel):
+    id: str
+    name: str
+    phone_number: str
+    skills: List[ServiceType]
+    is_active: bool
+    created_at: datetime
+
+
+class TechnicianBookingResponse(BaseModel):
+    id: str
+    technician_id: str
+    service_request_id: str
+    start: datetime
+    end: datetime
+
+
+class TechnicianAvailabilityResponse(BaseModel):
+    service_type: ServiceType
+    start: datetime
+    end: datetime
+    available_technicians: List[TechnicianResponse] = []
 
 
 # Admin Models
@@ -175,6 +267,10 @@ class AdminResponse(BaseModel):
     created_at: datetime
 
 
+class AccountStatusUpdate(BaseModel):
+    is_active: bool
+
+
 # Feedback Models
 class FeedbackCreate(BaseModel):
     service_request_id: str
@@ -222,6 +318,40 @@ class AnalyticsResponse(BaseModel):
     top_rated_technicians: List[dict] = []
 
 
+class AnalyticsGranularity(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class AnalyticsSeriesPoint(BaseModel):
+    period_start: datetime
+    total_requests: int
+    requests_by_service_type: Dict[str, int] = {}
+    completed_requests: Optional[int] = None
+    cancelled_requests: Optional[int] = None
+
+
+class CompletionTimeStats(BaseModel):
+    count: int
+    mean_hours: Optional[float] = None
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+    p99_hours: Optional[float] = None
+
+
+class AnalyticsSeriesResponse(BaseModel):
+    start: datetime
+    end: datetime
+    granularity: AnalyticsGranularity
+    service_type: Optional[ServiceType] = None
+    series: List[AnalyticsSeriesPoint] = []
+    completion_time: CompletionTimeStats
+    rating_histogram: Dict[str, int] = {}
+    average_rating: Optional[float] = None
+
+
 class TechnicianPerformance(BaseModel):
     technician_name: str
     total_jobs: int
@@ -230,6 +360,29 @@ class TechnicianPerformance(BaseModel):
     total_ratings: int
 
 
+# Batch Models
+class BatchOperation(BaseModel):
+    id: str = Field(..., min_length=1, max_length=64, description="Client reference echoed in the result")
+    method: str = Field("GET", pattern="^(GET|PATCH)$")
+    path: str = Field(..., description="API path, e.g. /api/admin/service-request/{id}")
+    query: Dict[str, Union[str, int]] = {}
+    body: Optional[dict] = None
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1)
+
+
+class BatchResult(BaseModel):
+    id: str
+    status: int
+    body: Union[dict, list, None] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+
+
 # Token Models
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from otp_service import send_notification_sms
+
+
+@dataclass
+class PendingNotification:
+    phone_number: str
+    service_type: str
+    responses: List[str] = field(default_factory=list)
+    estimated_arrival: Optional[str] = None
+    technician_name: Optional[str] = None
+    updates: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+    
+    def message(self) -> str:
+        parts = []
+        if self.responses:
+            parts.append(f"Update on your {self.service_type} request: {' '.join(self.responses)}")
+        if self.estimated_arrival:
+            parts.append(
+                f"Your technician {self.technician_name or 'our technician'} is on the way! "
+                f"Expected arrival: {self.estimated_arrival}"
+            )
+        return "\n".join(parts)
+
+
+class NotificationCoalescer:
+    """
+    Merges customer SMS notifications per (user, service request).
+    
+    Updates to the same request within NOTIFICATION_COALESCE_SECONDS of the
+    first pending one go out as a single message: admin responses are joined
+    and the latest arrival time wins. Updates that move a request into one of
+    NOTIFICATION_URGENT_STATUSES are sent immediately, together with whatever
+    was pending. Sends run as background tasks in a fresh context, so they are
+    not tied to the request that queued them.
+    """
+    
+    def __init__(self, window_seconds: Optional[float] = None, urgent_statuses: Optional[List[str]] = None):
+        self.window = window_seconds if window_seconds is not None else settings.NOTIFICATION_COALESCE_SECONDS
+        self.urgent_statuses = set(urgent_statuses if urgent_statuses is not None else settings.NOTIFICATION_URGENT_STATUSES)
+        self._pending: Dict[Tuple[str, str], PendingNotification] = {}
+        self._sends: set = set()
+        self.updates = 0
+        self.sent = 0
+        self.failed = 0
+    
+    def notify(
+        self,
+        user_id: str,
+        request_id: str,
+        phone_number: str,
+        service_type: str,
+        admin_response: Optional[str] = None,
+        estimated_arrival: Optional[str] = None,
+        technician_name: Optional[str] = None,
+        status: Optional[str] = None
+    ) -> None:
+        key = (user_id, request_id)
+        pending = self._pending.get(key)
+        if admin_response or estimated_arrival:
+            if pending is None:
+                pending = self._pending[key] = PendingNotification(phone_number, service_type)
+            pending.phone_number = phone_number
+            if admin_response and admin_response not in pending.responses:
+                pending.responses.append(admin_response)
+            if estimated_arrival:
+                pending.estimated_arrival = estimated_arrival
+                pending.technician_name = technician_name or pending.technician_name
+            pending.updates += 1
+            self.updates += 1
+        
+        if pending is None:
+            return
+        if status in self.urgent_statuses or self.window <= 0:
+            self._start_send(key)
+        elif pending.timer is None:
+            pending.timer = asyncio.get_running_loop().call_later(
+                self.window, self._start_send, key, context=contextvars.Context()
+            )
+    
+    def _start_send(self, key: Tuple[str, str]) -> None:
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+        task = asyncio.create_task(self._send(pending), context=contextvars.Context())
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+    
+    async def _send(self, pending: PendingNotification) -> None:
+        if await send_notification_sms(pending.phone_number, pending.message()):
+            self.sent += 1
+        else:
+            self.failed += 1
+    
+    async def flush(self) -> None:
+        """Send everything pending now and wait for in-flight sends (on shutdown)"""
+        for key in list(self._pending):
+            self._start_send(key)
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+    
+    def stats(self) -> dict:
+        messages = self.sent + self.failed
+        return {
+            "pending": len(self._pending),
+            "updates": self.updates,
+            "sent": self.sent,
+            "failed": self.failed,
+            "updates_per_message": round(self.updates / messages, 2) if messages else None,
+        }
+
+
+notifier = NotificationCoalescer()
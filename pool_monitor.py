@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+from typing import Optional
+from pymongo import monitoring
+from metrics import summarize_latencies
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Live connection pool statistics, aggregated over every server the client uses.
+    
+    Motor runs PyMongo on executor threads, so a checkout starts and finishes on
+    the same thread; the start time is kept in a thread-local to measure latency.
+    """
+    
+    def __init__(self, latency_samples: int = 1000):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._latencies = deque(maxlen=latency_samples)
+        self.max_pool_size: Optional[int] = None
+        self.total = 0
+        self.in_use = 0
+        self.waiters = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_timeouts = 0
+        self.pool_clears = 0
+    
+    def pool_created(self, event):
+        self.max_pool_size = event.options.get("maxPoolSize", self.max_pool_size)
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.total += 1
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.total = max(0, self.total - 1)
+    
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiters += 1
+    
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiters = max(0, self.waiters - 1)
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+    
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        with self._lock:
+            self.waiters = max(0, self.waiters - 1)
+            self.in_use += 1
+            self.checkouts += 1
+            if started is not None:
+                self._latencies.append((time.perf_counter() - started) * 1000)
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+    
+    def stats(self) -> dict:
+        """Snapshot of the pool counters and checkout latency percentiles"""
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                "max_pool_size": self.max_pool_size,
+                "total_connections": self.total,
+                "in_use": self.in_use,
+                "available": max(0, self.total - self.in_use),
+                "waiters": self.waiters,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts,
+                "pool_clears": self.pool_clears,
+                "checkout_latency_ms": summarize_latencies(latencies),
+            }
+    
+    def is_saturated(self, max_waiters: int) -> bool:
+        """True when more operations are queued for a connection than we tolerate"""
+        return self.waiters > max_waiters
+
+
+pool_monitor = PoolMonitor()
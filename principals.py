@@ -0,0 +1,93 @@
+"""
+Account status checks for authenticated requests.
+
+A JWT stays valid for ACCESS_TOKEN_EXPIRE_MINUTES, so the auth dependencies
+also check that the account behind it still exists and is active. The answer
+is cached per account for PRINCIPAL_CACHE_TTL_SECONDS, so the check costs a
+dictionary lookup on most requests and at most one query per account per TTL
+(concurrent misses for the same account share that query).
+
+Endpoints that change an account's status call `invalidate()`, which takes
+effect immediately in this worker; other workers pick the change up when
+their entry expires, so keep the TTL short when running several workers.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from bson import ObjectId
+from config import settings
+from deadlines import class_budget
+from models import UserRole
+from singleflight import SingleFlight
+
+PRINCIPAL_COLLECTIONS = {
+    UserRole.USER.value: "users",
+    UserRole.ADMIN.value: "admins",
+}
+
+
+class PrincipalCache:
+    """Per-process is_active cache keyed by (role, account id), with LRU eviction"""
+    
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 50000):
+        self.ttl = settings.PRINCIPAL_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.max_entries = max_entries
+        # (role, id) -> (expires_at, state) with state "active", "inactive" or "missing"
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        # Shared loads run under their own deadline, not that of whichever request started them
+        self._loads = SingleFlight(detached=True, deadline=class_budget("db_read"))
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    async def status(self, db, role: Optional[str], principal_id: Optional[str]) -> str:
+        """"active", "inactive" or "missing" for the account behind a token"""
+        collection = PRINCIPAL_COLLECTIONS.get(role)
+        if collection is None or not principal_id or not ObjectId.is_valid(principal_id):
+            return "missing"
+        
+        key = (role, principal_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        
+        self.misses += 1
+        invalidations = self.invalidations
+        # Only share loads started after the latest invalidation
+        state = await self._loads.do((key, invalidations), lambda: self._load(db, collection, principal_id))
+        # A status change during the load may not be in its result: don't cache it
+        if self.ttl > 0 and invalidations == self.invalidations:
+            self._entries[key] = (time.monotonic() + self.ttl, state)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return state
+    
+    async def _load(self, db, collection: str, principal_id: str) -> str:
+        account = await db[collection].find_one({"_id": ObjectId(principal_id)}, {"is_active": 1})
+        if account is None:
+            return "missing"
+        return "active" if account.get("is_active", True) else "inactive"
+    
+    def invalidate(self, role: str, principal_id: str) -> None:
+        """Forget an account's cached status after changing or deleting it"""
+        self.invalidations += 1
+        self._entries.pop((role, principal_id), None)
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "loads_shared": self._loads.shared,
+        }
+
+
+principal_cache = PrincipalCache()
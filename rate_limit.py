@@ -0,0 +1,171 @@
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Sequence, Tuple
+from fastapi import HTTPException, Request, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from config import settings
+from database import database, get_collection
+from sms_providers import international_number
+
+# Identity fields holding phone numbers: one number has several spellings
+PHONE_FIELDS = {"phone_number", "phoneNumber"}
+
+
+class MemoryRateLimitStore:
+    """Per-process token buckets, evicting the least recently used keys"""
+    
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+    
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (float(capacity), now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+        
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        
+        return allowed, _retry_after(tokens, refill_per_second)
+
+
+class MongoRateLimitStore:
+    """
+    Token buckets shared by every worker, kept in the `rate_limits` collection.
+    
+    Refill and take happen in one pipeline update so concurrent workers cannot
+    both spend the last token.
+    """
+    
+    collection_name = "rate_limits"
+    
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        now = datetime.utcnow()
+        # Long enough for an empty bucket to refill completely
+        expires_at = now + timedelta(seconds=capacity / refill_per_second)
+        elapsed_seconds = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        pipeline = [
+            {"$set": {
+                "tokens": {"$min": [
+                    capacity,
+                    {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_seconds, refill_per_second]}]}
+                ]},
+                "updated_at": now,
+                "expires_at": expires_at,
+            }},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+        ]
+        
+        collection = get_collection(database.client[settings.DATABASE_NAME], self.collection_name)
+        try:
+            bucket = await collection.find_one_and_update(
+                {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two workers upserted the same new key at once; the retry updates it
+            bucket = await collection.find_one_and_update(
+                {"_id": key}, pipeline, return_document=ReturnDocument.AFTER
+            )
+        
+        return bucket["allowed"], _retry_after(bucket["tokens"], refill_per_second)
+
+
+def _retry_after(tokens: float, refill_per_second: float) -> float:
+    """Seconds until the bucket holds a whole token again"""
+    if tokens >= 1:
+        return 0.0
+    return (1 - tokens) / refill_per_second
+
+
+memory_store = MemoryRateLimitStore()
+mongo_store = MongoRateLimitStore()
+
+
+async def take_token(key: str, capacity: int, per_minute: float) -> Tuple[bool, float]:
+    """Take one token from the bucket for `key`, using the configured backend"""
+    refill_per_second = per_minute / 60
+    if settings.RATE_LIMIT_BACKEND == "mongo" and database.client is not None:
+        try:
+            return await mongo_store.take(key, capacity, refill_per_second)
+        except PyMongoError:
+            # Never lock users out because the shared store is unavailable
+            pass
+    return await memory_store.take(key, capacity, refill_per_second)
+
+
+def client_ip(request: Request) -> str:
+    """
+    Best-effort client address, honouring the X-Forwarded-For entry appended by
+    our own proxies. Clients can put anything in the header themselves, so only
+    the entry RATE_LIMIT_TRUSTED_PROXY_HOPS from the right is trusted.
+    """
+    hops = settings.RATE_LIMIT_TRUSTED_PROXY_HOPS
+    if settings.RATE_LIMIT_TRUST_FORWARDED and hops > 0:
+        forwarded = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(
+    scope: str,
+    identity_fields: Sequence[str] = (),
+    capacity: Optional[int] = None,
+    per_minute: Optional[float] = None
+):
+    """
+    Build a FastAPI dependency that rate limits an endpoint.
+    
+    Every call spends a token from the client IP bucket for `scope`; when one of
+    `identity_fields` is present in the JSON body (phone number, email) it also
+    spends a token from that identity's bucket. Phone numbers are keyed in
+    international form, so 03XX..., +923XX... and 3XX... share a bucket. Runs
+    before the endpoint, so a throttled client never reaches the SMS gateway
+    or bcrypt.
+    """
+    async def dependency(request: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        
+        buckets = [(
+            f"{scope}:ip:{client_ip(request)}",
+            settings.IP_RATE_LIMIT_CAPACITY,
+            settings.IP_RATE_LIMIT_PER_MINUTE
+        )]
+        
+        if identity_fields:
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict):
+                for field in identity_fields:
+                    value = body.get(field)
+                    if isinstance(value, str) and value.strip():
+                        identity = international_number(value.strip()) if field in PHONE_FIELDS else value.strip().lower()
+                        buckets.append((
+                            f"{scope}:id:{identity}",
+                            capacity or settings.LOGIN_RATE_LIMIT_CAPACITY,
+                            per_minute or settings.LOGIN_RATE_LIMIT_PER_MINUTE
+                        ))
+                        break
+        
+        for key, bucket_capacity, bucket_rate in buckets:
+            allowed, retry_after = await take_token(key, bucket_capacity, bucket_rate)
+            if not allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many requests. Please try again later.",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                )
+    
+    return dependency
@@ -0,0 +1,246 @@
+"""
+Replay captured traffic against a running instance and compare latencies.
+
+    python replay_traffic.py traffic/traces.jsonl --user-token $USER_TOKEN --admin-token $ADMIN_TOKEN
+    python replay_traffic.py traffic/traces.jsonl.1 traffic/traces.jsonl --speed 4
+    python replay_traffic.py traffic/traces.jsonl --speed 0 --concurrency 32
+
+Traces are written by traffic_capture.py (TRAFFIC_CAPTURE_ENABLED). They are
+re-issued in their original order and spacing (--speed 1), N times faster
+(--speed N) or back to back with --concurrency requests in flight
+(--speed 0). Requests are sent with the token given for the role that made
+them; anonymous ones without a token.
+
+Only reads are replayed unless --include-writes is given, since replayed
+writes change the target database. Logouts and account status changes are
+never replayed: they would revoke or deactivate the shared replay token and
+turn every later request for that role into a 401.
+
+Sanitized values are filled back in with placeholders of the same kind and
+length (`<digits:11>` becomes 00000000000), so requests that depend on real
+names or phone numbers (logins, registrations) will fail validation on
+replay; the report counts status changes per route so they stand out. Point
+it at a local database seeded with `python init_db.py --seed` and disable
+RATE_LIMIT_ENABLED there, or the limiter will answer most of the replay.
+
+The report gives, per route, the captured and replayed p50/p95 latency and
+the change in p50, sorted by how much time the route accounts for. Captured
+durations are measured inside the server and replayed ones by this client,
+so the replay includes the network round trip; compare a change against a
+replay of the same traces on the unchanged build rather than against the
+captured numbers alone.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import requests
+from metrics import summarize_latencies
+
+PLACEHOLDER = re.compile(r"^<(str|digits|number|bytes):(\d+)>$")
+PATH_PARAM = re.compile(r"{(\w+)(:\w+)?}")
+LATE_TOLERANCE_MS = 10
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Replaying these would revoke or deactivate the account behind a replay token
+TOKEN_DESTROYING_ROUTES = {
+    ("POST", "/api/user/logout"),
+    ("POST", "/api/admin/logout"),
+    ("PATCH", "/api/admin/users/{user_id}/status"),
+    ("PATCH", "/api/admin/admins/{admin_id}/status"),
+}
+
+
+def restore(value: Any) -> Any:
+    """Fill sanitized placeholders back in with values of the same kind and length"""
+    if isinstance(value, dict):
+        return {key: restore(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [restore(item) for item in value]
+    if isinstance(value, str):
+        match = PLACEHOLDER.match(value)
+        if match:
+            kind, length = match.group(1), int(match.group(2))
+            if kind == "number":
+                return int("9" * length)
+            return ("0" if kind == "digits" else "x") * length
+    return value
+
+
+def load_traces(paths: List[str], limit: Optional[int]) -> List[dict]:
+    traces = []
+    for path in paths:
+        with open(path, encoding="utf-8") as trace_file:
+            for line in trace_file:
+                line = line.strip()
+                if line:
+                    traces.append(json.loads(line))
+    traces.sort(key=lambda trace: trace["ts"])
+    return traces[:limit] if limit else traces
+
+
+def select_traces(traces: List[dict], include_writes: bool) -> Tuple[List[dict], Counter]:
+    """Traces safe to replay, and how many were skipped per route"""
+    selected, skipped = [], Counter()
+    for trace in traces:
+        if (trace["method"], trace["route"]) in TOKEN_DESTROYING_ROUTES or (
+            not include_writes and trace["method"] not in READ_METHODS
+        ):
+            skipped[f"{trace['method']} {trace['route']}"] += 1
+        else:
+            selected.append(trace)
+    return selected, skipped
+
+
+def build_request(trace: dict, tokens: Dict[str, str]) -> dict:
+    params = restore(trace.get("path_params") or {})
+    path = PATH_PARAM.sub(lambda match: str(params.get(match.group(1), match.group(0))), trace["route"])
+    headers = {}
+    token = tokens.get(trace.get("role"))
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    request = {"method": trace["method"], "path": path, "params": restore(trace.get("query") or {}), "headers": headers}
+    body = trace.get("body")
+    if body not in (None, "<truncated>") and not (isinstance(body, str) and body.startswith("<bytes:")):
+        request["json"] = restore(body)
+    return request
+
+
+class Replayer:
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.results: List[dict] = []
+    
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+    
+    def send(self, trace: dict, request: dict) -> None:
+        start = time.perf_counter()
+        try:
+            response = self._session().request(
+                request["method"], self.base_url + request["path"], params=request["params"],
+                json=request.get("json"), headers=request["headers"], timeout=self.timeout
+            )
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        duration_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.results.append({
+                "route": f"{trace['method']} {trace['route']}",
+                "captured_ms": trace["duration_ms"],
+                "replayed_ms": duration_ms,
+                "captured_status": trace["status"],
+                "replayed_status": status,
+            })
+
+
+def replay(traces: List[dict], replayer: Replayer, tokens: Dict[str, str], speed: float, concurrency: int) -> dict:
+    """Issue every trace, paced by `speed`; returns timing about the run itself"""
+    missing_roles = {trace.get("role") for trace in traces} - set(tokens) - {"anonymous", "invalid", "unknown", None}
+    for role in sorted(missing_roles):
+        print(f"⚠️  No token for role '{role}': those requests are sent without one (use --{role}-token)")
+    
+    behind_ms: List[float] = []
+    started = time.perf_counter()
+    first_ts = traces[0]["ts"] if traces else 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for trace in traces:
+            if speed > 0:
+                due = started + (trace["ts"] - first_ts) / speed
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                elif -wait * 1000 > LATE_TOLERANCE_MS:
+                    behind_ms.append(-wait * 1000)
+            pool.submit(replayer.send, trace, build_request(trace, tokens))
+    return {"elapsed_seconds": time.perf_counter() - started, "late_sends": len(behind_ms), "max_behind_ms": max(behind_ms, default=0.0)}
+
+
+def report(results: List[dict], run: dict) -> None:
+    by_route: Dict[str, List[dict]] = {}
+    for result in results:
+        by_route.setdefault(result["route"], []).append(result)
+    
+    rows = []
+    for route, route_results in by_route.items():
+        captured = summarize_latencies(result["captured_ms"] for result in route_results)
+        replayed = summarize_latencies(result["replayed_ms"] for result in route_results)
+        changed = sum(1 for result in route_results if result["captured_status"] != result["replayed_status"])
+        total_ms = sum(result["replayed_ms"] for result in route_results)
+        rows.append((total_ms, route, captured, replayed, changed))
+    rows.sort(key=lambda row: row[0], reverse=True)
+    
+    print(f"\n{'Route':<52} {'Count':>6} {'Cap p50':>9} {'Rep p50':>9} {'Δ p50':>8} {'Cap p95':>9} {'Rep p95':>9} {'Status≠':>8}")
+    print("-" * 118)
+    for _, route, captured, replayed, changed in rows:
+        delta = ""
+        if captured["p50"]:
+            delta = f"{(replayed['p50'] - captured['p50']) / captured['p50'] * 100:+.0f}%"
+        print(f"{route[:52]:<52} {captured['count']:>6} {captured['p50']:>9.1f} {replayed['p50']:>9.1f} {delta:>8} "
+              f"{captured['p95']:>9.1f} {replayed['p95']:>9.1f} {changed:>8}")
+    
+    captured = summarize_latencies(result["captured_ms"] for result in results)
+    replayed = summarize_latencies(result["replayed_ms"] for result in results)
+    print("-" * 118)
+    print(f"{'All routes':<52} {captured['count']:>6} {captured['p50'] or 0:>9.1f} {replayed['p50'] or 0:>9.1f} {'':>8} "
+          f"{captured['p95'] or 0:>9.1f} {replayed['p95'] or 0:>9.1f} "
+          f"{sum(1 for result in results if result['captured_status'] != result['replayed_status']):>8}")
+    print(f"\n⏱️  Replayed {len(results)} requests in {run['elapsed_seconds']:.1f}s")
+    failed = [result for result in results if not isinstance(result["replayed_status"], int)]
+    if failed:
+        print(f"❌ {len(failed)} requests got no response (first error: {failed[0]['replayed_status']})")
+    if run["late_sends"]:
+        print(f"⚠️  {run['late_sends']} requests were sent late (up to {run['max_behind_ms']:.0f} ms): "
+              f"raise --concurrency or lower --speed for a faithful replay")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare latencies")
+    parser.add_argument("traces", nargs="+", help="Trace files written by traffic capture (oldest first)")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="1 = original pacing, N = N times faster, 0 = as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    parser.add_argument("--user-token", help="Bearer token for requests captured from users")
+    parser.add_argument("--admin-token", help="Bearer token for requests captured from admins")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--include-writes", action="store_true",
+                        help="Also replay POST/PATCH/DELETE requests (never logouts or account status changes)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Also write every replayed request's result to this JSONL file")
+    args = parser.parse_args()
+    
+    traces, skipped = select_traces(load_traces(args.traces, args.limit), args.include_writes)
+    if skipped:
+        print(f"⏭️  Skipping {sum(skipped.values())} requests: " + ", ".join(
+            f"{route} ({count})" for route, count in skipped.most_common()
+        ))
+    if not traces:
+        raise SystemExit("No traces to replay")
+    tokens = {role: token for role, token in (("user", args.user_token), ("admin", args.admin_token)) if token}
+    
+    pacing = "as fast as possible" if args.speed <= 0 else f"at {args.speed:g}x"
+    print(f"▶️  Replaying {len(traces)} requests against {args.base_url} {pacing}")
+    replayer = Replayer(args.base_url, args.timeout)
+    run = replay(traces, replayer, tokens, args.speed, args.concurrency)
+    report(replayer.results, run)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            for result in replayer.results:
+                output.write(json.dumps(result) + "\n")
+        print(f"📝 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from bson import ObjectId
+from archiver import find_service_request, find_service_requests_by_id
+from config import settings
+from deadlines import class_budget
+from singleflight import SingleFlight
+
+
+class CacheBackend(ABC):
+    """
+    Interface for response cache backends.
+    
+    Entries carry tags; invalidating a tag drops every entry that carries it.
+    The `generation()` taken before a database read and passed to `set()`
+    keeps a read that raced with an invalidation from caching a stale result.
+    """
+    
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+    
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = (), generation: Optional[int] = None) -> None:
+        ...
+    
+    @abstractmethod
+    async def generation(self) -> int:
+        ...
+    
+    @abstractmethod
+    async def invalidate_tags(self, *tags: str) -> int:
+        ...
+    
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class NullCacheBackend(CacheBackend):
+    """Caching disabled: every lookup misses"""
+    
+    async def get(self, key):
+        return None
+    
+    async def set(self, key, value, ttl, tags=(), generation=None):
+        pass
+    
+    async def generation(self):
+        return 0
+    
+    async def invalidate_tags(self, *tags):
+        return 0
+    
+    def stats(self):
+        return {"backend": "none"}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Per-process cache with a TTL per entry and least-recently-used eviction"""
+    
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    async def set(self, key, value, ttl, tags=(), generation=None):
+        tags = tuple(tags)
+        if generation is not None and generation != self._generation:
+            # Something was invalidated while the value was being loaded
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+    
+    async def generation(self):
+        return self._generation
+    
+    async def invalidate_tags(self, *tags):
+        self._generation += 1
+        removed = 0
+        for tag in tags:
+            for key in self._tags.pop(tag, set()):
+                if key in self._entries:
+                    self._remove(key)
+                    removed += 1
+        self.invalidations += removed
+        return removed
+    
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def create_backend() -> CacheBackend:
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+    return NullCacheBackend()
+
+
+response_cache = create_backend()
+
+# Identical admin dashboard reads running at the same time share one
+# computation. Nothing is kept once it finishes, and every write to data the
+# dashboards read (service requests, feedback, technicians, users) invalidates
+# it, so a read never joins one that started before the write.
+# The shared work runs under the admin analytics deadline, not its first caller's.
+coalesced_reads = SingleFlight(detached=True, deadline=class_budget("admin_analytics"))
+
+
+def service_request_tag(request_id) -> str:
+    return f"service_request:{request_id}"
+
+
+def user_tag(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+async def get_service_request_cached(db, request_id: ObjectId) -> Optional[dict]:
+    """
+    A service request document (hot or archived) by id, served from the
+    response cache while fresh. Entries are tagged with the request id and the
+    owner's user id, so writes can invalidate either.
+    """
+    key = service_request_tag(request_id)
+    request = await response_cache.get(key)
+    if request is not None:
+        return request
+    
+    generation = await response_cache.generation()
+    request = await find_service_request(db, {"_id": request_id})
+    if request is not None:
+        await response_cache.set(
+            key,
+            request,
+            settings.RESPONSE_CACHE_TTL_SECONDS,
+            tags=(key, user_tag(request["user_id"])),
+            generation=generation
+        )
+    return request
+
+
+async def get_service_requests_cached(db, request_ids: Iterable[ObjectId]) -> Dict[ObjectId, dict]:
+    """
+    Several service requests by id, like `get_service_request_cached`, with
+    all cache misses fetched together in one `$in` query per tier.
+    """
+    found: Dict[ObjectId, dict] = {}
+    misses = []
+    for request_id in set(request_ids):
+        request = await response_cache.get(service_request_tag(request_id))
+        if request is not None:
+            found[request_id] = request
+        else:
+            misses.append(request_id)
+    if not misses:
+        return found
+    
+    generation = await response_cache.generation()
+    for request_id, request in (await find_service_requests_by_id(db, misses)).items():
+        key = service_request_tag(request_id)
+        await response_cache.set(
+            key,
+            request,
+            settings.RESPONSE_CACHE_TTL_SECONDS,
+            tags=(key, user_tag(request["user_id"])),
+            generation=generation
+        )
+        found[request_id] = request
+    return found
+
+
+async def invalidate_service_request(request_id=None, user_id: Optional[str] = None) -> None:
+    """Drop cached responses for a request and/or everything tagged with a user"""
+    coalesced_reads.invalidate()
+    tags = []
+    if request_id is not None:
+        tags.append(service_request_tag(request_id))
+    if user_id is not None:
+        tags.append(user_tag(user_id))
+    await response_cache.invalidate_tags(*tags)
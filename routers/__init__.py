@@ -1,4 +1,7 @@
 from .user import router as user_router
 from .admin import router as admin_router
+from .system import router as system_router
+from .technician import router as technician_router
+from .batch import router as batch_router
 
-__all__ = ["user_router", "admin_router"]
+__all__ = ["user_router", "admin_router", "system_router", "technician_router", "batch_router"]
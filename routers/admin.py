@@ -1,21 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 from bson import ObjectId
-from database import get_database
+from pymongo import ReturnDocument
+from database import get_database, routed_database
 from models import (
-    AdminCreate, AdminLogin, AdminResponse, Token,
+    AdminCreate, AdminLogin, AdminResponse, Token, AccountStatusUpdate, UserResponse,
     ServiceRequestResponse, ServiceRequestUpdate, RequestStatus,
     FeedbackResponse, AnalyticsResponse, TechnicianPerformance,
-    ServiceType
+    ServiceType, ServiceRequestSearchResponse, ServiceRequestSearchResult,
+    AnalyticsGranularity, AnalyticsSeriesResponse
 )
 from auth import (
     get_password_hash, verify_password, create_access_token,
-    get_current_admin
+    get_current_admin, password_needs_rehash, upgrade_password_hash
 )
-from otp_service import send_notification_sms
+from deadlines import class_budget, detached, run_to_completion
+from notifier import notifier
+from principals import principal_cache
 from models import TokenData, UserRole
+from rate_limit import rate_limit
+from idempotency import IdempotentRequest, idempotent
+from group_commit import audit_events
+from archiver import ARCHIVE_COLLECTION, find_service_requests
+from response_cache import coalesced_reads, get_service_request_cached, invalidate_service_request
+from search_index import search_service_requests, index_service_request
+from scheduling import TechnicianBusy, booking_window, book_technician, release_booking, reserve_technician
+from analytics_rollup import (
+    load_rollups, summarize_rollups, record_request_completed, record_request_cancelled
+)
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 security = HTTPBearer()
@@ -37,7 +52,7 @@ async def create_admin(admin: AdminCreate, db=Depends(get_database)):
     # Create admin
     admin_dict = {
         "email": admin.email,
-        "hashed_password": get_password_hash(admin.password),
+        "hashed_password": await run_in_threadpool(get_password_hash, admin.password),
         "full_name": admin.full_name,
         "role": UserRole.ADMIN.value,
         "is_active": True,
@@ -57,8 +72,12 @@ async def create_admin(admin: AdminCreate, db=Depends(get_database)):
     )
 
 
-@router.post("/login", response_model=Token)
-async def admin_login(admin: AdminLogin, db=Depends(get_database)):
+@router.post(
+    "/login",
+    response_model=Token,
+    dependencies=[Depends(rate_limit("admin_login", ("email",)))]
+)
+async def admin_login(admin: AdminLogin, background_tasks: BackgroundTasks, db=Depends(get_database)):
     """Admin login"""
     admins_collection = db["admins"]
     
@@ -70,13 +89,25 @@ async def admin_login(admin: AdminLogin, db=Depends(get_database)):
             detail="Incorrect email or password"
         )
     
-    # Verify password
-    if not verify_password(admin.password, db_admin["hashed_password"]):
+    # Verify password; bcrypt is slow on purpose, so keep it off the event loop
+    if not await run_in_threadpool(verify_password, admin.password, db_admin["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    if not db_admin.get("is_active", True):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is deactivated"
+        )
+    
+    # Upgrade hashes created with an outdated bcrypt cost once the response is sent
+    if password_needs_rehash(db_admin["hashed_password"]):
+        background_tasks.add_task(
+            detached(upgrade_password_hash), admins_collection, db_admin["_id"], db_admin["hashed_password"], admin.password
+        )
+    
     # Create access token
     access_token = create_access_token(
         data={"sub": str(db_admin["_id"]), "role": UserRole.ADMIN.value}
@@ -105,18 +136,91 @@ async def admin_logout(
     }
 
 
+async def _set_account_status(db, role: UserRole, account_id: str, is_active: bool, current_admin: TokenData) -> dict:
+    """Activate or deactivate a user or admin account; existing tokens stop working in this worker at once"""
+    if not ObjectId.is_valid(account_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid account ID"
+        )
+    
+    collection = db["users" if role == UserRole.USER else "admins"]
+    updated_at = datetime.utcnow()
+    account = await collection.find_one_and_update(
+        {"_id": ObjectId(account_id)},
+        {"$set": {"is_active": is_active, "updated_at": updated_at}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not account:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Account not found"
+        )
+    
+    principal_cache.invalidate(role.value, account_id)
+    audit_events.add({
+        "action": f"{role.value}.activated" if is_active else f"{role.value}.deactivated",
+        "actor_id": current_admin.user_id,
+        "account_id": account_id,
+        "created_at": updated_at
+    })
+    return account
+
+
+@router.patch("/users/{user_id}/status", response_model=UserResponse)
+async def update_user_status(
+    user_id: str,
+    update: AccountStatusUpdate,
+    current_admin: TokenData = Depends(get_current_admin),
+    db=Depends(get_database)
+):
+    """Activate or deactivate a user account"""
+    user = await _set_account_status(db, UserRole.USER, user_id, update.is_active, current_admin)
+    return UserResponse(
+        id=str(user["_id"]),
+        phone_number=user["phone_number"],
+        is_active=user["is_active"],
+        is_verified=user.get("is_verified", False),
+        created_at=user["created_at"]
+    )
+
+
+@router.patch("/admins/{admin_id}/status", response_model=AdminResponse)
+async def update_admin_status(
+    admin_id: str,
+    update: AccountStatusUpdate,
+    current_admin: TokenData = Depends(get_current_admin),
+    db=Depends(get_database)
+):
+    """Activate or deactivate another admin account"""
+    if admin_id == current_admin.user_id and not update.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You cannot deactivate your own account"
+        )
+    
+    admin = await _set_account_status(db, UserRole.ADMIN, admin_id, update.is_active, current_admin)
+    return AdminResponse(
+        id=str(admin["_id"]),
+        email=admin["email"],
+        full_name=admin["full_name"],
+        role=admin.get("role", UserRole.ADMIN.value),
+        is_active=admin["is_active"],
+        created_at=admin["created_at"]
+    )
+
+
 @router.get("/service-requests", response_model=List[ServiceRequestResponse])
 async def get_all_service_requests(
     status_filter: Optional[RequestStatus] = None,
     service_type_filter: Optional[ServiceType] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    include_archived: bool = Query(False, description="Also return archived (long finished) requests"),
     current_admin: TokenData = Depends(get_current_admin),
     db=Depends(get_database)
 ):
     """Get all service requests with optional filters"""
-    requests_collection = db["service_requests"]
-    
     # Build query
     query = {}
     if status_filter:
@@ -124,10 +228,13 @@ async def get_all_service_requests(
     if service_type_filter:
         query["service_type"] = service_type_filter.value
     
-    # Get requests
-    requests = await requests_collection.find(query).sort(
-        "created_at", -1
-    ).skip(skip).limit(limit).to_list(length=limit)
+    # Admins opening the same page at the same time share one query
+    key = ("service_requests", query.get("status"), query.get("service_type"), skip, limit, include_archived)
+    return await coalesced_reads.do(key, lambda: _service_requests_page(db, query, skip, limit, include_archived))
+
+
+async def _service_requests_page(db, query: dict, skip: int, limit: int, include_archived: bool) -> List[ServiceRequestResponse]:
+    requests = await find_service_requests(db, query, skip, limit, include_archived)
     
     return [
         ServiceRequestResponse(
@@ -146,6 +253,7 @@ async def get_all_service_requests(
             admin_response=req.get("admin_response"),
             technician_name=req.get("technician_name"),
             technician_phone=req.get("technician_phone"),
+            technician_id=req.get("technician_id"),
             estimated_arrival_time=req.get("estimated_arrival_time"),
             created_at=req["created_at"],
             updated_at=req["updated_at"],
@@ -155,23 +263,54 @@ async def get_all_service_requests(
     ]
 
 
+@router.get("/service-requests/search", response_model=ServiceRequestSearchResponse)
+async def search_all_service_requests(
+    q: str = Query(..., min_length=1, max_length=200, description="Words from the customer name, address or issue"),
+    status_filter: Optional[RequestStatus] = None,
+    service_type_filter: Optional[ServiceType] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_admin: TokenData = Depends(get_current_admin),
+    db=Depends(get_database)
+):
+    """Full-text search over service requests, ranked by relevance"""
+    backend, total, page = await search_service_requests(
+        db,
+        q,
+        status=status_filter.value if status_filter else None,
+        service_type=service_type_filter.value if service_type_filter else None,
+        skip=skip,
+        limit=limit
+    )
+    
+    return ServiceRequestSearchResponse(
+        query=q,
+        total=total,
+        skip=skip,
+        limit=limit,
+        backend=backend,
+        results=[
+            ServiceRequestSearchResult.from_document(request, score=score)
+            for request, score in page
+        ]
+    )
+
+
 @router.get("/service-request/{request_id}", response_model=ServiceRequestResponse)
 async def get_service_request_detail(
     request_id: str,
     current_admin: TokenData = Depends(get_current_admin),
     db=Depends(get_database)
 ):
-    """Get detailed information about a specific service request"""
-    requests_collection = db["service_requests"]
-    
-    try:
-        request = await requests_collection.find_one({"_id": ObjectId(request_id)})
-    except:
+    """Get detailed information about a specific service request (including archived ones)"""
+    if not ObjectId.is_valid(request_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid request ID"
         )
     
+    request = await get_service_request_cached(db, ObjectId(request_id))
+    
     if not request:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -194,6 +333,7 @@ async def get_service_request_detail(
         admin_response=request.get("admin_response"),
         technician_name=request.get("technician_name"),
         technician_phone=request.get("technician_phone"),
+        technician_id=request.get("technician_id"),
         estimated_arrival_time=request.get("estimated_arrival_time"),
         created_at=request["created_at"],
         updated_at=request["updated_at"],
@@ -206,20 +346,24 @@ async def update_service_request(
     request_id: str,
     update_data: ServiceRequestUpdate,
     current_admin: TokenData = Depends(get_current_admin),
-    db=Depends(get_database)
+    db=Depends(get_database),
+    idempotency: IdempotentRequest = Depends(idempotent("update_service_request"))
 ):
     """Update a service request (admin response, status, technician assignment)"""
+    if idempotency.replay:
+        return idempotency.replay
+    
     requests_collection = db["service_requests"]
     users_collection = db["users"]
     
-    try:
-        request = await requests_collection.find_one({"_id": ObjectId(request_id)})
-    except:
+    if not ObjectId.is_valid(request_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid request ID"
         )
     
+    request = await requests_collection.find_one({"_id": ObjectId(request_id)})
+    
     if not request:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -246,64 +390,161 @@ async def update_service_request(
     if update_data.estimated_arrival_time:
         update_dict["estimated_arrival_time"] = update_data.estimated_arrival_time
     
-    # Update request
-    await requests_collection.update_one(
-        {"_id": ObjectId(request_id)},
-        {"$set": update_dict}
-    )
-    
-    # Send notification to user
-    user = await users_collection.find_one({"_id": ObjectId(request["user_id"])})
-    if user and update_data.admin_response:
-        message = f"Update on your {request['service_type']} request: {update_data.admin_response}"
-        await send_notification_sms(user["phone_number"], message)
-    
-    # Send notification if technician is on the way
-    if update_data.estimated_arrival_time and user:
-        # Handle both string and datetime types for estimated_arrival_time
-        eta_str = update_data.estimated_arrival_time
-        if isinstance(eta_str, datetime):
-            eta_str = eta_str.strftime('%I:%M %p')
-        eta_message = f"Your technician {update_data.technician_name or 'our technician'} is on the way! Expected arrival: {eta_str}"
-        await send_notification_sms(user["phone_number"], eta_message)
-    
-    # Get updated request
-    updated_request = await requests_collection.find_one({"_id": ObjectId(request_id)})
-    
-    return ServiceRequestResponse(
-        id=str(updated_request["_id"]),
-        user_id=updated_request["user_id"],
-        service_type=updated_request["service_type"],
-        name=updated_request["name"],
-        address=updated_request["address"],
-        contact_number=updated_request["contact_number"],
-        preferred_time=updated_request["preferred_time"],
-        issue_description=updated_request["issue_description"],
-        hours_required=updated_request.get("hours_required"),
-        hourly_rate=updated_request.get("hourly_rate"),
-        total_cost=updated_request.get("total_cost"),
-        status=updated_request["status"],
-        admin_response=updated_request.get("admin_response"),
-        technician_name=updated_request.get("technician_name"),
-        technician_phone=updated_request.get("technician_phone"),
-        estimated_arrival_time=updated_request.get("estimated_arrival_time"),
-        created_at=updated_request["created_at"],
-        updated_at=updated_request["updated_at"],
-        completed_at=updated_request.get("completed_at")
-    )
+    # Assign a registered technician, rejecting bookings that overlap their calendar
+    booking = None
+    if update_data.technician_id:
+        if not ObjectId.is_valid(update_data.technician_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid technician ID"
+            )
+        
+        technician = await db["technicians"].find_one({
+            "_id": ObjectId(update_data.technician_id),
+            "is_active": True
+        })
+        
+        if not technician:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Technician not found"
+            )
+        
+        if request["service_type"] not in technician["skills"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Technician does not handle {request['service_type']} requests"
+            )
+        
+        booking = booking_window(request)
+        previous_booking = await db["technician_bookings"].find_one({"service_request_id": request_id})
+        update_dict["technician_id"] = update_data.technician_id
+        update_dict["technician_name"] = update_data.technician_name or technician["name"]
+        update_dict["technician_phone"] = update_data.technician_phone or technician["phone_number"]
+    
+    async def commit() -> ServiceRequestResponse:
+        if booking:
+            # Book first (atomically per technician), so two overlapping assignments can't both succeed
+            try:
+                conflict = await reserve_technician(db, update_data.technician_id, request_id, *booking)
+            except TechnicianBusy:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Technician's calendar is being updated, please retry",
+                    headers={"Retry-After": "1"}
+                )
+            if conflict:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Technician is already booked from {conflict['start']:%Y-%m-%d %H:%M} to {conflict['end']:%Y-%m-%d %H:%M}"
+                )
+        
+        # Update request
+        try:
+            await requests_collection.update_one(
+                {"_id": ObjectId(request_id)},
+                {"$set": update_dict}
+            )
+        except Exception:
+            # The request was not assigned: give the new booking back
+            if booking:
+                if previous_booking:
+                    await book_technician(
+                        db, previous_booking["technician_id"], request_id, previous_booking["start"], previous_booking["end"]
+                    )
+                else:
+                    await release_booking(db, request_id)
+            raise
+        await invalidate_service_request(request_id, request["user_id"])
+        
+        # Audit trail; batched with concurrent events and written with the telemetry tier
+        audit_events.add({
+            "action": "service_request.updated",
+            "actor_id": current_admin.user_id,
+            "service_request_id": request_id,
+            "changes": update_dict,
+            "created_at": update_dict["updated_at"]
+        })
+        
+        if update_data.status == RequestStatus.CANCELLED:
+            await release_booking(db, request_id)
+        
+        # Keep the daily analytics rollups current on status transitions
+        if update_data.status and update_data.status.value != request["status"]:
+            if update_data.status == RequestStatus.COMPLETED:
+                await record_request_completed(db, request, update_dict["completed_at"])
+            elif update_data.status == RequestStatus.CANCELLED:
+                await record_request_cancelled(db, request, update_dict["updated_at"])
+        
+        # Notify the user; rapid edits to one request are merged into a single SMS.
+        # Requests carry the owner's phone (user_phone); older ones look it up.
+        phone_number = request.get("user_phone")
+        if not phone_number:
+            user = await users_collection.find_one({"_id": ObjectId(request["user_id"])}, {"phone_number": 1})
+            phone_number = user["phone_number"] if user else None
+        if phone_number:
+            # Handle both string and datetime types for estimated_arrival_time
+            eta_str = update_data.estimated_arrival_time
+            if isinstance(eta_str, datetime):
+                eta_str = eta_str.strftime('%I:%M %p')
+            notifier.notify(
+                request["user_id"],
+                request_id,
+                phone_number,
+                request["service_type"],
+                admin_response=update_data.admin_response,
+                estimated_arrival=eta_str,
+                technician_name=update_dict.get("technician_name"),
+                status=update_data.status.value if update_data.status else None
+            )
+        
+        # Get updated request
+        updated_request = await requests_collection.find_one({"_id": ObjectId(request_id)})
+        index_service_request(updated_request)
+        
+        return await idempotency.complete(ServiceRequestResponse(
+            id=str(updated_request["_id"]),
+            user_id=updated_request["user_id"],
+            service_type=updated_request["service_type"],
+            name=updated_request["name"],
+            address=updated_request["address"],
+            contact_number=updated_request["contact_number"],
+            preferred_time=updated_request["preferred_time"],
+            issue_description=updated_request["issue_description"],
+            hours_required=updated_request.get("hours_required"),
+            hourly_rate=updated_request.get("hourly_rate"),
+            total_cost=updated_request.get("total_cost"),
+            status=updated_request["status"],
+            admin_response=updated_request.get("admin_response"),
+            technician_name=updated_request.get("technician_name"),
+            technician_phone=updated_request.get("technician_phone"),
+            technician_id=updated_request.get("technician_id"),
+            estimated_arrival_time=updated_request.get("estimated_arrival_time"),
+            created_at=updated_request["created_at"],
+            updated_at=updated_request["updated_at"],
+            completed_at=updated_request.get("completed_at")
+        ))
+    
+    # From the first write on, the update runs to the end even if the request runs out of time
+    return await run_to_completion(commit, class_budget("db_write"))
 
 
 @router.get("/analytics", response_model=AnalyticsResponse)
 async def get_analytics(
     current_admin: TokenData = Depends(get_current_admin),
-    db=Depends(get_database)
+    db=Depends(routed_database("get_analytics"))
 ):
     """Get analytics dashboard data"""
+    return await coalesced_reads.do(("analytics",), lambda: _analytics(db))
+
+
+async def _analytics(db) -> AnalyticsResponse:
     requests_collection = db["service_requests"]
     feedback_collection = db["feedback"]
     
-    # Get all requests
+    # Get all requests, including archived history
     all_requests = await requests_collection.find({}).to_list(length=None)
+    all_requests += await db[ARCHIVE_COLLECTION].find({}).to_list(length=None)
     
     # Calculate basic metrics
     total_requests = len(all_requests)
@@ -372,12 +613,55 @@ async def get_analytics(
     )
 
 
+@router.get("/analytics/series", response_model=AnalyticsSeriesResponse)
+async def get_analytics_series(
+    start: Optional[date] = Query(None, description="First day (UTC), defaults to 29 days before end"),
+    end: Optional[date] = Query(None, description="Last day (UTC), defaults to today"),
+    granularity: AnalyticsGranularity = AnalyticsGranularity.DAY,
+    service_type: Optional[ServiceType] = None,
+    current_admin: TokenData = Depends(get_current_admin),
+    db=Depends(routed_database("get_analytics_series"))
+):
+    """Requests over time, completion-time percentiles and rating histogram, read from daily rollups"""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must not be before start"
+        )
+    
+    max_days = 31 if granularity == AnalyticsGranularity.HOUR else 3 * 366
+    if (end - start).days + 1 > max_days:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range is limited to {max_days} days for {granularity.value} granularity"
+        )
+    
+    service_types = [service_type.value] if service_type else [t.value for t in ServiceType]
+    rollups = await load_rollups(db, start, end, [service_type.value] if service_type else None)
+    summary = summarize_rollups(rollups, service_types, granularity.value)
+    
+    return AnalyticsSeriesResponse(
+        start=datetime(start.year, start.month, start.day),
+        end=datetime(end.year, end.month, end.day),
+        granularity=granularity,
+        service_type=service_type,
+        **summary
+    )
+
+
 @router.get("/technician-performance", response_model=List[TechnicianPerformance])
 async def get_technician_performance(
     current_admin: TokenData = Depends(get_current_admin),
-    db=Depends(get_database)
+    db=Depends(routed_database("get_technician_performance"))
 ):
     """Get performance metrics for all technicians"""
+    return await coalesced_reads.do(("technician_performance",), lambda: _technician_performance(db))
+
+
+async def _technician_performance(db) -> List[TechnicianPerformance]:
     requests_collection = db["service_requests"]
     feedback_collection = db["feedback"]
     
@@ -385,6 +669,9 @@ async def get_technician_performance(
     all_requests = await requests_collection.find({
         "technician_name": {"$exists": True, "$ne": None}
     }).to_list(length=None)
+    all_requests += await db[ARCHIVE_COLLECTION].find({
+        "technician_name": {"$exists": True, "$ne": None}
+    }).to_list(length=None)
     
     # Get all feedback
     all_feedback = await feedback_collection.find({}).to_list(length=None)
@@ -433,7 +720,7 @@ async def get_all_feedback(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     current_admin: TokenData = Depends(get_current_admin),
-    db=Depends(get_database)
+    db=Depends(routed_database("get_all_feedback"))
 ):
     """Get all feedback submissions"""
     feedback_collection = db["feedback"]
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from bson import ObjectId
+from database import get_database
+from models import (
+    BatchOperation, BatchRequest, BatchResponse, BatchResult,
+    ServiceRequestResponse, ServiceRequestUpdate, RequestStatus, ServiceType,
+    TokenData, UserRole
+)
+from auth import get_current_user
+from config import settings
+from deadlines import is_deadline_error
+from idempotency import NOT_IDEMPOTENT
+from archiver import find_service_requests
+from response_cache import get_service_requests_cached
+from routers import admin
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["Batch"])
+
+# (method, path pattern, admin only, operation kind)
+BATCH_ROUTES: List[Tuple[str, Pattern, bool, str]] = [
+    ("GET", re.compile(r"^/api/user/service-request/(?P<request_id>[^/]+)$"), False, "detail"),
+    ("GET", re.compile(r"^/api/user/service-requests$"), False, "list"),
+    ("GET", re.compile(r"^/api/admin/service-request/(?P<request_id>[^/]+)$"), True, "detail"),
+    ("GET", re.compile(r"^/api/admin/service-requests$"), True, "list"),
+    ("PATCH", re.compile(r"^/api/admin/service-request/(?P<request_id>[^/]+)$"), True, "update"),
+]
+
+
+def _error(operation: BatchOperation, status_code: int, detail) -> BatchResult:
+    return BatchResult(id=operation.id, status=status_code, body={"detail": detail})
+
+
+def _failure(operation: BatchOperation, error: Exception) -> BatchResult:
+    """The result the real route would have returned for an exception it raised"""
+    if isinstance(error, ValidationError):
+        return _error(operation, status.HTTP_422_UNPROCESSABLE_ENTITY, json.loads(error.json(include_url=False)))
+    if isinstance(error, HTTPException):
+        return _error(operation, error.status_code, error.detail)
+    if is_deadline_error(error):
+        return _error(operation, status.HTTP_504_GATEWAY_TIMEOUT, "Request deadline exceeded")
+    logger.error("Batch operation %s %s failed", operation.method, operation.path, exc_info=error)
+    return _error(operation, status.HTTP_500_INTERNAL_SERVER_ERROR, "Internal Server Error")
+
+
+def _resolve(operation: BatchOperation, current_user: TokenData) -> Tuple[str, bool, Optional[str]]:
+    """(kind, admin scope, request id) for an operation, raising HTTPException like the real route would"""
+    path = operation.path.split("?", 1)[0].rstrip("/")
+    path_matched = False
+    for method, pattern, admin_only, kind in BATCH_ROUTES:
+        match = pattern.match(path)
+        if not match:
+            continue
+        path_matched = True
+        if method != operation.method:
+            continue
+        if admin_only and current_user.role != UserRole.ADMIN.value:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+        return kind, admin_only, match.groupdict().get("request_id")
+    
+    if path_matched:
+        raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED, detail="Method Not Allowed")
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not supported in batch")
+
+
+def _list_query(operation: BatchOperation, admin_scope: bool, current_user: TokenData) -> Tuple[dict, int, int]:
+    """Filters, skip and limit for a list operation, validated like the list endpoints"""
+    if not admin_scope:
+        return {"user_id": current_user.user_id}, 0, 100
+    
+    params = operation.query
+    query = {}
+    try:
+        if params.get("status_filter"):
+            query["status"] = RequestStatus(params["status_filter"]).value
+        if params.get("service_type_filter"):
+            query["service_type"] = ServiceType(params["service_type_filter"]).value
+        skip = int(params.get("skip", 0))
+        limit = int(params.get("limit", 50))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    
+    if skip < 0 or not 1 <= limit <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="skip must be >= 0 and limit between 1 and 100"
+        )
+    return query, skip, limit
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def run_batch(
+    batch: BatchRequest,
+    current_user: TokenData = Depends(get_current_user),
+    db=Depends(get_database)
+):
+    """
+    Execute several service request operations in one call.
+    
+    Supports GET of a single request or a request list (user and admin paths)
+    and admin PATCH of a request. The token is decoded once for the whole
+    batch, detail lookups are served from the response cache with the misses
+    sharing a single `$in` query, and every operation gets its own status
+    code, including when it fails. Updates are applied before reads, so a batch
+    that updates and re-reads a request sees the new state.
+    """
+    if len(batch.operations) > settings.BATCH_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can contain at most {settings.BATCH_MAX_OPERATIONS} operations"
+        )
+    
+    results: Dict[int, BatchResult] = {}
+    details: List[Tuple[int, BatchOperation, bool, ObjectId]] = []
+    lists: List[Tuple[int, BatchOperation, bool]] = []
+    updates: List[Tuple[int, BatchOperation, str]] = []
+    
+    for position, operation in enumerate(batch.operations):
+        try:
+            kind, admin_scope, request_id = _resolve(operation, current_user)
+            if kind == "detail":
+                if not ObjectId.is_valid(request_id):
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid request ID")
+                details.append((position, operation, admin_scope, ObjectId(request_id)))
+            elif kind == "list":
+                lists.append((position, operation, admin_scope))
+            else:
+                updates.append((position, operation, request_id))
+        except HTTPException as e:
+            results[position] = _error(operation, e.status_code, e.detail)
+    
+    async def run_update(position: int, operation: BatchOperation, request_id: str) -> None:
+        try:
+            update_data = ServiceRequestUpdate(**(operation.body or {}))
+            updated = await admin.update_service_request(
+                request_id=request_id,
+                update_data=update_data,
+                current_admin=current_user,
+                db=db,
+                idempotency=NOT_IDEMPOTENT
+            )
+            results[position] = BatchResult(id=operation.id, status=status.HTTP_200_OK, body=jsonable_encoder(updated))
+        except Exception as e:
+            results[position] = _failure(operation, e)
+    
+    async def run_details() -> None:
+        if not details:
+            return
+        try:
+            by_id = await get_service_requests_cached(db, (object_id for _, _, _, object_id in details))
+        except Exception as e:
+            # The shared lookup failed, so every detail operation fails with it
+            for position, operation, _, _ in details:
+                results[position] = _failure(operation, e)
+            return
+        
+        for position, operation, admin_scope, object_id in details:
+            try:
+                request = by_id.get(object_id)
+                if request is None or (not admin_scope and request["user_id"] != current_user.user_id):
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service request not found")
+                body = jsonable_encoder(ServiceRequestResponse.from_document(request))
+                results[position] = BatchResult(id=operation.id, status=status.HTTP_200_OK, body=body)
+            except Exception as e:
+                results[position] = _failure(operation, e)
+    
+    async def run_list(position: int, operation: BatchOperation, admin_scope: bool) -> None:
+        try:
+            query, skip, limit = _list_query(operation, admin_scope, current_user)
+            include_archived = str(operation.query.get("include_archived", "")).lower() in ("1", "true")
+            requests = await find_service_requests(db, query, skip, limit, include_archived)
+            body = [jsonable_encoder(ServiceRequestResponse.from_document(request)) for request in requests]
+            results[position] = BatchResult(id=operation.id, status=status.HTTP_200_OK, body=body)
+        except Exception as e:
+            results[position] = _failure(operation, e)
+    
+    await asyncio.gather(*(run_update(*update) for update in updates))
+    await asyncio.gather(run_details(), *(run_list(*item) for item in lists))
+    
+    return BatchResponse(results=[results[position] for position in range(len(batch.operations))])
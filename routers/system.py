@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends
+from admission import admission_stats
+from auth import get_current_admin
+from group_commit import buffers
+from loop_monitor import loop_monitor
+from models import TokenData
+from notifier import notifier
+from pool_monitor import pool_monitor
+from principals import principal_cache
+from response_cache import coalesced_reads, response_cache
+from sms_providers import sms_gateway
+from traffic_capture import trace_writer
+
+router = APIRouter(prefix="/api/admin/system", tags=["System"])
+
+
+@router.get("/pool")
+async def get_pool_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Live MongoDB connection pool statistics for this worker"""
+    return pool_monitor.stats()
+
+
+@router.get("/admission")
+async def get_admission_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Concurrency, queue depth and shed counts per route class for this worker"""
+    return admission_stats()
+
+
+@router.get("/cache")
+async def get_cache_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Response cache size, hit ratio, evictions and invalidations for this worker"""
+    return response_cache.stats()
+
+
+@router.get("/coalescing")
+async def get_coalescing_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Dashboard reads started vs. served by joining an identical read already in flight"""
+    return coalesced_reads.stats()
+
+
+@router.get("/group-commit")
+async def get_group_commit_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Pending documents, batches written and average batch size per group-commit buffer"""
+    return {name: buffer.stats() for name, buffer in buffers.items()}
+
+
+@router.get("/sms")
+async def get_sms_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Circuit breaker state and delivery counts per SMS provider, in failover order"""
+    return sms_gateway.stats()
+
+
+@router.get("/notifications")
+async def get_notification_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Pending coalesced notifications and updates merged per SMS for this worker"""
+    return notifier.stats()
+
+
+@router.get("/event-loop")
+async def get_event_loop_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Event-loop lag percentiles and the call sites that blocked the loop most often"""
+    return loop_monitor.stats()
+
+
+@router.get("/principals")
+async def get_principal_cache_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Account status cache size, hit ratio and invalidations for this worker"""
+    return principal_cache.stats()
+
+
+@router.get("/traffic-capture")
+async def get_traffic_capture_stats(current_admin: TokenData = Depends(get_current_admin)):
+    """Whether traffic capture is on, where traces go and how many this worker wrote"""
+    return trace_writer.stats()
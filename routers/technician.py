@@ -0,0 +1,153 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from datetime import datetime
+from typing import List, Optional
+from bson import ObjectId
+from database import get_database
+from models import (
+    TechnicianCreate, TechnicianResponse, TechnicianBookingResponse,
+    TechnicianAvailabilityResponse, ServiceType, TokenData
+)
+from auth import get_current_admin
+from response_cache import coalesced_reads
+from scheduling import calendar, booking_window, to_naive_utc
+
+router = APIRouter(prefix="/api/admin/technicians", tags=["Technicians"])
+
+
+def technician_response(technician: dict) -> TechnicianResponse:
+    return TechnicianResponse(
+        id=str(technician["_id"]),
+        name=technician["name"],
+        phone_number=technician["phone_number"],
+        skills=technician["skills"],
+        is_active=technician.get("is_active", True),
+        created_at=technician["created_at"]
+    )
+
+
+@router.post("", response_model=TechnicianResponse)
+async def create_technician(
+    technician: TechnicianCreate,
+    current_admin: TokenData = Depends(get_current_admin),
+    db=Depends(get_database)
+):
+    """Register a technician and the service types they can handle"""
+    technicians_collection = db["technicians"]
+    
+    existing = await technicians_collection.find_one({"phone_number": technician.phone_number})
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Technician with this phone number already exists"
+        )
+    
+    technician_dict = {
+        "name": technician.name,
+        "phone_number": technician.phone_number,
+        "skills": [skill.value for skill in technician.skills],
+        "is_active": True,
+        "created_at": datetime.utcnow()
+    }
+    
+    result = await technicians_collection.insert_one(technician_dict)
+    technician_dict["_id"] = result.inserted_id
+    calendar.add_technician(technician_dict)
+    coalesced_reads.invalidate()
+    
+    return technician_response(technician_dict)
+
+
+@router.get("", response_model=List[TechnicianResponse])
+async def list_technicians(
+    service_type: Optional[ServiceType] = None,
+    current_admin: TokenData = Depends(get_current_admin),
+    db=Depends(get_database)
+):
+    """List active technicians, optionally only those with a given skill"""
+    query = {"is_active": True}
+    if service_type:
+        query["skills"] = service_type.value
+    
+    technicians = await db["technicians"].find(query).sort("name", 1).to_list(length=None)
+    return [technician_response(technician) for technician in technicians]
+
+
+@router.get("/available", response_model=TechnicianAvailabilityResponse)
+async def get_available_technicians(
+    service_type: Optional[ServiceType] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    service_request_id: Optional[str] = Query(None, description="Use the request's service type, preferred time and hours"),
+    current_admin: TokenData = Depends(get_current_admin),
+    db=Depends(get_database)
+):
+    """Technicians with the right skill and no booking overlapping the time window"""
+    if service_request_id:
+        if not ObjectId.is_valid(service_request_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid request ID"
+            )
+        
+        request = await db["service_requests"].find_one({"_id": ObjectId(service_request_id)})
+        if not request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Service request not found"
+            )
+        service_type = ServiceType(request["service_type"])
+        start, end = booking_window(request)
+    elif not (service_type and start and end):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide service_request_id, or service_type with start and end"
+        )
+    
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must be after start"
+        )
+    
+    await calendar.refresh(db)
+    available_ids = calendar.available(service_type.value, start, end)
+    
+    return TechnicianAvailabilityResponse(
+        service_type=service_type,
+        start=start,
+        end=end,
+        available_technicians=sorted(
+            (technician_response(calendar.technicians[technician_id]) for technician_id in available_ids),
+            key=lambda technician: technician.name
+        )
+    )
+
+
+@router.get("/{technician_id}/bookings", response_model=List[TechnicianBookingResponse])
+async def get_technician_bookings(
+    technician_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_admin: TokenData = Depends(get_current_admin),
+    db=Depends(get_database)
+):
+    """A technician's bookings, optionally limited to those overlapping a window"""
+    query = {"technician_id": technician_id}
+    if start:
+        query["end"] = {"$gt": to_naive_utc(start)}
+    if end:
+        query["start"] = {"$lt": to_naive_utc(end)}
+    
+    bookings = await db["technician_bookings"].find(query).sort("start", 1).to_list(length=500)
+    
+    return [
+        TechnicianBookingResponse(
+            id=str(booking["_id"]),
+            technician_id=booking["technician_id"],
+            service_request_id=booking["service_request_id"],
+            start=booking["start"],
+            end=booking["end"]
+        )
+        for booking in bookings
+    ]
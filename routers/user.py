@@ -1,26 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 from typing import List
+import asyncio
+import hashlib
+import json
+import logging
 from bson import ObjectId
 from database import get_database
 from models import (
     OTPRequest, OTPVerify, UserCreate, UserLogin, UserResponse,
     Token, ServiceRequestCreate, ServiceRequestResponse, ServiceRequestInDB,
-    FeedbackCreate, FeedbackResponse, RequestStatus, ServiceType
+    FeedbackCreate, FeedbackResponse, RequestStatus, ServiceType,
+    ServiceRequestSummary, UserHomeResponse
 )
+from deadlines import class_budget, detached, run_to_completion
 from auth import (
     get_password_hash, verify_password, create_access_token,
-    get_current_user
+    get_current_user, password_needs_rehash, upgrade_password_hash
 )
-from otp_service import generate_otp, store_otp, verify_otp, send_otp_via_zong, send_notification_sms
+from otp_service import issue_otp, verify_otp, send_notification_sms
+from sms_providers import international_number
 from models import TokenData, UserRole
+from rate_limit import rate_limit
+from idempotency import IdempotentRequest, idempotent
+from config import settings
+from search_index import index_service_request
+from analytics_rollup import record_request_created, record_feedback
+from archiver import ARCHIVE_COLLECTION, find_service_requests
+from response_cache import coalesced_reads, get_service_request_cached, invalidate_service_request
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/user", tags=["User"])
 security = HTTPBearer()
 
+ACTIVE_STATUSES = [RequestStatus.PENDING.value, RequestStatus.ASSIGNED.value, RequestStatus.IN_PROGRESS.value]
+SUMMARY_PROJECTION = {
+    "service_type": 1, "status": 1, "preferred_time": 1, "technician_name": 1,
+    "created_at": 1, "updated_at": 1, "completed_at": 1
+}
+
 
-@router.post("/register/send-otp")
+@router.post(
+    "/register/send-otp",
+    dependencies=[Depends(rate_limit(
+        "send_otp", ("phone_number",),
+        capacity=settings.OTP_RATE_LIMIT_CAPACITY,
+        per_minute=settings.OTP_RATE_LIMIT_PER_MINUTE
+    ))]
+)
 async def send_registration_otp(request: OTPRequest, db=Depends(get_database)):
     """Send OTP for user registration"""
     # Check if user already exists
@@ -33,11 +64,8 @@ async def send_registration_otp(request: OTPRequest, db=Depends(get_database)):
             detail="User with this phone number already exists"
         )
     
-    # Generate and send OTP
-    otp = generate_otp()
-    store_otp(request.phone_number, otp)
-    
-    success = await send_otp_via_zong(request.phone_number, otp)
+    # Generate and send OTP (concurrent duplicates share one send)
+    success = await issue_otp(request.phone_number)
     
     if not success:
         raise HTTPException(
@@ -76,7 +104,8 @@ async def complete_registration(user: UserCreate, db=Depends(get_database)):
     # Create user
     user_dict = {
         "phone_number": user.phone_number,
-        "hashed_password": get_password_hash(user.password),
+        "phone_normalized": international_number(user.phone_number),
+        "hashed_password": await run_in_threadpool(get_password_hash, user.password),
         "is_active": True,
         "is_verified": True,
         "created_at": datetime.utcnow()
@@ -84,6 +113,7 @@ async def complete_registration(user: UserCreate, db=Depends(get_database)):
     
     result = await users_collection.insert_one(user_dict)
     user_id = str(result.inserted_id)
+    coalesced_reads.invalidate()
     
     # Create access token for immediate login
     access_token = create_access_token(
@@ -93,8 +123,12 @@ async def complete_registration(user: UserCreate, db=Depends(get_database)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@router.post("/login", response_model=Token)
-async def login(user: UserLogin, db=Depends(get_database)):
+@router.post(
+    "/login",
+    response_model=Token,
+    dependencies=[Depends(rate_limit("login", ("phone_number", "phoneNumber")))]
+)
+async def login(user: UserLogin, background_tasks: BackgroundTasks, db=Depends(get_database)):
     """User login"""
     users_collection = db["users"]
     
@@ -106,13 +140,25 @@ async def login(user: UserLogin, db=Depends(get_database)):
             detail="Incorrect phone number or password"
         )
     
-    # Verify password
-    if not verify_password(user.password, db_user["hashed_password"]):
+    # Verify password; bcrypt is slow on purpose, so keep it off the event loop
+    if not await run_in_threadpool(verify_password, user.password, db_user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect phone number or password"
         )
     
+    if not db_user.get("is_active", True):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is deactivated"
+        )
+    
+    # Upgrade hashes created with an outdated bcrypt cost once the response is sent
+    if password_needs_rehash(db_user["hashed_password"]):
+        background_tasks.add_task(
+            detached(upgrade_password_hash), users_collection, db_user["_id"], db_user["hashed_password"], user.password
+        )
+    
     # Create access token
     access_token = create_access_token(
         data={"sub": str(db_user["_id"]), "role": UserRole.USER.value}
@@ -141,7 +187,7 @@ async def logout(
             "detail": "Your session has been terminated. Please login again to access your account."
         }
     except Exception as e:
-        print(f"Logout error: {str(e)}")
+        logger.exception("Logout failed")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Logout failed: {str(e)}"
@@ -152,11 +198,18 @@ async def logout(
 async def create_service_request(
     request: ServiceRequestCreate,
     current_user: TokenData = Depends(get_current_user),
-    db=Depends(get_database)
+    db=Depends(get_database),
+    idempotency: IdempotentRequest = Depends(idempotent("create_service_request"))
 ):
-    """Create a new service request"""
+    """Create a new service request (retries with the same Idempotency-Key return the original request)"""
+    if idempotency.replay:
+        return idempotency.replay
+    
     requests_collection = db["service_requests"]
     
+    # The owner's phone travels with the request, for notifications
+    owner = await db["users"].find_one({"_id": ObjectId(current_user.user_id)}, {"phone_number": 1})
+    
     # Initialize hourly booking fields
     hours_required = request.hours_required
     hourly_rate = None
@@ -169,6 +222,7 @@ async def create_service_request(
     
     request_dict = {
         "user_id": current_user.user_id,
+        "user_phone": owner["phone_number"] if owner else None,
         "service_type": request.service_type.value,
         "name": request.name,
         "address": request.address,
@@ -188,41 +242,47 @@ async def create_service_request(
         "completed_at": None
     }
     
-    result = await requests_collection.insert_one(request_dict)
-    request_dict["_id"] = str(result.inserted_id)
-    
-    return ServiceRequestResponse(
-        id=request_dict["_id"],
-        user_id=request_dict["user_id"],
-        service_type=request_dict["service_type"],
-        name=request_dict["name"],
-        address=request_dict["address"],
-        contact_number=request_dict["contact_number"],
-        preferred_time=request_dict["preferred_time"],
-        issue_description=request_dict["issue_description"],
-        hours_required=request_dict.get("hours_required"),
-        hourly_rate=request_dict.get("hourly_rate"),
-        total_cost=request_dict.get("total_cost"),
-        status=request_dict["status"],
-        admin_response=request_dict["admin_response"],
-        technician_name=request_dict["technician_name"],        technician_phone=request_dict.get("technician_phone"),        estimated_arrival_time=request_dict["estimated_arrival_time"],
-        created_at=request_dict["created_at"],
-        updated_at=request_dict["updated_at"],
-        completed_at=request_dict["completed_at"]
-    )
+    async def commit() -> ServiceRequestResponse:
+        result = await requests_collection.insert_one(request_dict)
+        request_dict["_id"] = str(result.inserted_id)
+        index_service_request(request_dict)
+        await invalidate_service_request(user_id=current_user.user_id)
+        await record_request_created(db, request_dict)
+        
+        return await idempotency.complete(ServiceRequestResponse(
+            id=request_dict["_id"],
+            user_id=request_dict["user_id"],
+            service_type=request_dict["service_type"],
+            name=request_dict["name"],
+            address=request_dict["address"],
+            contact_number=request_dict["contact_number"],
+            preferred_time=request_dict["preferred_time"],
+            issue_description=request_dict["issue_description"],
+            hours_required=request_dict.get("hours_required"),
+            hourly_rate=request_dict.get("hourly_rate"),
+            total_cost=request_dict.get("total_cost"),
+            status=request_dict["status"],
+            admin_response=request_dict["admin_response"],
+            technician_name=request_dict["technician_name"],        technician_phone=request_dict.get("technician_phone"),        estimated_arrival_time=request_dict["estimated_arrival_time"],
+            created_at=request_dict["created_at"],
+            updated_at=request_dict["updated_at"],
+            completed_at=request_dict["completed_at"]
+        ))
+    
+    # Once the request is stored, the rollup and cache updates must not be cut short by the deadline
+    return await run_to_completion(commit, class_budget("db_write"))
 
 
 @router.get("/service-requests", response_model=List[ServiceRequestResponse])
 async def get_user_service_requests(
+    include_archived: bool = Query(False, description="Also return archived (long finished) requests"),
     current_user: TokenData = Depends(get_current_user),
     db=Depends(get_database)
 ):
     """Get all service requests for the current user"""
-    requests_collection = db["service_requests"]
-    
-    requests = await requests_collection.find(
-        {"user_id": current_user.user_id}
-    ).sort("created_at", -1).to_list(length=100)
+    requests = await find_service_requests(
+        db, {"user_id": current_user.user_id}, limit=100, include_archived=include_archived
+    )
     
     return [
         ServiceRequestResponse(
@@ -241,6 +301,7 @@ async def get_user_service_requests(
             admin_response=req.get("admin_response"),
             technician_name=req.get("technician_name"),
             technician_phone=req.get("technician_phone"),
+            technician_id=req.get("technician_id"),
             estimated_arrival_time=req.get("estimated_arrival_time"),
             created_at=req["created_at"],
             updated_at=req["updated_at"],
@@ -250,27 +311,98 @@ async def get_user_service_requests(
     ]
 
 
+def _summary(request: dict) -> ServiceRequestSummary:
+    return ServiceRequestSummary(
+        id=str(request["_id"]),
+        service_type=request["service_type"],
+        status=request["status"],
+        preferred_time=request["preferred_time"],
+        technician_name=request.get("technician_name"),
+        created_at=request["created_at"],
+        updated_at=request["updated_at"],
+        completed_at=request.get("completed_at")
+    )
+
+
+@router.get("/home", response_model=UserHomeResponse)
+async def get_user_home(
+    http_request: Request,
+    current_user: TokenData = Depends(get_current_user),
+    db=Depends(get_database)
+):
+    """
+    Everything the app home screen needs in one call: the active request,
+    recent history, completed requests awaiting feedback and counts per status.
+    
+    The response carries an ETag; send it back in If-None-Match to get a
+    304 Not Modified when nothing changed.
+    """
+    requests_collection = db["service_requests"]
+    feedback_collection = db["feedback"]
+    user_id = current_user.user_id
+    
+    count_by_status = [
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]
+    
+    active, recent, completed, rated, counts, archived_counts = await asyncio.gather(
+        requests_collection.find_one(
+            {"user_id": user_id, "status": {"$in": ACTIVE_STATUSES}},
+            sort=[("created_at", -1)]
+        ),
+        requests_collection.find({"user_id": user_id}, SUMMARY_PROJECTION).sort(
+            "created_at", -1
+        ).to_list(length=settings.HOME_RECENT_REQUESTS),
+        requests_collection.find(
+            {"user_id": user_id, "status": RequestStatus.COMPLETED.value}, SUMMARY_PROJECTION
+        ).sort("completed_at", -1).to_list(length=100),
+        feedback_collection.find({"user_id": user_id}, {"service_request_id": 1, "_id": 0}).to_list(length=None),
+        requests_collection.aggregate(count_by_status).to_list(length=None),
+        db[ARCHIVE_COLLECTION].aggregate(count_by_status).to_list(length=None)
+    )
+    
+    status_counts = {}
+    for item in counts + archived_counts:
+        status_counts[item["_id"]] = status_counts.get(item["_id"], 0) + item["count"]
+    
+    rated_ids = {fb["service_request_id"] for fb in rated}
+    awaiting_feedback = [request for request in completed if str(request["_id"]) not in rated_ids]
+    
+    home = UserHomeResponse(
+        active_request=ServiceRequestResponse.from_document(active) if active else None,
+        recent_requests=[_summary(request) for request in recent],
+        awaiting_feedback=[_summary(request) for request in awaiting_feedback[:settings.HOME_AWAITING_FEEDBACK_LIMIT]],
+        status_counts=status_counts
+    )
+    
+    body = json.dumps(jsonable_encoder(home), separators=(",", ":")).encode()
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if_none_match = http_request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/service-request/{request_id}", response_model=ServiceRequestResponse)
 async def get_service_request(
     request_id: str,
     current_user: TokenData = Depends(get_current_user),
     db=Depends(get_database)
 ):
-    """Get a specific service request"""
-    requests_collection = db["service_requests"]
-    
-    try:
-        request = await requests_collection.find_one({
-            "_id": ObjectId(request_id),
-            "user_id": current_user.user_id
-        })
-    except:
+    """Get a specific service request (including archived ones)"""
+    if not ObjectId.is_valid(request_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid request ID"
         )
     
-    if not request:
+    request = await get_service_request_cached(db, ObjectId(request_id))
+    
+    if not request or request["user_id"] != current_user.user_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Service request not found"
@@ -292,6 +424,7 @@ async def get_service_request(
         admin_response=request.get("admin_response"),
         technician_name=request.get("technician_name"),
         technician_phone=request.get("technician_phone"),
+        technician_id=request.get("technician_id"),
         estimated_arrival_time=request.get("estimated_arrival_time"),
         created_at=request["created_at"],
         updated_at=request["updated_at"],
@@ -303,24 +436,28 @@ async def get_service_request(
 async def submit_feedback(
     feedback: FeedbackCreate,
     current_user: TokenData = Depends(get_current_user),
-    db=Depends(get_database)
+    db=Depends(get_database),
+    idempotency: IdempotentRequest = Depends(idempotent("submit_feedback"))
 ):
     """Submit feedback for a completed service request"""
+    if idempotency.replay:
+        return idempotency.replay
+    
     requests_collection = db["service_requests"]
     feedback_collection = db["feedback"]
     
     # Verify service request exists and belongs to user
-    try:
-        service_request = await requests_collection.find_one({
-            "_id": ObjectId(feedback.service_request_id),
-            "user_id": current_user.user_id
-        })
-    except:
+    if not ObjectId.is_valid(feedback.service_request_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid service request ID"
         )
     
+    service_request = await requests_collection.find_one({
+        "_id": ObjectId(feedback.service_request_id),
+        "user_id": current_user.user_id
+    })
+    
     if not service_request:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -349,25 +486,32 @@ async def submit_feedback(
         "service_request_id": feedback.service_request_id,
         "user_id": current_user.user_id,
         "technician_name": service_request.get("technician_name", "Unknown"),
+        "technician_id": service_request.get("technician_id"),
         "service_type": service_request["service_type"],
         "rating": feedback.rating,
         "comment": feedback.comment,
         "created_at": datetime.utcnow()
     }
     
-    result = await feedback_collection.insert_one(feedback_dict)
-    feedback_dict["_id"] = str(result.inserted_id)
-    
-    return FeedbackResponse(
-        id=feedback_dict["_id"],
-        service_request_id=feedback_dict["service_request_id"],
-        user_id=feedback_dict["user_id"],
-        technician_name=feedback_dict["technician_name"],
-        service_type=feedback_dict["service_type"],
-        rating=feedback_dict["rating"],
-        comment=feedback_dict["comment"],
-        created_at=feedback_dict["created_at"]
-    )
+    async def commit() -> FeedbackResponse:
+        result = await feedback_collection.insert_one(feedback_dict)
+        feedback_dict["_id"] = str(result.inserted_id)
+        await invalidate_service_request(feedback.service_request_id, current_user.user_id)
+        await record_feedback(db, feedback_dict)
+        
+        return await idempotency.complete(FeedbackResponse(
+            id=feedback_dict["_id"],
+            service_request_id=feedback_dict["service_request_id"],
+            user_id=feedback_dict["user_id"],
+            technician_name=feedback_dict["technician_name"],
+            service_type=feedback_dict["service_type"],
+            rating=feedback_dict["rating"],
+            comment=feedback_dict["comment"],
+            created_at=feedback_dict["created_at"]
+        ))
+    
+    # Once the feedback is stored, the rollup and cache updates must not be cut short by the deadline
+    return await run_to_completion(commit, class_budget("db_write"))
 
 
 @router.get("/my-feedback", response_model=List[FeedbackResponse])
@@ -0,0 +1,263 @@
+import asyncio
+import bisect
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from pymongo.errors import DuplicateKeyError
+from config import settings
+
+LOCK_COLLECTION = "technician_booking_locks"
+
+# (start, end, service_request_id)
+Booking = Tuple[datetime, datetime, str]
+
+
+class BookingCalendar:
+    """
+    Interval index of technician bookings.
+    
+    Each technician's bookings are kept sorted by start time. Bookings of one
+    technician never overlap, so the only booking that can collide with a new
+    interval [start, end) is the last one starting before `end`: a single
+    bisect answers "is this technician free?" in O(log n), and "who is free?"
+    costs one bisect per technician with the required skill.
+    
+    The calendar mirrors the `technicians` and `technician_bookings`
+    collections. It is reloaded every CALENDAR_REFRESH_SECONDS to pick up
+    changes from other workers; the database stays authoritative for
+    rejecting conflicting assignments.
+    """
+    
+    def __init__(self):
+        self.technicians: Dict[str, dict] = {}
+        self.by_skill: Dict[str, Set[str]] = defaultdict(set)
+        self._starts: Dict[str, List[datetime]] = defaultdict(list)
+        self._bookings: Dict[str, List[Booking]] = defaultdict(list)
+        self._owner: Dict[str, str] = {}  # service_request_id -> technician_id
+        self.loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+    
+    def add_technician(self, technician: dict) -> None:
+        technician_id = str(technician["_id"])
+        self.remove_technician(technician_id)
+        if not technician.get("is_active", True):
+            return
+        self.technicians[technician_id] = technician
+        for skill in technician.get("skills", []):
+            self.by_skill[skill].add(technician_id)
+    
+    def remove_technician(self, technician_id: str) -> None:
+        technician = self.technicians.pop(technician_id, None)
+        if technician:
+            for skill in technician.get("skills", []):
+                self.by_skill[skill].discard(technician_id)
+    
+    def add_booking(self, technician_id: str, start: datetime, end: datetime, service_request_id: str) -> None:
+        self.remove_booking(service_request_id)
+        index = bisect.bisect_right(self._starts[technician_id], start)
+        self._starts[technician_id].insert(index, start)
+        self._bookings[technician_id].insert(index, (start, end, service_request_id))
+        self._owner[service_request_id] = technician_id
+    
+    def remove_booking(self, service_request_id: str) -> None:
+        technician_id = self._owner.pop(service_request_id, None)
+        if technician_id is None:
+            return
+        bookings = self._bookings[technician_id]
+        for index, booking in enumerate(bookings):
+            if booking[2] == service_request_id:
+                del bookings[index]
+                del self._starts[technician_id][index]
+                return
+    
+    def conflict(
+        self,
+        technician_id: str,
+        start: datetime,
+        end: datetime,
+        ignore_request_id: Optional[str] = None
+    ) -> Optional[Booking]:
+        """The booking that overlaps [start, end) for this technician, if any"""
+        starts = self._starts.get(technician_id)
+        if not starts:
+            return None
+        index = bisect.bisect_left(starts, end) - 1
+        # Step over the request being re-assigned, which may be the candidate
+        while index >= 0:
+            booking = self._bookings[technician_id][index]
+            if booking[1] <= start:
+                return None
+            if booking[2] != ignore_request_id:
+                return booking
+            index -= 1
+        return None
+    
+    def available(self, service_type: str, start: datetime, end: datetime) -> List[str]:
+        """Ids of active technicians with the skill and no booking overlapping [start, end)"""
+        return [
+            technician_id
+            for technician_id in self.by_skill.get(service_type, ())
+            if self.conflict(technician_id, start, end) is None
+        ]
+    
+    def bookings_for(self, technician_id: str) -> List[Booking]:
+        return list(self._bookings.get(technician_id, []))
+    
+    async def refresh(self, db, force: bool = False) -> None:
+        """Reload technicians and current bookings when the snapshot is stale"""
+        if not force and self.loaded_at is not None and time.monotonic() - self.loaded_at < settings.CALENDAR_REFRESH_SECONDS:
+            return
+        
+        async with self._lock:
+            if not force and self.loaded_at is not None and time.monotonic() - self.loaded_at < settings.CALENDAR_REFRESH_SECONDS:
+                return
+            
+            fresh = BookingCalendar()
+            async for technician in db["technicians"].find({"is_active": True}):
+                fresh.add_technician(technician)
+            
+            # Past bookings can no longer conflict with anything
+            horizon = datetime.utcnow() - timedelta(days=1)
+            cursor = db["technician_bookings"].find({"end": {"$gt": horizon}}).sort("start", 1)
+            async for booking in cursor:
+                technician_id = booking["technician_id"]
+                fresh._starts[technician_id].append(booking["start"])
+                fresh._bookings[technician_id].append((booking["start"], booking["end"], booking["service_request_id"]))
+                fresh._owner[booking["service_request_id"]] = technician_id
+            
+            self.technicians = fresh.technicians
+            self.by_skill = fresh.by_skill
+            self._starts = fresh._starts
+            self._bookings = fresh._bookings
+            self._owner = fresh._owner
+            self.loaded_at = time.monotonic()
+
+
+calendar = BookingCalendar()
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """MongoDB hands back naive UTC datetimes; normalise client input to match"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def booking_window(service_request: dict) -> Tuple[datetime, datetime]:
+    """The time a service request occupies a technician"""
+    start = to_naive_utc(service_request["preferred_time"])
+    hours = service_request.get("hours_required") or settings.DEFAULT_BOOKING_HOURS
+    return start, start + timedelta(hours=hours)
+
+
+async def find_conflicting_booking(
+    db,
+    technician_id: str,
+    start: datetime,
+    end: datetime,
+    ignore_request_id: Optional[str] = None
+) -> Optional[dict]:
+    """Authoritative overlap check against the bookings collection"""
+    query = {"technician_id": technician_id, "start": {"$lt": end}, "end": {"$gt": start}}
+    if ignore_request_id:
+        query["service_request_id"] = {"$ne": ignore_request_id}
+    return await db["technician_bookings"].find_one(query)
+
+
+class TechnicianBusy(Exception):
+    """Another assignment for this technician is being made; retry shortly"""
+
+
+# Serializes assignments within this worker, so they queue instead of polling the lock document.
+# Each entry is (lock, number of holders and waiters) and is dropped when that reaches zero.
+_local_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+
+@asynccontextmanager
+async def _local_lock(technician_id: str):
+    lock, users = _local_locks.get(technician_id, (None, 0))
+    lock = lock or asyncio.Lock()
+    _local_locks[technician_id] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        _, users = _local_locks[technician_id]
+        if users == 1:
+            del _local_locks[technician_id]
+        else:
+            _local_locks[technician_id] = (lock, users - 1)
+
+
+@asynccontextmanager
+async def technician_lock(db, technician_id: str):
+    """
+    Hold the technician's booking lock across workers.
+    
+    The lock is a document keyed by technician id in `technician_booking_locks`;
+    inserting it claims the lock and deleting it releases it. A lock whose
+    holder died is taken over once it expires. Raises TechnicianBusy when the
+    lock cannot be had within BOOKING_LOCK_WAIT_SECONDS.
+    """
+    locks = db[LOCK_COLLECTION]
+    async with _local_lock(technician_id):
+        give_up = time.monotonic() + settings.BOOKING_LOCK_WAIT_SECONDS
+        while True:
+            now = datetime.utcnow()
+            claim = {"_id": technician_id, "expires_at": now + timedelta(seconds=settings.BOOKING_LOCK_SECONDS)}
+            try:
+                await locks.insert_one(claim)
+                break
+            except DuplicateKeyError:
+                taken = await locks.replace_one({"_id": technician_id, "expires_at": {"$lt": now}}, claim)
+                if taken.modified_count:
+                    break
+            if time.monotonic() >= give_up:
+                raise TechnicianBusy(technician_id)
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            await locks.delete_one({"_id": technician_id, "expires_at": claim["expires_at"]})
+
+
+async def reserve_technician(
+    db,
+    technician_id: str,
+    service_request_id: str,
+    start: datetime,
+    end: datetime
+) -> Optional[dict]:
+    """
+    Book [start, end) for the request unless it overlaps another booking of the
+    technician; returns the conflicting booking, or None once booked. The check
+    and the booking happen under the technician's lock, so concurrent
+    assignments cannot both pass the check.
+    """
+    async with technician_lock(db, technician_id):
+        conflict = await find_conflicting_booking(db, technician_id, start, end, ignore_request_id=service_request_id)
+        if conflict:
+            return conflict
+        await book_technician(db, technician_id, service_request_id, start, end)
+        return None
+
+
+async def book_technician(db, technician_id: str, service_request_id: str, start: datetime, end: datetime) -> None:
+    """Create or move the booking for a service request (one booking per request)"""
+    now = datetime.utcnow()
+    await db["technician_bookings"].update_one(
+        {"service_request_id": service_request_id},
+        {
+            "$set": {"technician_id": technician_id, "start": start, "end": end, "updated_at": now},
+            "$setOnInsert": {"created_at": now}
+        },
+        upsert=True
+    )
+    calendar.add_booking(technician_id, start, end, service_request_id)
+
+
+async def release_booking(db, service_request_id: str) -> None:
+    await db["technician_bookings"].delete_one({"service_request_id": service_request_id})
+    calendar.remove_booking(service_request_id)
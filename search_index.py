@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import math
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from archiver import ARCHIVE_COLLECTION, HOT_COLLECTION
+from config import settings
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+FIELD_WEIGHTS = {"name": 10, "address": 5, "issue_description": 1}
+INDEX_PROJECTION = {field: 1 for field in FIELD_WEIGHTS}
+INDEX_PROJECTION.update({"status": 1, "service_type": 1, "created_at": 1, "updated_at": 1})
+
+# Server error codes meaning the deployment cannot serve $text queries
+TEXT_INDEX_UNAVAILABLE_CODES = {27, 115}  # IndexNotFound, CommandNotSupported
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over service request names, addresses and issue
+    descriptions, for deployments without text index support.
+    
+    Postings hold a field-weighted term frequency per request; queries are
+    ranked by TF-IDF. The index is built on first use and then caught up
+    incrementally from `updated_at`, so writes made by other workers show up
+    within SEARCH_INDEX_REFRESH_SECONDS. Requests moved to the archive since
+    the last sync (by `archived_at`) are dropped, like the $text index of the
+    hot collection drops them.
+    """
+    
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.doc_terms: Dict[str, List[str]] = {}
+        self.doc_meta: Dict[str, Tuple[str, str, datetime]] = {}
+        self.synced_until: Optional[datetime] = None
+        self.archived_until: Optional[datetime] = None
+        self.refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+    
+    @property
+    def built(self) -> bool:
+        return self.synced_until is not None
+    
+    def add(self, request: dict) -> None:
+        """Index (or re-index) one service request document"""
+        doc_id = str(request["_id"])
+        self.remove(doc_id)
+        
+        weights: Dict[str, float] = defaultdict(float)
+        for field, field_weight in FIELD_WEIGHTS.items():
+            for term in tokenize(request.get(field)):
+                weights[term] += field_weight
+        
+        for term, weight in weights.items():
+            self.postings[term][doc_id] = weight
+        self.doc_terms[doc_id] = list(weights)
+        self.doc_meta[doc_id] = (request.get("status"), request.get("service_type"), request.get("created_at"))
+    
+    def remove(self, doc_id: str) -> None:
+        for term in self.doc_terms.pop(doc_id, []):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.doc_meta.pop(doc_id, None)
+    
+    def search(
+        self,
+        query: str,
+        status: Optional[str] = None,
+        service_type: Optional[str] = None,
+        top: Optional[int] = None
+    ) -> Tuple[int, List[Tuple[str, float]]]:
+        """Total matches and the `top` best (request id, score) pairs, best first"""
+        total_docs = len(self.doc_meta) or 1
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + total_docs / len(postings))
+            for doc_id, weight in postings.items():
+                scores[doc_id] += weight * idf
+        
+        results = []
+        for doc_id, score in scores.items():
+            doc_status, doc_service_type, created_at = self.doc_meta[doc_id]
+            if status and doc_status != status:
+                continue
+            if service_type and doc_service_type != service_type:
+                continue
+            results.append((score, created_at or datetime.min, doc_id))
+        
+        # Partial selection: only the requested page needs to be ordered
+        best = heapq.nlargest(top, results) if top is not None else sorted(results, reverse=True)
+        return len(results), [(doc_id, round(score, 4)) for score, _, doc_id in best]
+    
+    async def refresh(self, collection, archive=None, force: bool = False) -> None:
+        """Catch up with requests created, updated or archived since the last sync"""
+        if not force and self.built and time.monotonic() - self.refreshed_at < settings.SEARCH_INDEX_REFRESH_SECONDS:
+            return
+        
+        async with self._lock:
+            if not force and self.built and time.monotonic() - self.refreshed_at < settings.SEARCH_INDEX_REFRESH_SECONDS:
+                return
+            
+            started = datetime.utcnow()
+            query = {}
+            if self.synced_until is not None:
+                # $gte: documents sharing the last timestamp are simply re-indexed
+                query["updated_at"] = {"$gte": self.synced_until}
+            
+            synced_until = self.synced_until or datetime.min
+            async for request in collection.find(query, INDEX_PROJECTION).sort("updated_at", 1):
+                self.add(request)
+                synced_until = max(synced_until, request["updated_at"])
+            
+            if archive is not None:
+                # A first build reads only the hot collection, so only later archiving matters
+                archived_until = self.archived_until or started
+                async for request in archive.find({"archived_at": {"$gte": archived_until}}, {"archived_at": 1}):
+                    self.remove(str(request["_id"]))
+                    archived_until = max(archived_until, request["archived_at"])
+                self.archived_until = archived_until
+            
+            self.synced_until = synced_until
+            self.refreshed_at = time.monotonic()
+
+
+service_request_index = InvertedIndex()
+
+
+def index_service_request(request: dict) -> None:
+    """Keep this worker's in-process index current after a local write"""
+    if service_request_index.built:
+        service_request_index.add(request)
+
+
+async def search_service_requests(
+    db,
+    query: str,
+    status: Optional[str] = None,
+    service_type: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50
+) -> Tuple[str, int, List[Tuple[dict, float]]]:
+    """
+    Ranked full-text search over service requests.
+    
+    Returns (backend used, total matches, page of (document, score)).
+    """
+    collection = db[HOT_COLLECTION]
+    
+    if settings.SEARCH_BACKEND != "inverted":
+        filters = {"$text": {"$search": query}}
+        if status:
+            filters["status"] = status
+        if service_type:
+            filters["service_type"] = service_type
+        try:
+            total = await collection.count_documents(filters)
+            cursor = collection.find(filters, {"score": {"$meta": "textScore"}}).sort(
+                [("score", {"$meta": "textScore"}), ("created_at", -1)]
+            ).skip(skip).limit(limit)
+            page = [(request, round(request.pop("score"), 4)) async for request in cursor]
+            return "mongo", total, page
+        except OperationFailure as e:
+            if settings.SEARCH_BACKEND == "mongo" or e.code not in TEXT_INDEX_UNAVAILABLE_CODES:
+                raise
+    
+    await service_request_index.refresh(collection, db[ARCHIVE_COLLECTION])
+    total, matches = service_request_index.search(query, status, service_type, top=skip + limit)
+    page_ids = matches[skip:]
+    if not page_ids:
+        return "inverted", total, []
+    
+    ids = [ObjectId(doc_id) for doc_id, _ in page_ids]
+    documents = await collection.find({"_id": {"$in": ids}}).to_list(length=len(ids))
+    by_id = {str(request["_id"]): request for request in documents}
+    if len(by_id) < len(ids):
+        # Archived since the last refresh: still shown until the next one drops them
+        archived = await db[ARCHIVE_COLLECTION].find(
+            {"_id": {"$in": [ObjectId(doc_id) for doc_id, _ in page_ids if doc_id not in by_id]}}
+        ).to_list(length=len(ids))
+        by_id.update({str(request["_id"]): request for request in archived})
+    page = [(by_id[doc_id], score) for doc_id, score in page_ids if doc_id in by_id]
+    return "inverted", total, page
@@ -0,0 +1,149 @@
+"""
+Per-request timing breakdown.
+
+The middleware gives each HTTP request a RequestTimings in a context
+variable; `span()` blocks (token decoding, bcrypt, SMS sends) and the MongoDB
+command listener add their durations to it. Motor and run_in_threadpool copy
+the context into their worker threads, so work done there is attributed to
+the request that started it.
+
+The breakdown is returned as a `Server-Timing` header when
+SERVER_TIMING_ENABLED is set, or when an admin sends `X-Server-Timing: 1`,
+and requests slower than SERVER_TIMING_SLOW_REQUEST_MS are logged with their
+spans either way.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from pymongo import monitoring
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_HEADER = b"x-server-timing"
+
+
+class RequestTimings:
+    """Total duration and count per span name; shared by every thread working on the request"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: Dict[str, List[float]] = {}
+    
+    def add(self, name: str, duration_ms: float) -> None:
+        with self._lock:
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += duration_ms
+            span[1] += 1
+    
+    def header(self, total_ms: float) -> str:
+        with self._lock:
+            spans = list(self.spans.items())
+        entries = [f'{name};dur={duration:.1f};desc="{count}x"' for name, (duration, count) in spans]
+        entries.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(entries)
+    
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(duration, 1) for name, (duration, _) in self.spans.items()}
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block under `name` for the current request, if any"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - start) * 1000)
+
+
+class MongoTimingListener(monitoring.CommandListener):
+    """Adds every MongoDB command's server round trip to the `mongo` span"""
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        timings = _timings.get()
+        if timings is not None:
+            timings.add("mongo", event.duration_micros / 1000)
+    
+    def failed(self, event):
+        timings = _timings.get()
+        if timings is not None:
+            timings.add("mongo", event.duration_micros / 1000)
+
+
+mongo_timing_listener = MongoTimingListener()
+
+
+def _admin_requested(scope) -> bool:
+    """`X-Server-Timing: 1` from a caller with an admin token"""
+    from auth import decode_access_token
+    
+    headers = dict(scope.get("headers") or [])
+    if headers.get(REQUEST_HEADER, b"").strip() not in (b"1", b"true"):
+        return False
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        return decode_access_token(token).role == "admin"
+    except Exception:
+        return False
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware that collects spans per request and reports them"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        emit = settings.SERVER_TIMING_ENABLED or _admin_requested(scope)
+        if not emit and not settings.SERVER_TIMING_SLOW_REQUEST_MS:
+            await self.app(scope, receive, send)
+            return
+        
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status_code = None
+        
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if emit:
+                    total_ms = (time.perf_counter() - start) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.header(total_ms).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            total_ms = (time.perf_counter() - start) * 1000
+            threshold = settings.SERVER_TIMING_SLOW_REQUEST_MS
+            if threshold and total_ms >= threshold:
+                logger.warning(
+                    "Slow request %s %s took %.0f ms", scope["method"], scope["path"], total_ms,
+                    extra={"status_code": status_code, "duration_ms": round(total_ms, 1), "spans": timings.summary()}
+                )
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from deadlines import bounded
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into one execution.
+    
+    The first caller for a key starts the work; callers that arrive while it is
+    still running await the same task and receive the same result (or error).
+    The shared task is shielded so that one caller going away does not cancel
+    the work the others are waiting on.
+    
+    After `invalidate()` (call it once a write commits), new callers start
+    fresh work instead of joining calls that may have read the old data.
+    With `detached`, the work runs in a fresh context instead of the first
+    caller's, so that caller's request deadline does not apply to everyone;
+    it runs under `deadline` (seconds) of its own instead, which also bounds
+    its MongoDB operations. Each caller still stops waiting at its own deadline.
+    """
+    
+    def __init__(self, detached: bool = False, deadline: Optional[float] = None):
+        self.detached = detached
+        self.deadline = deadline
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.generation = 0
+        self.started = 0
+        self.shared = 0
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        key = (self.generation, key)
+        task = self._calls.get(key)
+        if task is None:
+            if self.detached:
+                work = bounded(fn, self.deadline)
+                context = contextvars.Context()
+            else:
+                work, context = fn(), None
+            task = asyncio.get_running_loop().create_task(work, context=context)
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.started += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+    
+    def invalidate(self) -> None:
+        """Make later calls start new work rather than join calls already running"""
+        self.generation += 1
+    
+    def in_flight(self) -> int:
+        return len(self._calls)
+    
+    def stats(self) -> dict:
+        return {"started": self.started, "shared": self.shared, "in_flight": self.in_flight()}
@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import requests
+from config import settings
+from deadlines import DeadlineExceeded, clamp, expired
+from server_timing import span
+
+logger = logging.getLogger(__name__)
+
+
+class SMSProviderError(Exception):
+    """The provider did not accept the message"""
+
+
+class InvalidRecipientError(SMSProviderError):
+    """The number cannot be sent to by this provider (not a provider health problem)"""
+
+
+def international_number(phone_number: str) -> str:
+    """+92XXXXXXXXXX from 03XX..., 3XX..., 923XX... or an already international number"""
+    phone_number = phone_number.replace(" ", "")
+    if phone_number.startswith("0"):
+        return "+92" + phone_number[1:]
+    if phone_number.startswith("92") and len(phone_number) == 12:
+        return "+" + phone_number
+    if not phone_number.startswith("+"):
+        return "+92" + phone_number
+    return phone_number
+
+
+class SMSProvider(ABC):
+    """
+    One SMS gateway. `send()` returns once the gateway accepted the message
+    and raises SMSProviderError otherwise. The blocking HTTP call runs in a
+    worker thread and is bounded by SMS_TIMEOUT_SECONDS, so a hung gateway
+    never stalls the event loop or the caller. Within a request the wait is
+    also cut to the request's remaining deadline.
+    """
+    
+    name = "provider"
+    
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout or settings.SMS_TIMEOUT_SECONDS
+    
+    @abstractmethod
+    async def send(self, phone_number: str, message: str) -> None:
+        ...
+    
+    async def _post(self, url: str, **kwargs) -> requests.Response:
+        timeout = clamp(self.timeout)
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(requests.post, url, timeout=timeout, **kwargs),
+                timeout=timeout + 1
+            )
+        except asyncio.TimeoutError:
+            if expired():
+                raise DeadlineExceeded(f"Request deadline exceeded while waiting for {self.name}")
+            raise SMSProviderError(f"{self.name} did not respond within {timeout:.0f}s")
+        except requests.exceptions.RequestException as e:
+            # Out of request time is not the provider's fault: don't count it against its breaker
+            if expired():
+                raise DeadlineExceeded(f"Request deadline exceeded while waiting for {self.name}")
+            raise SMSProviderError(f"{self.name} request failed: {str(e)[:150]}")
+
+
+class ZongProvider(SMSProvider):
+    """Zong CPaaS: form-encoded POST, success responses start with "0|success" """
+    
+    name = "zong"
+    
+    def __init__(self, api_url: str, login_id: str, password: str, mask: str, timeout: Optional[float] = None):
+        super().__init__(timeout)
+        self.api_url = api_url
+        self.login_id = login_id
+        self.password = password
+        self.mask = mask
+    
+    @staticmethod
+    def destination(phone_number: str) -> str:
+        """12 digits with the 92 prefix and no leading zero or plus"""
+        destination = international_number(phone_number).lstrip("+")
+        if not destination.startswith("92"):
+            destination = "92" + destination
+        if len(destination) != 12 or not destination.isdigit():
+            raise InvalidRecipientError(f"Invalid phone format for Zong: {destination} (should be 12 digits)")
+        return destination
+    
+    async def send(self, phone_number: str, message: str) -> None:
+        # Form data (NOT JSON) - exact parameter names the gateway expects
+        form_data = {
+            "loginId": self.login_id,
+            "loginPassword": self.password,
+            "Mask": self.mask,
+            "Destination": self.destination(phone_number),
+            "Message": message,
+            "UniCode": "1",
+            "dataCoding": "8",
+            "ShortCodePrefered": "n"
+        }
+        response = await self._post(
+            self.api_url,
+            data=form_data,
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded",
+                "User-Agent": "BGS-Portal/1.0"
+            },
+            verify=False
+        )
+        if response.status_code != 200 or not response.text.startswith("0|success"):
+            raise SMSProviderError(f"Zong error {response.status_code}: {response.text[:150]}")
+
+
+class TwilioProvider(SMSProvider):
+    """Twilio Messages API"""
+    
+    name = "twilio"
+    
+    def __init__(self, account_sid: str, auth_token: str, from_number: str,
+                 api_url: Optional[str] = None, timeout: Optional[float] = None):
+        super().__init__(timeout)
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.api_url = api_url or f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+    
+    async def send(self, phone_number: str, message: str) -> None:
+        response = await self._post(
+            self.api_url,
+            auth=(self.account_sid, self.auth_token),
+            data={"From": self.from_number, "To": international_number(phone_number), "Body": message}
+        )
+        if response.status_code not in (200, 201):
+            raise SMSProviderError(f"Twilio error {response.status_code}: {response.text[:150]}")
+
+
+class ConsoleProvider(SMSProvider):
+    """
+    Development only: logs that a message would have been sent instead of
+    sending it. The text is left out, since OTP messages carry the code; use
+    fake_sms_gateway.py to see message bodies locally.
+    """
+    
+    name = "console"
+    
+    async def send(self, phone_number: str, message: str) -> None:
+        logger.info("Development Mode: SMS to %s (%d characters)", international_number(phone_number), len(message))
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing provider.
+    
+    After `failure_threshold` consecutive failures the breaker opens and calls
+    are refused immediately for `reset_seconds`; then a single trial call is
+    let through (half-open), and its outcome closes or re-opens the breaker.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_progress = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+    
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self.trial_in_progress:
+            self.trial_in_progress = True
+            return True
+        self.rejected += 1
+        return False
+    
+    def record_success(self) -> None:
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+    
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.trial_in_progress = False
+        if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+    
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+class SMSGateway:
+    """
+    Sends through the healthiest available provider, failing over to the next
+    one when a provider errors, times out or has its circuit breaker open.
+    Reports success only when some provider accepted the message.
+    """
+    
+    def __init__(self, providers: List[SMSProvider]):
+        self.providers = providers
+        self.breakers = {
+            provider.name: CircuitBreaker(settings.SMS_BREAKER_FAILURE_THRESHOLD, settings.SMS_BREAKER_RESET_SECONDS)
+            for provider in providers
+        }
+    
+    def _by_health(self) -> List[SMSProvider]:
+        # Closed breakers first, in configured order; then half-open, then open ones
+        rank = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+        return sorted(self.providers, key=lambda provider: rank[self.breakers[provider.name].state])
+    
+    async def send(self, phone_number: str, message: str) -> bool:
+        for provider in self._by_health():
+            breaker = self.breakers[provider.name]
+            if not breaker.allow():
+                continue
+            try:
+                with span(f"sms-{provider.name}"):
+                    await provider.send(phone_number, message)
+            except InvalidRecipientError as e:
+                breaker.trial_in_progress = False
+                logger.warning("%s", e, extra={"provider": provider.name})
+                continue
+            except SMSProviderError as e:
+                breaker.record_failure()
+                logger.warning("%s", e, extra={"provider": provider.name, "breaker": breaker.state})
+                continue
+            except BaseException:
+                # Deadline exceeded or cancelled: says nothing about the provider's health
+                breaker.trial_in_progress = False
+                raise
+            breaker.record_success()
+            logger.info(
+                "SMS sent to %s", international_number(phone_number),
+                extra={"event": "sms.sent", "provider": provider.name}
+            )
+            return True
+        
+        logger.error("SMS to %s failed on every provider", international_number(phone_number))
+        return False
+    
+    def stats(self) -> dict:
+        return {provider.name: self.breakers[provider.name].stats() for provider in self.providers}
+
+
+def build_providers() -> List[SMSProvider]:
+    """Providers named in SMS_PROVIDERS, in order of preference"""
+    providers: List[SMSProvider] = []
+    for name in settings.SMS_PROVIDERS:
+        if name == "zong":
+            if "twilio.com" in settings.ZONG_API_URL.lower() and "Accounts/" in settings.ZONG_API_URL:
+                # Older setups configure Twilio through the ZONG_* variables
+                account_sid = settings.ZONG_API_URL.split("Accounts/")[1].split("/")[0]
+                providers.append(TwilioProvider(
+                    account_sid, settings.ZONG_LOGIN_ID, settings.ZONG_MASK, api_url=settings.ZONG_API_URL
+                ))
+            else:
+                providers.append(ZongProvider(
+                    settings.ZONG_API_URL, settings.ZONG_LOGIN_ID, settings.ZONG_PASSWORD, settings.ZONG_MASK
+                ))
+        elif name == "twilio" and settings.TWILIO_ACCOUNT_SID:
+            providers.append(TwilioProvider(
+                settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, settings.TWILIO_FROM_NUMBER,
+                api_url=settings.TWILIO_API_URL
+            ))
+        elif name == "console":
+            providers.append(ConsoleProvider())
+    return providers
+
+
+sms_gateway = SMSGateway(build_providers())
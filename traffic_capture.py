@@ -0,0 +1,197 @@
+"""
+Opt-in capture of sanitized request traces for replay_traffic.py.
+
+With TRAFFIC_CAPTURE_ENABLED set, a sample (TRAFFIC_CAPTURE_SAMPLE_RATE) of
+the requests that match a route is written as one JSON object per line to
+TRAFFIC_CAPTURE_PATH, rotated at TRAFFIC_CAPTURE_MAX_BYTES with
+TRAFFIC_CAPTURE_BACKUPS old files kept. A trace holds the method, route
+template, path and query parameters, the shape of the JSON body, the
+caller's role, the response status and the duration.
+
+Values are sanitized before they are queued: enum values (service types,
+statuses), ObjectIds, dates, booleans and small numbers are kept so the
+replay hits the same code paths, and any other string is replaced by its
+kind and length (`<str:12>`, `<digits:11>`), so names, phone numbers and
+addresses are never written. Values under secret-looking keys (passwords,
+OTPs, tokens: the keys the log redaction masks) are always replaced,
+whatever they look like. Lines are written by a
+background thread, like application logs.
+"""
+import json
+import logging
+import queue
+import random
+import re
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import parse_qsl
+from auth import decode_access_token
+from config import settings
+from logging_config import SECRET_KEYS
+from models import AnalyticsGranularity, RequestStatus, ServiceType
+
+MAX_BODY_BYTES = 64 * 1024
+
+KNOWN_VALUES = {member.value for enum in (ServiceType, RequestStatus, AnalyticsGranularity) for member in enum}
+OBJECT_ID = re.compile(r"^[0-9a-f]{24}$")
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}([T ][\d:.]+(Z|[+-]\d{2}:?\d{2})?)?$")
+SMALL_NUMBER = re.compile(r"^-?\d{1,5}(\.\d+)?$")
+
+
+def sanitize(value: Any, secret: bool = False) -> Any:
+    """
+    The shape of a parameter or body value, keeping only values that identify
+    no one. `secret` (set for values under secret-looking keys) masks even
+    values that would otherwise be kept.
+    """
+    if isinstance(value, dict):
+        return {str(key): sanitize(item, secret or bool(SECRET_KEYS.search(str(key)))) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item, secret) for item in value[:20]]
+    if value is None or (isinstance(value, bool) and not secret):
+        return value
+    if isinstance(value, (int, float)) and not secret:
+        return value if abs(value) < 100000 else f"<number:{len(str(int(value)))}>"
+    text = str(value)
+    if not secret and (text in KNOWN_VALUES or OBJECT_ID.match(text) or ISO_DATE.match(text)
+                       or SMALL_NUMBER.match(text) or text in ("true", "false")):
+        return text
+    if text.lstrip("+").isdigit():
+        return f"<digits:{len(text)}>"
+    return f"<str:{len(text)}>"
+
+
+def _caller_role(scope) -> str:
+    headers = dict(scope.get("headers") or [])
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return "anonymous"
+    try:
+        return decode_access_token(token).role or "unknown"
+    except Exception:
+        return "invalid"
+
+
+def _query_params(scope) -> dict:
+    params = {}
+    for key, value in parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True):
+        params.setdefault(key, []).append(sanitize(value, bool(SECRET_KEYS.search(key))))
+    return {key: values[0] if len(values) == 1 else values for key, values in params.items()}
+
+
+def _body_shape(body: bytes, truncated: bool) -> Any:
+    if truncated:
+        return "<truncated>"
+    if not body:
+        return None
+    try:
+        return sanitize(json.loads(body))
+    except ValueError:
+        return f"<bytes:{len(body)}>"
+
+
+class TraceWriter:
+    """Queues trace lines for a background thread that appends them to the rotating file"""
+    
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener: Optional[QueueListener] = None
+        self.written = 0
+        self.dropped = 0
+    
+    def start(self) -> None:
+        if self._listener is not None:
+            return
+        path = Path(settings.TRAFFIC_CAPTURE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        output = RotatingFileHandler(
+            path, maxBytes=settings.TRAFFIC_CAPTURE_MAX_BYTES,
+            backupCount=settings.TRAFFIC_CAPTURE_BACKUPS, encoding="utf-8"
+        )
+        output.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = QueueListener(self._queue, output)
+        self._listener.start()
+    
+    def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+    
+    def write(self, trace: dict) -> None:
+        if self._listener is None:
+            self.dropped += 1
+            return
+        self._queue.put_nowait(logging.makeLogRecord({"msg": json.dumps(trace, default=str)}))
+        self.written += 1
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.TRAFFIC_CAPTURE_ENABLED,
+            "path": settings.TRAFFIC_CAPTURE_PATH,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+trace_writer = TraceWriter()
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware that records a sanitized trace of each sampled request"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http"
+                or scope["path"] in settings.TRAFFIC_CAPTURE_EXCLUDE_PATHS
+                or random.random() >= settings.TRAFFIC_CAPTURE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+        
+        started_at = time.time()
+        start = time.perf_counter()
+        body = bytearray()
+        truncated = False
+        status_code = None
+        
+        async def receive_and_copy():
+            nonlocal truncated
+            message = await receive()
+            if message["type"] == "http.request" and not truncated:
+                chunk = message.get("body", b"")
+                if len(body) + len(chunk) > MAX_BODY_BYTES:
+                    truncated = True
+                else:
+                    body.extend(chunk)
+            return message
+        
+        async def send_and_observe(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive_and_copy, send_and_observe)
+        finally:
+            # Routing fills in the matched route; unmatched paths are not recorded
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                trace_writer.write({
+                    "time": datetime.fromtimestamp(started_at, timezone.utc).isoformat(timespec="milliseconds"),
+                    "ts": round(started_at, 6),
+                    "method": scope["method"],
+                    "route": route.path,
+                    "path_params": sanitize(scope.get("path_params") or {}),
+                    "query": _query_params(scope),
+                    "body": _body_shape(bytes(body), truncated),
+                    "role": _caller_role(scope),
+                    "status": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                })